@@ -0,0 +1,250 @@
+# browser_session.py
+"""
+Browser Session - on-disk Chrome profiles and login checks
+Both browsers keep a profile under browser_profiles/ so cookies, the HTTP cache and service workers
+survive restarts - a restart is a few seconds with a warm cache and (usually) no login.
+The session check loads the account page in a hidden frame inside the tab, so it never navigates away from
+anything, and a background keepalive keeps checking (and refreshing) the checkout login during long monitors.
+"""
+
+import os
+import re
+import threading
+import time
+
+from event_log import LOG
+from regions import DEFAULT_REGION, account_path as region_account_path
+
+PROFILES_DIR = 'browser_profiles'
+
+# Cookie names that look like a PopMart login - only a hint: guest IDs and anonymous sessions match too,
+# so they're used for the "expires soon" warning, never to decide whether we're logged in
+AUTH_COOKIE_PATTERN = re.compile(r'token|session|auth|login|uid|user', re.IGNORECASE)
+AUTH_DOMAIN = 'popmart.com'
+
+# Pages that mean "you're not logged in"
+LOGIN_URL_PATTERN = re.compile(r'/(login|signin|sign-in|register)', re.IGNORECASE)
+
+# How long the account page has to sit still (no client-side redirect, no login form) to count as logged in
+ACCOUNT_SETTLE_MS = 2500
+ACCOUNT_CHECK_TIMEOUT = 20
+
+# The site is a single page app - its account route answers 200 with the same HTML for guests and
+# members and only sends guests to login once its own JS has run, so a fetch can't tell them apart.
+# So the app decides: the account page boots in a hidden same-origin frame, and counts as logged in once
+# it has loaded and stayed on the account route for a while without a login form showing up.
+# The check runs in the page and leaves its answer in window.__sessionCheck, so nobody has to hold the
+# WebDriver session while it loads. arguments: account path, login URL regex source, settle ms
+START_CHECK_JS = """
+    const path = arguments[0], loginUrl = new RegExp(arguments[1], 'i'), settleMs = arguments[2];
+    if (window.__sessionCheckFrame) window.__sessionCheckFrame.remove();
+    const frame = window.__sessionCheckFrame = document.createElement('iframe');
+    frame.style.cssText = 'position:fixed;left:-10px;top:-10px;width:1px;height:1px;opacity:0;pointer-events:none';
+    window.__sessionCheck = {pending: true};
+    let loadedAt = null;
+    frame.addEventListener('load', () => { loadedAt = loadedAt || Date.now(); });
+    const finish = result => {
+        frame.remove();
+        if (window.__sessionCheckFrame === frame) window.__sessionCheckFrame = null;
+        window.__sessionCheck = result;
+    };
+    const deadline = Date.now() + 15000;
+    const poll = () => {
+        let url, loginForm;
+        try {
+            url = frame.contentWindow.location.href;
+            loginForm = !!frame.contentDocument.querySelector('input[type="password"]');
+        } catch (e) {
+            return finish({error: 'account page went off the site (or was cut short)'});
+        }
+        if (loginUrl.test(url) || loginForm) return finish({loggedIn: false, url: url, loginForm: loginForm});
+        if (loadedAt && Date.now() - loadedAt >= settleMs) return finish({loggedIn: url.includes(path), url: url});
+        if (Date.now() > deadline) return finish({error: 'account page never finished loading'});
+        setTimeout(poll, 100);
+    };
+    frame.src = location.origin + path;
+    document.body.appendChild(frame);
+    setTimeout(poll, 100);
+"""
+
+READ_CHECK_JS = "return window.__sessionCheck || null;"
+
+
+def profile_dir(role, base=PROFILES_DIR):
+    """browser_profiles/<role> - Chrome can't share one profile between two running browsers"""
+    if not base:
+        return None
+    path = os.path.abspath(os.path.join(base, role))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def begin_session_check(driver, account_path):
+    """Starts the account page check in the tab and returns None - or (valid, reason) right away when the tab
+    itself already answers it (sitting on login, or not on PopMart so there's nothing same-origin to ask from)"""
+    url = driver.current_url or ''
+    if LOGIN_URL_PATTERN.search(url):
+        return False, f"sitting on a login page ({url})"
+    if AUTH_DOMAIN not in url:
+        return None, f"not on a PopMart page ({url or 'blank tab'})"
+    driver.execute_script(START_CHECK_JS, account_path, LOGIN_URL_PATTERN.pattern, ACCOUNT_SETTLE_MS)
+    return None
+
+
+def collect_session_check(driver):
+    """(valid, reason) for the check begin_session_check started, or None while it's still running
+    valid is None when there's no answer to go by (the tab navigated away mid check, or it errored)"""
+    result = driver.execute_script(READ_CHECK_JS)
+    if result and result.get('pending'):
+        return None
+    if not result:
+        return None, "account page check was cut short (the tab navigated)"
+    if result.get('error'):
+        return None, f"couldn't check the account page ({result['error']})"
+    if not result.get('loggedIn'):
+        if result.get('loginForm'):
+            return False, "account page shows a login form - logged out"
+        return False, f"account page sends us to {result.get('url')} - logged out"
+    soonest = cookie_expiry(driver)
+    if soonest is not None and soonest - time.time() < 3600:
+        return True, f"account page stays put, login cookie expires in {int((soonest - time.time()) / 60)} min"
+    return True, "account page stays put"
+
+
+def check_session(driver, account_path, timeout=ACCOUNT_CHECK_TIMEOUT):
+    """Returns (valid, reason) - lets the site's own app decide whether the account page stays put or sends
+    us to login. Blocks until it knows (a few seconds); valid is None when it can't tell"""
+    try:
+        verdict = begin_session_check(driver, account_path)
+        deadline = time.time() + timeout
+        while verdict is None:
+            if time.time() > deadline:
+                return None, "account page check timed out"
+            time.sleep(0.2)
+            verdict = collect_session_check(driver)
+    except Exception as e:
+        return False, f"checkout browser not responding: {e}"
+    return verdict
+
+
+def cookie_expiry(driver):
+    """Soonest expiry among the login-looking cookies (a hint - see AUTH_COOKIE_PATTERN), or None"""
+    try:
+        cookies = driver.get_cookies()
+    except Exception:
+        return None
+    return min((c['expiry'] for c in cookies if 'expiry' in c and c.get('value')
+                and AUTH_DOMAIN in c.get('domain', '') and AUTH_COOKIE_PATTERN.search(c.get('name', ''))),
+               default=None)
+
+
+def wait_for_load(driver, timeout=3.0):
+    """Waits (briefly) for the current page to finish loading - page_load_strategy='none' doesn't"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if driver.execute_script("return document.readyState") == 'complete':
+                return True
+        except Exception:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+class SessionKeepalive:
+    """Background thread that pokes the checkout session every so often and alerts early if it's gone bad
+    Only touches the checkout browser when nobody else is (same lock as checkout), and only for a round trip:
+    the account page check starts in the page, and the answer gets picked up a few seconds later"""
+
+    def __init__(self, driver, lock, interval=60, on_alert=None, metrics=None, account_path=None, clock=None):
+        self.driver = driver
+        self.clock = clock                # ClockSync for the checkout page - topped up while we hold the lock anyway
+        self.account_path = account_path or region_account_path(DEFAULT_REGION)  # Same-origin page that needs a login
+        self.lock = lock
+        self.interval = interval
+        self.on_alert = on_alert          # on_alert(reason) - called once each time the session goes bad
+        self.metrics = metrics
+        self.valid = None
+        self.checking_since = None        # A check is running in the page (started by us, not picked up yet)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='session-keepalive', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(2.0)
+
+    def _run(self):
+        wait = self.interval
+        while not self.stopped.wait(wait):
+            # A checkout (or prewarm) is using the browser - try again next round
+            if not self.lock.acquire(blocking=False):
+                wait = self.interval
+                continue
+            try:
+                self.step()
+            finally:
+                self.lock.release()
+            # Check running in the page - come back for the answer shortly
+            wait = 1.0 if self.checking_since is not None else self.interval
+
+    def step(self):
+        """One round under the lock - starts a check, or picks up the one already running"""
+        try:
+            if self.checking_since is None:
+                verdict = begin_session_check(self.driver, self.account_path)
+                if verdict is None:
+                    self.checking_since = time.time()
+                    return
+            else:
+                verdict = collect_session_check(self.driver)
+                if verdict is None:
+                    if time.time() - self.checking_since < ACCOUNT_CHECK_TIMEOUT:
+                        return
+                    verdict = (None, "account page check timed out")
+                self.checking_since = None
+        except Exception as e:
+            self.checking_since = None
+            verdict = (False, f"checkout browser not responding: {e}")
+        self.apply(*verdict)
+
+    def check_now(self):
+        """Probe right away and wait for the answer - caller must hold the checkout lock (e.g. while pre-arming)
+        Returns None when there was nothing to go by (tab off PopMart - payment page, blank tab - or no answer)"""
+        self.checking_since = None
+        return self.apply(*self.probe())
+
+    def apply(self, valid, reason):
+        """Records a verdict - returns valid"""
+        if valid is None:
+            return None  # Can't tell from here - keep the last answer rather than guess
+        self._record(valid, reason)
+        if self.clock is not None:
+            try:
+                self.clock.sample(self.driver)
+            except Exception:
+                pass  # probe() already reported a browser that isn't answering
+        return valid
+
+    def probe(self):
+        """Returns (valid, reason) - loading the account page doubles as the keepalive"""
+        return check_session(self.driver, self.account_path)
+
+    def _record(self, valid, reason):
+        if self.metrics:
+            self.metrics.set('popmart_checkout_session_valid', 1 if valid else 0,
+                             'Whether the account page stays put without sending us to login', path=self.account_path)
+        if valid and self.valid is False:
+            LOG.event('session_valid', reason=f"back: {reason}")
+        elif not valid and self.valid is not False:
+            LOG.event('session_invalid', level='error', reason=reason)
+            if self.on_alert:
+                self.on_alert(reason)
+        elif valid and 'expires in' in reason:
+            LOG.event('session_expiring', level='warning', reason=reason)
+        self.valid = valid
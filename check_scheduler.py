@@ -0,0 +1,110 @@
+# check_scheduler.py
+"""
+Check Budget Scheduler - decides how often each monitored tab should look at its button
+High priority products always get full speed, everybody else shares what's left of the budget
+and backs off when the machine is getting hammered
+"""
+
+import os
+import time
+
+DEFAULT_PRIORITY = 5
+HIGH_PRIORITY = 8
+
+
+class CheckBudgetScheduler:
+    MIN_INTERVAL_MS = 50     # Fastest any tab is allowed to poll
+    MAX_INTERVAL_MS = 2000   # Slowest a backed-off tab will go
+    IDLE_INTERVAL_MS = 5000  # Tabs waiting for a scheduled drop barely poll at all
+    LOAD_SAMPLE_SECONDS = 1.0
+
+    def __init__(self, budget=40, high_load=0.8):
+        self.budget = budget          # Total checks per second shared by all tabs
+        self.high_load = high_load    # Load per CPU core where low priority tabs start backing off
+        self.priorities = {}
+        self.idle = set()    # Parked until their drop window - don't count against the budget
+        self.armed = set()   # Inside a drop window - full speed like high priority
+        self.applied = {}
+        self._load = 0.0
+        self._load_sampled_at = 0.0
+
+    def set_priority(self, product_id, priority):
+        """Sets how much we care about a product (1 = barely, 10 = drop everything)"""
+        self.priorities[product_id] = max(1, min(10, int(priority)))
+
+    def priority_of(self, product_id):
+        return self.priorities.get(product_id, DEFAULT_PRIORITY)
+
+    def set_idle(self, product_id):
+        """Parks a product until its drop window comes around"""
+        self.armed.discard(product_id)
+        self.idle.add(product_id)
+
+    def set_armed(self, product_id):
+        """Drop window is (nearly) open - give this product max frequency"""
+        self.idle.discard(product_id)
+        self.armed.add(product_id)
+
+    def current_load(self):
+        """Load average per CPU core - sampled at most once a second so it stays cheap"""
+        now = time.time()
+        if now - self._load_sampled_at >= self.LOAD_SAMPLE_SECONDS:
+            try:
+                self._load = os.getloadavg()[0] / (os.cpu_count() or 1)
+            except (AttributeError, OSError):
+                # Windows has no load average - assume we're fine
+                self._load = 0.0
+            self._load_sampled_at = now
+        return self._load
+
+    def compute_rates(self, product_ids):
+        """Spreads the check budget over the given products - returns {product_id: (interval_ms, use_animation_frame)}"""
+        if not product_ids:
+            return {}
+
+        load = self.current_load()
+        overloaded = load > self.high_load
+        rates = {}
+
+        # Idle products just tick over slowly and don't eat into the budget
+        for pid in product_ids:
+            if pid in self.idle:
+                rates[pid] = (self.IDLE_INTERVAL_MS, False)
+        active = [pid for pid in product_ids if pid not in self.idle]
+
+        # High priority (and armed) products get max frequency no matter what
+        high = [pid for pid in active if pid in self.armed or self.priority_of(pid) >= HIGH_PRIORITY]
+        others = [pid for pid in active if pid not in self.armed and self.priority_of(pid) < HIGH_PRIORITY]
+        for pid in high:
+            rates[pid] = (self.MIN_INTERVAL_MS, True)
+
+        if others:
+            # Whatever the high priority tabs don't use gets split by priority weight
+            used = len(high) * (1000 / self.MIN_INTERVAL_MS)
+            floor = len(others) * (1000 / self.MAX_INTERVAL_MS)
+            remaining = max(self.budget - used, floor)
+            total_weight = sum(self.priority_of(pid) for pid in others)
+
+            for pid in others:
+                priority = self.priority_of(pid)
+                share = remaining * priority / total_weight
+                interval = 1000 / share
+
+                # Low priority tabs back off when the machine is loaded
+                if overloaded and priority < DEFAULT_PRIORITY:
+                    interval *= load / self.high_load
+
+                interval = int(max(self.MIN_INTERVAL_MS, min(self.MAX_INTERVAL_MS, interval)))
+                use_raf = interval == self.MIN_INTERVAL_MS and not overloaded
+                rates[pid] = (interval, use_raf)
+
+        return rates
+
+    def changed_rates(self, product_ids):
+        """Same as compute_rates but only returns the ones that differ from what the tab is already running"""
+        rates = self.compute_rates(product_ids)
+        return {pid: rate for pid, rate in rates.items() if self.applied.get(pid) != rate}
+
+    def mark_applied(self, product_id, rate):
+        """Remembers what rate a tab is actually running so we don't push the same thing twice"""
+        self.applied[product_id] = rate
@@ -0,0 +1,264 @@
+# checkout_plans.py
+"""
+Checkout Plans - each checkout compiled into steps that run inside the page in one async call
+Instead of a WebDriver round trip plus a guessed sleep per click, the page awaits its own DOM
+conditions (button shows up, add-to-bag request finishes) and hands back a per-step timing report.
+
+A navigation wipes the page's JS, so a checkout is two plans: one on the product page (ends with
+the item in the bag) and one on the cart page (select all + CHECK OUT). Python only waits for the
+cart URL in between.
+"""
+
+import time
+from urllib.parse import urlparse
+
+from detection_rules import with_matcher
+
+# Step actions:
+#   click   - wait for a checkout action button (detection_rules.ACTION_RULES) and click it
+#             (uses the handle an arm step cached, if the page was armed ahead of time)
+#             with 'stock': product type, only once that button shows in stock the way the detector reads it
+#   arm     - wait for a checkout action button and cache its handle without clicking
+#   resolve - wait for the first matching selector strategy (selector_cache) and click it
+#   settle  - wait for the requests the last click started to finish (add to bag hitting the server)
+# required=False steps can come up empty without failing the plan
+PRODUCT_PLANS = {
+    'popnow': [
+        {'step': 'buy_multiple', 'action': 'click', 'target': 'buy_multiple', 'timeout': 3000},
+        {'step': 'add_to_bag', 'action': 'click', 'target': 'add_to_bag', 'timeout': 3000},
+        {'step': 'bag_request', 'action': 'settle', 'timeout': 2000, 'fallback': 200},
+    ],
+    'normal': [
+        {'step': 'add_to_bag', 'action': 'click', 'target': 'add_to_bag', 'timeout': 10000, 'stock': 'normal'},
+        {'step': 'bag_request', 'action': 'settle', 'timeout': 2000, 'fallback': 200},
+    ],
+    'normal_whole_set': [
+        {'step': 'whole_set', 'action': 'click', 'target': 'whole_set', 'timeout': 1500, 'required': False},
+        {'step': 'add_to_bag', 'action': 'click', 'target': 'add_to_bag', 'timeout': 10000, 'stock': 'normal'},
+        {'step': 'bag_request', 'action': 'settle', 'timeout': 2000, 'fallback': 200},
+    ],
+}
+
+# The armed page was parked before the restock - its button has to turn red by itself, and if it doesn't
+# do that quickly the caller reloads the page instead of waiting out the full timeout
+ARMED_PLAN = [
+    {'step': 'add_to_bag', 'action': 'click', 'target': 'add_to_bag', 'timeout': 1500, 'stock': 'normal'},
+    {'step': 'bag_request', 'action': 'settle', 'timeout': 2000, 'fallback': 200},
+]
+
+# Run on the checkout browser before anything restocks - variant picked, add to bag handle cached
+ARM_PLANS = {
+    'normal': [
+        {'step': 'arm_add_to_bag', 'action': 'arm', 'target': 'add_to_bag', 'timeout': 5000},
+    ],
+    'normal_whole_set': [
+        {'step': 'whole_set', 'action': 'click', 'target': 'whole_set', 'timeout': 5000, 'required': False},
+        {'step': 'arm_add_to_bag', 'action': 'arm', 'target': 'add_to_bag', 'timeout': 5000},
+    ],
+}
+
+CART_PLAN = [
+    {'step': 'select_all', 'action': 'resolve', 'target': 'select_all', 'timeout': 5000, 'required': False},
+    {'step': 'checkout', 'action': 'resolve', 'target': 'checkout', 'timeout': 5000},
+]
+
+# arguments: plan steps, {target: ordered selector strategies}, callback (added by execute_async_script)
+PLAN_RUNNER_JS = with_matcher("""
+    const plan = arguments[0];
+    const strategies = arguments[1] || {};
+    const done = arguments[arguments.length - 1];
+    const began = performance.now();
+    const report = {ok: true, steps: [], winners: {}};
+
+    // A keepalive session check booting the account page in a hidden frame would compete with the clicks
+    if (window.__sessionCheckFrame) window.__sessionCheckFrame.remove();
+
+    // Polls by hand - the checkout browser clamps setTimeout, so no long timers
+    const tick = () => new Promise(resolve => setTimeout(resolve, 10));
+    const waitFor = async (check, timeoutMs) => {
+        const deadline = Date.now() + timeoutMs;
+        for (;;) {
+            const value = check();
+            if (value || Date.now() > deadline) return value;
+            await tick();
+        }
+    };
+
+    // Counts fetch/XHR traffic so "added to bag" means the request finished, not "200ms went by"
+    if (!window.__planRequests) {
+        const requests = window.__planRequests = {started: 0, pending: 0};
+        const begin = () => { requests.started++; requests.pending++; };
+        const end = () => { requests.pending = Math.max(0, requests.pending - 1); };
+        const originalFetch = window.fetch;
+        window.fetch = function() {
+            begin();
+            return originalFetch.apply(this, arguments).finally(end);
+        };
+        const originalSend = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function() {
+            begin();
+            this.addEventListener('loadend', end, {once: true});
+            return originalSend.apply(this, arguments);
+        };
+    }
+    const requests = window.__planRequests;
+    let clickBaseline = requests.started;
+
+    const resolveStrategy = (list) => {
+        for (const strategy of list || []) {
+            for (const el of document.querySelectorAll(strategy.selector)) {
+                if (el.offsetParent === null || el.disabled) continue;
+                if (strategy.texts) {
+                    const text = el.textContent.toUpperCase();
+                    if (!strategy.texts.some(t => text.includes(t))) continue;
+                }
+                return {el: el, name: strategy.name};
+            }
+        }
+        return null;
+    };
+
+    (async () => {
+        for (const step of plan) {
+            const start = performance.now();
+            let ok = false, detail = null;
+            try {
+                if (step.action === 'click') {
+                    const cached = (window.__armedHandles || {})[step.target];
+                    // A black (out of stock) ADD TO BAG takes the click and does nothing - wait for it to turn red
+                    // (null = not one of the detector's stock buttons, nothing to go by)
+                    const ready = el => {
+                        if (!step.stock) return true;
+                        const state = window.__popmartStateOf(step.stock, el);
+                        return state === null || state === 'in';
+                    };
+                    const el = await waitFor(() => {
+                        const found = cached && cached.isConnected ? cached : window.__popmartFind(step.target);
+                        return found && ready(found) ? found : null;
+                    }, step.timeout);
+                    if (el) { clickBaseline = requests.started; el.click(); ok = true; }
+                    if (el && el === cached) detail = 'armed';
+                    if (!el && step.stock) detail = 'button never showed in stock';
+                } else if (step.action === 'arm') {
+                    const el = await waitFor(() => window.__popmartFind(step.target), step.timeout);
+                    if (el) {
+                        (window.__armedHandles = window.__armedHandles || {})[step.target] = el;
+                        ok = true;
+                    }
+                } else if (step.action === 'resolve') {
+                    const hit = await waitFor(() => resolveStrategy(strategies[step.target]), step.timeout);
+                    if (hit) {
+                        clickBaseline = requests.started;
+                        hit.el.click();
+                        report.winners[step.target] = detail = hit.name;
+                        ok = true;
+                    }
+                } else if (step.action === 'settle') {
+                    // Done once the click's requests finish - or right away if none started within the fallback
+                    // (never fails the plan - it's only pacing)
+                    const settleStart = Date.now();
+                    await waitFor(() => requests.started > clickBaseline
+                        ? requests.pending === 0
+                        : Date.now() - settleStart >= step.fallback, step.timeout);
+                    detail = `${requests.started - clickBaseline} request(s)`;
+                    ok = true;
+                }
+            } catch (e) {
+                detail = String(e);
+            }
+            // at = page clock when the step finished (for clicks: right after the click) - clock_sync aligns it
+            report.steps.push({step: step.step, ok: ok, ms: Math.round((performance.now() - start) * 10) / 10,
+                               at: performance.timeOrigin + performance.now(), detail: detail});
+            if (!ok && step.required !== false) {
+                report.ok = false;
+                report.failed = step.step;
+                break;
+            }
+        }
+        report.totalMs = Math.round((performance.now() - began) * 10) / 10;
+        report.clock = performance.timeOrigin + performance.now();
+        done(report);
+    })().catch(e => done({ok: false, failed: 'runner', error: String(e), steps: report.steps}));
+""")
+
+
+def product_plan(product_type, whole_set=False):
+    if product_type == 'popnow':
+        return PRODUCT_PLANS['popnow']
+    return PRODUCT_PLANS['normal_whole_set' if whole_set else 'normal']
+
+
+def arm_plan(product_type, whole_set=False):
+    """Nothing to pre-resolve on PopNow pages (Buy Multiple only shows up once it's in stock) - just the preload"""
+    if product_type == 'popnow':
+        return []
+    return ARM_PLANS['normal_whole_set' if whole_set else 'normal']
+
+
+def armed_plan(product_type, whole_set=False, whole_set_applied=False):
+    """What's left to do on an armed page - for a normal product usually just the add to bag click"""
+    if product_type == 'popnow' or (whole_set and not whole_set_applied):
+        return product_plan(product_type, whole_set)
+    return ARMED_PLAN
+
+
+def plan_timeout(plan):
+    """Script timeout for a plan - every step's own timeout plus some slack"""
+    return sum(step['timeout'] for step in plan) / 1000 + 2
+
+
+# Set once when the checkout browser starts, so no plan on the purchase path has to raise it
+LONGEST_PLAN_TIMEOUT = max(plan_timeout(plan) for plan in
+                           [*PRODUCT_PLANS.values(), *ARM_PLANS.values(), ARMED_PLAN, CART_PLAN])
+
+
+def ensure_script_timeout(driver, seconds):
+    """set_script_timeout is a WebDriver round trip of its own - only raise it when a plan needs more.
+    A longer limit costs nothing: the runner ends every plan on its own step timeouts"""
+    if getattr(driver, '_plan_script_timeout', 0) < seconds:
+        driver.set_script_timeout(seconds)
+        driver._plan_script_timeout = seconds
+
+
+def run_plan(driver, plan, strategies=None, clock=None):
+    """One execute_async_script for the whole plan - returns the in-page report
+    The call doubles as a (loose) sample for clock, a ClockSync for the checkout browser"""
+    ensure_script_timeout(driver, plan_timeout(plan))
+    before = time.monotonic()
+    report = driver.execute_async_script(PLAN_RUNNER_JS, plan, strategies or {})
+    if clock is not None and isinstance(report, dict):
+        clock.add(before, report.get('clock'), time.monotonic())
+    return report
+
+
+def wait_for_url(driver, fragment, timeout=10.0, pause=time.sleep):
+    """Waits for a navigation to land (URL contains fragment) - pause lets the caller make it preemptible"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if fragment in (driver.current_url or ''):
+            return True
+        pause(0.02)
+    return False
+
+
+def navigate(driver, url, timeout=10.0, pause=time.sleep):
+    """driver.get() for page_load_strategy='none', which returns before the new document exists - waits until
+    the tab shows url's page and it has been parsed. The old document gets marked first, so parking on the
+    same URL again (or a slow navigation) can't be mistaken for the new page."""
+    try:
+        driver.execute_script("window.__planLeaving = true;")
+    except Exception:
+        pass  # Nothing usable loaded - nothing to mistake for the new page either
+    driver.get(url)
+    path = urlparse(url).path.rstrip('/')
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            page = driver.execute_script(
+                "return window.__planLeaving ? null : {url: location.href, ready: document.readyState};")
+        except Exception:
+            page = None  # Mid navigation - "document unloaded" and friends
+        if page and path in page['url'] and page['ready'] != 'loading':
+            return True
+        pause(0.02)
+    return False
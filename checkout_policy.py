@@ -0,0 +1,49 @@
+# checkout_policy.py
+"""
+Checkout Policy - decides who gets the checkout browser when several products restock at once
+Higher priority products go first, and can kick a lower priority checkout out while it's still
+sitting around waiting for pages to load
+"""
+
+import threading
+
+from event_log import LOG
+
+
+class CheckoutPreempted(Exception):
+    """Raised inside a checkout when a higher priority restock needs the checkout browser"""
+
+
+class CheckoutPolicy:
+    def __init__(self, priority_of):
+        self.priority_of = priority_of    # priority_of(product_id) -> 1..10
+        self.current = None               # (product_id, priority) of the checkout that's running
+        self.preempt = threading.Event()
+        self.lock = threading.Lock()
+
+    def order_key(self, status):
+        """Sort key for the checkout queue - highest priority first"""
+        return -self.priority_of(status.product_id)
+
+    def offer(self, status):
+        """A new restock made it past dedupe - preempt the running checkout if this one matters more"""
+        priority = self.priority_of(status.product_id)
+        with self.lock:
+            if self.current and priority > self.current[1]:
+                LOG.event('preempt', product=self.current[0], by=status.product_id)
+                self.preempt.set()
+
+    def begin(self, status):
+        with self.lock:
+            self.current = (status.product_id, self.priority_of(status.product_id))
+            self.preempt.clear()
+
+    def end(self):
+        with self.lock:
+            self.current = None
+            self.preempt.clear()
+
+    def wait(self, seconds):
+        """Sleeps during a checkout, but bails out with CheckoutPreempted if something more important shows up"""
+        if self.preempt.wait(seconds):
+            raise CheckoutPreempted()
@@ -0,0 +1,126 @@
+# clock_sync.py
+"""
+Clock Sync - puts browser times and Python times on one timeline
+Pages stamp things with performance.timeOrigin + performance.now(), Python uses time.monotonic(). Every
+script call that returns the page clock is a sample: the page read its clock somewhere between "before"
+and "after", so offset ≈ page - midpoint, good to ±rtt/2. Keeping the tightest samples and fitting a line
+through them gives each tab's offset; the tightest sample of every 10 seconds is kept for a while longer
+and a line through those gives the drift. Page times can then be mapped onto Python's clock.
+
+The shared timeline is monotonic time shifted once (at import) to look like epoch seconds - see now().
+It's for latency deltas only: anything saved or shown uses wall clock time (time.time(), or wall_time()).
+"""
+
+import threading
+import time
+from collections import deque
+
+# Evaluates to the page clock in ms - monotonic inside a document, epoch based like Date.now()
+PAGE_CLOCK_JS = "performance.timeOrigin + performance.now()"
+
+# monotonic → epoch seconds, fixed for the whole process so wall clock steps (NTP) can't bend the timeline
+WALL_AT_MONOTONIC_ZERO = time.time() - time.monotonic()
+
+
+def now():
+    """Aligned epoch seconds - use this instead of time.time() for anything compared with page times.
+    Not for timestamps that get saved or shown: the monotonic clock doesn't advance while the machine sleeps
+    (macOS, Linux suspend), so this falls behind real time over a long run"""
+    return time.monotonic() + WALL_AT_MONOTONIC_ZERO
+
+
+def monotonic_to_aligned(monotonic_seconds):
+    return monotonic_seconds + WALL_AT_MONOTONIC_ZERO
+
+
+def wall_time(aligned_seconds):
+    """Aligned seconds → wall clock (time.time()) as of right now - for saving or showing a page or latency time"""
+    return aligned_seconds + (time.time() - now())
+
+
+class ClockSync:
+    """One page clock vs time.monotonic() - feed it samples, ask it to map page times"""
+
+    def __init__(self, size=64, best=8, bucket_seconds=10.0, buckets=60):
+        self.samples = deque(maxlen=size)   # (midpoint monotonic, offset seconds, rtt seconds)
+        self.best = best                    # how many of the tightest recent samples the offset uses
+        self.bucket_seconds = bucket_seconds
+        self.buckets = deque(maxlen=buckets)  # tightest sample per bucket_seconds - ~10 minutes for the drift
+        self.fit = None                     # (anchor monotonic, offset at anchor, drift s/s, uncertainty s)
+        self.jumps = 0
+        self.lock = threading.Lock()
+
+    @property
+    def synced(self):
+        return self.fit is not None
+
+    def add(self, before, page_ms, after):
+        """One round trip: monotonic before the call, page clock (ms) read during it, monotonic after"""
+        if isinstance(page_ms, bool) or not isinstance(page_ms, (int, float)) or after < before:
+            return  # Page didn't answer with a number (old monitor, odd return)
+        rtt = after - before
+        mid = (before + after) / 2
+        offset = page_ms / 1000 - mid
+        with self.lock:
+            fit = self.fit
+            if fit is not None and rtt <= 2 * fit[3] + 0.002:
+                # A tight sample that disagrees with the fit means the page clock jumped (new document
+                # in another renderer, machine slept) - start over instead of averaging across the jump
+                if abs(offset - self._offset_at(fit, mid)) > max(0.005, rtt + 2 * fit[3]):
+                    self.samples.clear()
+                    self.buckets.clear()
+                    self.jumps += 1
+            sample = (mid, offset, rtt)
+            self.samples.append(sample)
+            if not self.buckets or mid - self.buckets[-1][0] >= self.bucket_seconds:
+                self.buckets.append(sample)
+            elif rtt < self.buckets[-1][2] and int(mid // self.bucket_seconds) == int(self.buckets[-1][0] // self.bucket_seconds):
+                self.buckets[-1] = sample
+            self.fit = self._fit()
+
+    def sample(self, driver):
+        """Spends one round trip on a sample - for idle moments (arming, keepalive), not the hot path"""
+        before = time.monotonic()
+        page_ms = driver.execute_script(f"return {PAGE_CLOCK_JS};")
+        self.add(before, page_ms, time.monotonic())
+
+    def _fit(self):
+        best = sorted(self.samples, key=lambda s: s[2])[:self.best]
+        # Loose samples only add noise - keep the ones close to the tightest round trip
+        best = [s for s in best if s[2] <= 2 * best[0][2] + 0.001]
+        anchor = sum(s[0] for s in best) / len(best)
+        offset = sum(s[1] for s in best) / len(best)
+        drift = 0.0
+        if len(self.buckets) >= 3:
+            mean_t = sum(s[0] for s in self.buckets) / len(self.buckets)
+            mean_o = sum(s[1] for s in self.buckets) / len(self.buckets)
+            spread = sum((s[0] - mean_t) ** 2 for s in self.buckets)
+            if spread > 0:
+                drift = sum((s[0] - mean_t) * (s[1] - mean_o) for s in self.buckets) / spread
+        return anchor, offset, drift, best[0][2] / 2
+
+    @staticmethod
+    def _offset_at(fit, monotonic_seconds):
+        anchor, offset, drift, _ = fit
+        return offset + drift * (monotonic_seconds - anchor)
+
+    def to_monotonic(self, page_seconds):
+        """Page clock (seconds) → time.monotonic() seconds, or None before the first sample"""
+        fit = self.fit
+        if fit is None or page_seconds is None:
+            return None
+        guess = page_seconds - fit[1]
+        return page_seconds - self._offset_at(fit, guess)
+
+    def to_aligned(self, page_seconds):
+        """Page clock (seconds) → now()-style aligned epoch seconds (unchanged if there's no fit yet)"""
+        monotonic_seconds = self.to_monotonic(page_seconds)
+        return page_seconds if monotonic_seconds is None else monotonic_to_aligned(monotonic_seconds)
+
+    def report(self):
+        """(offset vs aligned epoch, drift in ppm, uncertainty) in seconds - for metrics"""
+        fit = self.fit
+        if fit is None:
+            return None
+        anchor, offset, drift, uncertainty = fit
+        return offset - WALL_AT_MONOTONIC_ZERO, drift * 1e6, uncertainty
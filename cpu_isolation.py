@@ -0,0 +1,159 @@
+# cpu_isolation.py
+"""
+CPU Isolation - keeps the monitor browser from starving the checkout browser
+The checkout Chrome (chromedriver + browser + renderers) gets a few reserved cores, the monitor Chrome
+gets the rest at a lower priority, and while a checkout is running the checkout side borrows half of
+the monitor's cores. Needs psutil (comes with seleniumbase) - without it, or on an OS without CPU
+affinity, this just reports what it couldn't do and stays out of the way.
+"""
+
+import os
+import threading
+
+from event_log import LOG
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Nice values on Linux/macOS - going below 0 needs privileges, so the checkout side only tries
+CHECKOUT_NICE = -5
+CHECKOUT_BOOST_NICE = -10
+MONITOR_NICE = 5
+
+
+def browser_pids(driver):
+    """chromedriver, Chrome and everything they've spawned (renderers come and go, so ask again later)"""
+    roots = []
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    if process is not None:
+        roots.append(process.pid)
+    browser_pid = getattr(driver, 'browser_pid', None)  # UC mode starts Chrome itself
+    if browser_pid:
+        roots.append(browser_pid)
+    pids = set()
+    for pid in roots:
+        try:
+            root = psutil.Process(pid)
+            pids.add(root.pid)
+            pids.update(child.pid for child in root.children(recursive=True))
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return pids
+
+
+def split_cores(cores, reserved=None):
+    """(checkout cores, monitor cores) - a quarter for checkout by default, at least one each"""
+    cores = sorted(cores)
+    if len(cores) < 2:
+        return cores, cores
+    reserved = reserved or max(1, len(cores) // 4)
+    reserved = min(reserved, len(cores) - 1)
+    return cores[-reserved:], cores[:-reserved]
+
+
+class CpuIsolation:
+    def __init__(self, checkout_driver, monitor_driver, reserved_cores=None, rescan_seconds=5.0):
+        self.checkout_driver = checkout_driver
+        self.monitor_driver = monitor_driver
+        self.reserved_cores = reserved_cores
+        self.rescan_seconds = rescan_seconds
+        self.boosted = False
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.wake = threading.Event()   # set_boost() → re-apply now instead of at the next rescan
+        self.thread = None
+        self.checkout_cores = self.monitor_cores = []
+        self.warned = set()
+
+    @staticmethod
+    def available():
+        return psutil is not None and hasattr(psutil.Process, 'cpu_affinity')
+
+    def start(self):
+        if not self.available():
+            print("⚠️ CPU isolation needs psutil with CPU affinity support (Linux/Windows) - skipping")
+            return None
+        all_cores = psutil.Process().cpu_affinity() or list(range(os.cpu_count() or 1))
+        self.checkout_cores, self.monitor_cores = split_cores(all_cores, self.reserved_cores)
+        self.apply()
+        LOG.event('cpu_isolation', checkout_cores=self.checkout_cores, monitor_cores=self.monitor_cores)
+        self.thread = threading.Thread(target=self._run, name='cpu-isolation', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join(1.0)
+
+    def _run(self):
+        # New tabs mean new renderer processes - keep them in their lane
+        while True:
+            self.wake.wait(self.rescan_seconds)
+            self.wake.clear()
+            if self.stopped.is_set():
+                return
+            self.apply()
+
+    def set_boost(self, on):
+        """Checkout starting/finishing - borrow (or give back) half the monitor's cores
+        Called on the purchase path, so it only flips the flag - the process walk and syscalls happen on our thread"""
+        if self.thread is None or self.boosted == on:
+            return
+        self.boosted = on
+        self.wake.set()
+
+    def lanes(self):
+        """Current (checkout cores, checkout nice), (monitor cores, monitor nice)"""
+        if not self.boosted or len(self.monitor_cores) < 2:
+            return (self.checkout_cores, CHECKOUT_BOOST_NICE if self.boosted else CHECKOUT_NICE), \
+                   (self.monitor_cores, MONITOR_NICE)
+        lend = self.monitor_cores[len(self.monitor_cores) // 2:]
+        keep = self.monitor_cores[:len(self.monitor_cores) // 2]
+        return (sorted(self.checkout_cores + lend), CHECKOUT_BOOST_NICE), (keep, MONITOR_NICE)
+
+    def apply(self):
+        with self.lock:
+            (checkout_cores, checkout_nice), (monitor_cores, monitor_nice) = self.lanes()
+            self._apply_to(browser_pids(self.checkout_driver), checkout_cores, checkout_nice, high=True)
+            self._apply_to(browser_pids(self.monitor_driver), monitor_cores, monitor_nice, high=False)
+
+    def _apply_to(self, pids, cores, nice, high):
+        for pid in pids:
+            try:
+                process = psutil.Process(pid)
+                if sorted(process.cpu_affinity()) != cores:
+                    process.cpu_affinity(cores)
+                self._set_priority(process, nice, high)
+            except psutil.NoSuchProcess:
+                continue
+            except (psutil.AccessDenied, OSError) as e:
+                self._warn_once(f"affinity:{high}", f"Couldn't pin {'checkout' if high else 'monitor'} browser: {e}")
+
+    def _set_priority(self, process, nice, high):
+        if os.name == 'nt':
+            wanted = psutil.HIGH_PRIORITY_CLASS if high else psutil.BELOW_NORMAL_PRIORITY_CLASS
+            if process.nice() != wanted:
+                process.nice(wanted)
+            return
+        current = process.nice()
+        if high and current <= nice:
+            return
+        if not high and current >= nice:
+            return  # Never raise the monitor back up - unprivileged processes can't undo that anyway
+        try:
+            process.nice(nice)
+        except psutil.AccessDenied:
+            # Raising priority needs root/CAP_SYS_NICE - the core split still does most of the work
+            self._warn_once('nice', "Can't raise checkout browser priority without privileges - using core split only")
+        except OSError:
+            pass
+
+    def _warn_once(self, key, message):
+        if key not in self.warned:
+            self.warned.add(key)
+            LOG.event('cpu_isolation', level='warning', error=message)
@@ -0,0 +1,144 @@
+# detection_rules.py
+"""
+Detection Rules - every button text and class name the bot relies on, defined once
+The rules get compiled into a single generated JS matcher, so each check is one pass over the page
+no matter how many product layouts we know about. Adding a layout = adding a rule here.
+"""
+
+import json
+
+# How to find the stock button for each product type and tell whether it's in stock
+DETECTION_RULES = {
+    'popnow': {
+        'candidates': 'button',
+        'match_texts': ['BUY MULTIPLE BOXES', 'NOTIFY ME WHEN START'],
+        'in_stock_texts': ['BUY MULTIPLE BOXES'],
+        'out_of_stock_texts': ['NOTIFY ME WHEN START'],
+        # Elements that only show up on PopNow pages
+        'page_markers': ['[class*="ant-checkbox"]', '[class*="index_chooseMulitityBtn"]'],
+        'watching_for': 'NOTIFY ME WHEN START → Buy Multiple Boxes',
+    },
+    'normal': {
+        'candidates': '[class*="index_usBtn__"]',
+        'match_texts': ['ADD TO BAG'],
+        'in_stock_classes': ['index_red__'],
+        'out_of_stock_classes': ['index_black__'],
+        'page_markers': ['[class*="index_usBtn__"]'],
+        'watching_for': 'black button → red button (ADD TO BAG)',
+    },
+}
+
+# Buttons the checkout flow clicks
+ACTION_RULES = {
+    'buy_multiple': {
+        'selector': 'button.ant-btn.ant-btn-ghost.index_chooseMulitityBtn__n0MoA, button',
+        'texts': ['BUY MULTIPLE BOXES'],
+    },
+    'add_to_bag': {
+        'selector': 'div[class*="index_usBtn__"], button',
+        'texts': ['ADD TO BAG'],
+    },
+    'whole_set': {
+        'selector': 'div.index_sizeInfoItem__f_Uxb',
+        'title_selector': 'div.index_sizeInfoTitle__kpZbS',
+        'texts': ['WHOLE SET'],
+    },
+}
+
+
+def _any_includes(var, needles):
+    return ' || '.join(f"{var}.includes({json.dumps(n)})" for n in needles) or 'false'
+
+
+def _state_expression(rule):
+    """JS expression that evaluates to 'in', 'out' or 'unknown' for a matched element"""
+    if 'in_stock_classes' in rule:
+        red = _any_includes('cls', rule['in_stock_classes'])
+        black = _any_includes('cls', rule.get('out_of_stock_classes', []))
+        return f"(({red}) && !({black})) ? 'in' : (({black}) ? 'out' : 'unknown')"
+    in_stock = _any_includes('text', rule.get('in_stock_texts', []))
+    out_of_stock = _any_includes('text', rule.get('out_of_stock_texts', []))
+    return f"({in_stock}) ? 'in' : (({out_of_stock}) ? 'out' : 'unknown')"
+
+
+def compile_matcher(rules=DETECTION_RULES, actions=ACTION_RULES):
+    """Generates the page-side matcher: one querySelectorAll over every rule's candidates per check"""
+    union = ', '.join(rule['candidates'] for rule in rules.values())
+    blocks = []
+    for product_type, rule in rules.items():
+        blocks.append(f"""
+                if (!found[{json.dumps(product_type)}] && el.matches({json.dumps(rule['candidates'])})) {{
+                    if (text === null) text = el.textContent.trim().toUpperCase();
+                    if ({_any_includes('text', rule['match_texts'])}) {{
+                        const cls = typeof el.className === 'string' ? el.className : '';
+                        found[{json.dumps(product_type)}] = {{el: el, text: text, className: cls, state: {_state_expression(rule)}}};
+                        if (want === {json.dumps(product_type)}) break;
+                    }}
+                }}""")
+
+    states = ''.join(f"""
+            if (productType === {json.dumps(product_type)}) {{
+                if (!el.matches({json.dumps(rule['candidates'])})) return null;
+                return {_state_expression(rule)};
+            }}""" for product_type, rule in rules.items())
+
+    markers = ',\n                '.join(
+        f"{json.dumps(t)}: !!document.querySelector({json.dumps(', '.join(r['page_markers']))})"
+        for t, r in rules.items()
+    )
+
+    return f"""
+        window.__popmartActions = {json.dumps(actions)};
+
+        // One pass over every known stock button layout - want = product type to stop early on
+        window.__popmartMatch = function(want) {{
+            const found = {{}};
+            for (const el of document.querySelectorAll({json.dumps(union)})) {{
+                let text = null;{''.join(blocks)}
+            }}
+            return found;
+        }};
+
+        window.__popmartDetectType = function() {{
+            const found = window.__popmartMatch(null);
+            const markers = {{
+                {markers}
+            }};
+            return {{
+                popnow: !!found.popnow || markers.popnow,
+                normal: !!found.normal || markers.normal,
+                url: window.location.href
+            }};
+        }};
+
+        // Same verdict the detector gives, for an element we already hold (e.g. an armed handle) -
+        // null if it isn't one of that product type's stock buttons, so there's nothing to go by
+        window.__popmartStateOf = function(productType, el) {{
+            const text = el.textContent.trim().toUpperCase();
+            const cls = typeof el.className === 'string' ? el.className : '';{states}
+            return null;
+        }};
+
+        window.__popmartFind = function(name) {{
+            const action = window.__popmartActions[name];
+            for (const el of document.querySelectorAll(action.selector)) {{
+                const target = action.title_selector ? el.querySelector(action.title_selector) : el;
+                if (!target) continue;
+                const text = target.textContent.trim().toUpperCase();
+                if (action.texts.some(t => text.includes(t))) return el;
+            }}
+            return null;
+        }};
+    """
+
+
+MATCHER_JS = compile_matcher()
+
+
+def with_matcher(body):
+    """Prepends the compiled matcher to a script so it works on any page, even one we haven't injected into"""
+    return MATCHER_JS + "\n" + body
+
+
+def watching_for(product_type):
+    return DETECTION_RULES.get(product_type, DETECTION_RULES['normal'])['watching_for']
@@ -0,0 +1,103 @@
+# drop_schedule.py
+"""
+Drop Scheduler - knows when each product's announced drop happens
+Keeps tabs sleepy until just before the window opens, then arms everything at full speed
+
+Catalog entries can carry a window like:
+    "drop_window": {"start": "2026-10-20 10:00", "end": "2026-10-20 10:30", "prearm_seconds": 120}
+"end" and "prearm_seconds" are optional. Times are local time.
+"""
+
+import time
+from datetime import datetime
+
+IDLE = 'idle'        # Window is far away - poll slowly
+PREARM = 'prearm'    # Window opens soon - warm up checkout, detectors at full rate
+LIVE = 'live'        # Window is open
+DONE = 'done'        # Window is over - back to idle
+
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M')
+
+
+def parse_drop_time(value):
+    """Turns a catalog time (string or unix timestamp) into a unix timestamp"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Can't understand drop time '{value}' - use YYYY-MM-DD HH:MM")
+
+
+def check_drop_window(window):
+    """Catalog drop_window → the same dict, or ValueError - so a typo fails at load, not on every tick"""
+    if window is None:
+        return None
+    if not isinstance(window, dict) or 'start' not in window:
+        raise ValueError(f"drop_window needs at least a start time, got {window!r}")
+    start = parse_drop_time(window['start'])
+    if window.get('end') and parse_drop_time(window['end']) <= start:
+        raise ValueError(f"drop_window ends before it starts ({window['start']} → {window['end']})")
+    prearm = window.get('prearm_seconds', 0)
+    if isinstance(prearm, bool) or not isinstance(prearm, (int, float)) or prearm < 0:
+        raise ValueError(f"drop_window prearm_seconds must be a number of seconds, got {prearm!r}")
+    return window
+
+
+class DropScheduler:
+    def __init__(self, products, prearm_seconds=120, default_duration=1800):
+        self.products = products
+        self.prearm_seconds = prearm_seconds
+        self.default_duration = default_duration
+        self.phases = {}
+
+    def window_for(self, product_id):
+        """Returns (prearm_at, start, end) for a product, or None if it has no drop window"""
+        product = self.products.get(product_id)
+        window = product.drop_window if product else None
+        if not window:
+            return None
+        start = parse_drop_time(window['start'])
+        end = parse_drop_time(window['end']) if window.get('end') else start + self.default_duration
+        prearm = window.get('prearm_seconds', self.prearm_seconds)
+        return start - prearm, start, end
+
+    def has_window(self, product_id):
+        return self.window_for(product_id) is not None
+
+    def phase(self, product_id, now=None):
+        """Which phase a product is in right now - products without a window are always live"""
+        window = self.window_for(product_id)
+        if window is None:
+            return LIVE
+        now = time.time() if now is None else now
+        prearm_at, start, end = window
+        if now < prearm_at:
+            return IDLE
+        if now < start:
+            return PREARM
+        if now < end:
+            return LIVE
+        return DONE
+
+    def poll_transitions(self, product_ids, now=None):
+        """Returns [(product_id, old_phase, new_phase)] for every product whose phase moved since last time"""
+        transitions = []
+        for pid in product_ids:
+            new_phase = self.phase(pid, now)
+            old_phase = self.phases.get(pid)
+            if new_phase != old_phase:
+                self.phases[pid] = new_phase
+                transitions.append((pid, old_phase, new_phase))
+        return transitions
+
+    def describe(self, product_id):
+        """Human readable summary of a product's window for the startup banner"""
+        window = self.window_for(product_id)
+        if window is None:
+            return "no drop window - monitoring continuously"
+        prearm_at, start, end = window
+        fmt = lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+        return f"drop {fmt(start)} → {fmt(end)} (armed from {fmt(prearm_at)})"
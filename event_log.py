@@ -0,0 +1,115 @@
+# event_log.py
+"""
+Event Log - structured logging that never slows down detection or checkout
+Hot path calls just drop a record on a queue. A background thread does the formatting,
+writes JSON lines to disk for later digging, and prints a compact line to the console.
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+ICONS = {
+    'restock_detected': '🚨',
+    'stock_available': '🟢',
+    'stock_found': '🎯',
+    'checkout_start': '⚡',
+    'checkout_step': '▶️',
+    'checkout_done': '✅',
+    'checkout_preempted': '⏸️',
+    'checkout_requeued': '🔁',
+    'preempt': '⏫',
+    'drop_armed': '⏰',
+    'armed': '🚀',
+    'checkout_armed': '🎯',
+    'session_valid': '🔓',
+    'session_invalid': '🔒',
+    'session_expiring': '⌛',
+    'drop_idle': '💤',
+    'checkout_error': '❌',
+    'monitor_error': '⚠️',
+    'notify_error': '📭',
+    'evidence': '📸',
+}
+
+_STOP = object()
+
+
+class EventLogger:
+    def __init__(self, directory='logs', console=True, maxsize=10000):
+        self.directory = directory
+        self.console = console
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.path = None
+        self.thread = None
+        self._start_lock = threading.Lock()
+        self._inline_open = False
+
+    def event(self, name, /, level='info', inline=False, **fields):
+        """Hot path - just queues the record. inline=True renders as an in-place status line.
+        name is positional-only so callers can log a product name=... field too."""
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait((time.time(), name, level, inline, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self._start_lock:
+            if self.thread is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, f"events-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl")
+            self.thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """Flushes whatever is still queued"""
+        if self.thread is None:
+            return
+        try:
+            self.queue.put((time.time(), _STOP, None, False, None), timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                ts, name, level, inline, fields = self.queue.get()
+                if name is _STOP:
+                    f.flush()
+                    return
+                record = {'ts': ts, 'event': name, 'level': level}
+                record.update(fields)
+                f.write(json.dumps(record, default=str) + '\n')
+                if self.queue.empty():
+                    f.flush()
+                if self.console:
+                    self._render(ts, name, inline, fields)
+
+    def _render(self, ts, name, inline, fields):
+        """Compact one-liner: icon, time, event and key=value pairs"""
+        stamp = datetime.fromtimestamp(ts).strftime('%H:%M:%S.%f')[:-3]
+        icon = fields.pop('icon', None) or ICONS.get(name, '•')
+        details = ' '.join(f"{k}={v}" for k, v in fields.items())
+        line = f"{icon} {stamp} {name} {details}".rstrip()
+        if inline:
+            sys.stdout.write('\r' + line)
+            self._inline_open = True
+        else:
+            # Don't glue a normal line onto the end of the in-place status line
+            sys.stdout.write(('\n' if self._inline_open else '') + line + '\n')
+            self._inline_open = False
+        sys.stdout.flush()
+
+
+# Shared logger for the whole bot
+LOG = EventLogger()
@@ -0,0 +1,153 @@
+# event_pipeline.py
+"""
+Event Pipeline - moves stock events from the detectors to checkout through separate stages
+Each stage has its own bounded queue, worker thread and timing numbers, so a slow stage shows up
+on its own and new stages (notifications, logging...) can be bolted on without touching detection
+"""
+
+import itertools
+import queue
+import threading
+import time
+
+from event_log import LOG
+
+_STOP = object()
+_sequence = itertools.count()
+
+
+class PipelineStage:
+    def __init__(self, name, handler, maxsize=64, priority=None, metrics=None, labels=None):
+        self.name = name
+        self.metrics_registry = metrics   # Optional MetricsRegistry for the /metrics endpoint
+        self.labels = labels or {}        # Extra metric labels, e.g. the region whose pipeline this is
+        self.handler = handler            # handler(event) -> event for the next stage, or None to drop it
+        self.priority = priority          # Optional priority(event) -> sort key, lowest goes first
+        self.queue = queue.PriorityQueue(maxsize=maxsize) if priority else queue.Queue(maxsize=maxsize)
+        self.next_stage = None
+        self.thread = None
+        # Metrics
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def put(self, event, block=True):
+        """Hands an event to this stage - returns False if the queue was full and we didn't block"""
+        key = self.priority(event) if self.priority else 0
+        try:
+            self.queue.put((key, next(_sequence), time.perf_counter(), event), block=block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        # Stop jumps the line even on a priority queue
+        try:
+            self.queue.put((float('-inf'), next(_sequence), time.perf_counter(), _STOP), timeout=timeout)
+        except queue.Full:
+            pass  # Daemon thread - it dies with the process anyway
+        if self.thread:
+            self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            _, _, enqueued_at, event = self.queue.get()
+            if event is _STOP:
+                return
+            started = time.perf_counter()
+            wait = started - enqueued_at
+            try:
+                result = self.handler(event)
+            except Exception as e:
+                self.errors += 1
+                LOG.event('pipeline_error', level='error', stage=self.name, error=f"{type(e).__name__}: {e}")
+                result = None
+            latency = time.perf_counter() - started
+
+            self.processed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if self.metrics_registry:
+                self.metrics_registry.observe('popmart_pipeline_stage_seconds', wait, 'Time events spend per pipeline stage',
+                                              stage=self.name, phase='wait', **self.labels)
+                self.metrics_registry.observe('popmart_pipeline_stage_seconds', latency, 'Time events spend per pipeline stage',
+                                              stage=self.name, phase='run', **self.labels)
+                self.metrics_registry.set('popmart_pipeline_queue_depth', self.queue.qsize(), 'Events waiting in each pipeline stage',
+                                          stage=self.name, **self.labels)
+
+            if result is not None and self.next_stage:
+                # Downstream gets back-pressure instead of losing checkout events
+                self.next_stage.put(result)
+
+    def metrics(self):
+        processed = self.processed or 1
+        return {
+            'stage': self.name,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_depth,
+            'avg_wait_ms': self.total_wait / processed * 1000,
+            'max_wait_ms': self.max_wait * 1000,
+            'avg_latency_ms': self.total_latency / processed * 1000,
+            'max_latency_ms': self.max_latency * 1000,
+        }
+
+
+class EventPipeline:
+    def __init__(self, metrics=None, labels=None):
+        self.metrics_registry = metrics
+        self.labels = labels              # Added to every stage's metrics
+        self.stages = []
+        self.stopped = threading.Event()   # Set when a stage asks monitoring to stop (e.g. checkout succeeded)
+
+    def add_stage(self, name, handler, maxsize=64, priority=None):
+        """Appends a stage to the end of the pipeline"""
+        stage = PipelineStage(name, handler, maxsize, priority, self.metrics_registry, self.labels)
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def submit(self, event):
+        """Detector side entry point - never blocks the monitoring loop, drops the event if the first stage is backed up"""
+        return self.stages[0].put(event, block=False)
+
+    def request_stop(self):
+        self.stopped.set()
+
+    def stop(self):
+        self.stopped.set()
+        for stage in self.stages:
+            stage.stop()
+
+    def metrics(self):
+        return [stage.metrics() for stage in self.stages]
+
+    def print_metrics(self):
+        """Prints a little per-stage table so the slow stage is obvious"""
+        print("\n📊 Pipeline stages:")
+        for m in self.metrics():
+            print(f"  {m['stage']:<10} processed={m['processed']:<6} dropped={m['dropped']:<3} "
+                  f"depth={m['queue_depth']}/{m['max_queue_depth']} "
+                  f"wait={m['avg_wait_ms']:.2f}/{m['max_wait_ms']:.2f}ms "
+                  f"run={m['avg_latency_ms']:.2f}/{m['max_latency_ms']:.2f}ms")
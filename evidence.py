@@ -0,0 +1,281 @@
+# evidence.py
+"""
+Evidence - what the page looked like when a restock was detected and how each checkout went
+capture() only queues a request. A background thread talks to Chrome over its own DevTools websocket
+(the debugger port chromedriver already opened), so it never waits behind - or holds up - the WebDriver
+commands the monitor and checkout are sending. Each capture (DOM, screenshot, detector state) is
+gzipped into evidence/ and the oldest ones are deleted once the folder goes over its size cap.
+Captures name their tab by window handle - chromedriver's handle is the DevTools target id.
+
+    python evidence.py list                     # newest captures first
+    python evidence.py extract FILE [--out DIR] # FILE.html, FILE.jpg and FILE.json for a look
+"""
+
+import argparse
+import base64
+import gzip
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from event_log import LOG
+from metrics import REGISTRY
+
+try:
+    import websocket  # websocket-client, comes with selenium
+except ImportError:
+    websocket = None
+
+EVIDENCE_DIR = 'evidence'
+
+# Everything the detectors and the checkout runner keep on the page, in one evaluate
+STATE_JS = """JSON.stringify({
+    url: location.href,
+    readyState: document.readyState,
+    productType: window.stockMonitor ? window.stockMonitor.productType : null,
+    stockStatus: window.__stockStatus || null,
+    stockAvailable: window.__stockAvailable === undefined ? null : window.__stockAvailable,
+    stockLog: window.__stockLog || null,
+    planRequests: window.__planRequests || null,
+    armedHandles: Object.keys(window.__armedHandles || {})
+})"""
+
+_STOP = object()
+
+
+def debugger_address(driver):
+    """host:port of the browser's DevTools endpoint, from the session capabilities"""
+    try:
+        return driver.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+    except Exception:
+        return None
+
+
+class DevToolsPage:
+    """One websocket straight to a page target - a second client next to chromedriver's own"""
+
+    def __init__(self, address, target_id, timeout=5.0):
+        self.timeout = timeout
+        with urllib.request.urlopen(f"http://{address}/json/list", timeout=timeout) as response:
+            targets = [t for t in json.load(response) if t.get('id', '').upper() == target_id.upper()]
+        if not targets:
+            raise RuntimeError(f"tab {target_id} is gone")
+        self.target = targets[0]
+        self.ws = websocket.create_connection(self.target['webSocketDebuggerUrl'], timeout=timeout,
+                                              suppress_origin=True)
+        self.ids = itertools.count(1)
+
+    def call(self, method, **params):
+        message_id = next(self.ids)
+        self.ws.send(json.dumps({'id': message_id, 'method': method, 'params': params}))
+        deadline = time.time() + self.timeout
+        while time.time() < deadline:
+            message = json.loads(self.ws.recv())
+            if message.get('id') != message_id:
+                continue  # Events we never subscribed to, or a late answer
+            if 'error' in message:
+                raise RuntimeError(f"{method}: {message['error'].get('message')}")
+            return message.get('result', {})
+        raise TimeoutError(f"{method} took longer than {self.timeout}s")
+
+    def evaluate(self, expression):
+        result = self.call('Runtime.evaluate', expression=expression, returnByValue=True)
+        return result.get('result', {}).get('value')
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class EvidenceStore:
+    """evidence/<time>-<label>-<product>.json.gz, oldest deleted first once over max_bytes"""
+
+    def __init__(self, directory=EVIDENCE_DIR, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def files(self):
+        """(path, size) oldest first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json.gz'):
+                path = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(path), path, os.path.getsize(path)))
+        return [(path, size) for _, path, size in sorted(entries)]
+
+    def save(self, capture):
+        stamp = datetime.fromtimestamp(capture['ts']).strftime('%Y%m%d-%H%M%S-%f')[:-3]
+        name = '-'.join(part for part in (stamp, capture['label'], capture.get('product')) if part)
+        path = os.path.join(self.directory, f"{name}.json.gz")
+        with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(capture, f, default=str)
+        self.rotate()
+        return path
+
+    def rotate(self):
+        files = self.files()
+        total = sum(size for _, size in files)
+        for path, size in files[:-1]:  # Never delete the one just written
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class EvidenceRecorder:
+    """capture() from the hot path - the DevTools work happens on the evidence thread"""
+
+    def __init__(self, store, maxsize=32, metrics=REGISTRY):
+        self.store = store
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+        self.warned = False
+
+    @staticmethod
+    def available():
+        return websocket is not None
+
+    def start(self):
+        if not self.available():
+            print("⚠️ Evidence capture needs websocket-client (comes with selenium) - skipping")
+            return None
+        self.thread = threading.Thread(target=self._run, name='evidence', daemon=True)
+        self.thread.start()
+        return self
+
+    def capture(self, driver, target_id, label, product=None, dom=True, **details):
+        """Queues a capture of one of driver's tabs (target_id = its window handle) - never blocks; a full queue drops it
+        dom=False leaves the page source out, for tabs whose story is already in details"""
+        if self.thread is None:
+            return
+        request = (time.time(), debugger_address(driver), target_id, label, product, dom, details)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            self._count(label, 'dropped')
+
+    def stop(self, timeout=5.0):
+        """Finishes the captures already queued"""
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _run(self):
+        while True:
+            request = self.queue.get()
+            if request is _STOP:
+                return
+            requested_at, address, target_id, label, product, dom, details = request
+            try:
+                path = self.store.save(self.take(requested_at, address, target_id, label, product, dom, details))
+                self._count(label, 'saved')
+                LOG.event('evidence', label=label, product=product, path=path,
+                          lag_ms=round((time.time() - requested_at) * 1000))
+            except Exception as e:
+                self._count(label, 'failed')
+                if not self.warned:
+                    self.warned = True
+                    LOG.event('evidence', level='warning', label=label, error=str(e))
+
+    def take(self, requested_at, address, target_id, label, product, dom, details):
+        if not address:
+            raise RuntimeError("browser has no DevTools debugger address")
+        if not target_id:
+            raise RuntimeError("no tab to capture")
+        page = DevToolsPage(address, target_id)
+        try:
+            state = page.evaluate(STATE_JS)
+            dom = page.evaluate('document.documentElement.outerHTML') if dom else None
+            # Best effort - a background tab or one mid navigation can refuse, the rest is still worth keeping
+            try:
+                shot, shot_error = page.call('Page.captureScreenshot', format='jpeg', quality=60), None
+            except Exception as e:
+                shot, shot_error = {}, f"{type(e).__name__}: {e}"
+        finally:
+            page.close()
+        return {
+            'ts': requested_at,
+            'captured_ts': time.time(),
+            'label': label,
+            'product': product,
+            'details': details,
+            'url': page.target.get('url'),
+            'state': json.loads(state) if state else None,
+            'dom': dom,
+            'screenshot_jpeg': shot.get('data'),  # base64
+            'screenshot_error': shot_error,
+        }
+
+    def _count(self, label, outcome):
+        if self.metrics:
+            self.metrics.inc('popmart_evidence_captures_total', 1, 'Evidence captures by label and outcome',
+                             label=label, outcome=outcome)
+
+
+def build_recorder(max_mb, directory=EVIDENCE_DIR):
+    """Started recorder capped at max_mb, or None (0 turns evidence off, or websocket-client is missing)"""
+    if not max_mb:
+        return None
+    return EvidenceRecorder(EvidenceStore(directory, int(max_mb * 1024 * 1024))).start()
+
+
+def load(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def extract(path, out=None):
+    """Writes the capture's DOM, screenshot and everything else next to each other"""
+    capture = load(path)
+    base = os.path.join(out or os.path.dirname(path), os.path.basename(path)[:-len('.json.gz')])
+    os.makedirs(os.path.dirname(base) or '.', exist_ok=True)
+    with open(base + '.html', 'w', encoding='utf-8') as f:
+        f.write(capture.pop('dom') or '')
+    shot = capture.pop('screenshot_jpeg', None)
+    if shot:
+        with open(base + '.jpg', 'wb') as f:
+            f.write(base64.b64decode(shot))
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(capture, f, indent=2, default=str)
+    return base
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look through captured detection/checkout evidence")
+    parser.add_argument('--dir', default=EVIDENCE_DIR, help="evidence folder (default evidence)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="captures, newest first")
+    extract_parser = sub.add_parser('extract', help="unpack one capture into .html/.jpg/.json")
+    extract_parser.add_argument('file')
+    extract_parser.add_argument('--out', help="where to write (default next to the capture)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        files = EvidenceStore(args.dir).files()
+        total = sum(size for _, size in files)
+        print(f"📁 {len(files)} capture(s), {total / 1024 / 1024:.1f} MB in {args.dir}/")
+        for path, size in reversed(files):
+            print(f"  {os.path.basename(path)}  {size / 1024:.0f} KB")
+    else:
+        print(f"✅ Extracted to {extract(args.file, args.out)}.*")
+
+
+if __name__ == '__main__':
+    main()
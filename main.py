@@ -7,58 +7,150 @@ NEW: JavaScript navigation optimization with reliable select all
 - Replaced slow driver.get() with fast window.location.href
 - Optimized page load waiting for maximum reliability
 - Maintains full stealth and anti-detection features
-- Cart → Select All process: 3 seconds wait + retry logic for reliability
+- Checkout runs as in-page plans that wait on the DOM instead of fixed sleeps (one script call per page)
 - Fast and reliable checkout while maintaining success rate!
 """
 
 import time
-from datetime import datetime
+# Time-to-armed is measured from here, before the heavy imports
+LAUNCHED_AT = time.perf_counter()
+import threading
 from seleniumbase import Driver
-from unified_monitor import UnifiedPopMartMonitor
+from unified_monitor import UnifiedPopMartMonitor, load_catalog
+from checkout_policy import CheckoutPreempted
+from selector_cache import SelectorCache, SELECT_ALL_STRATEGIES, CHECKOUT_STRATEGIES
+from checkout_plans import (CART_PLAN, LONGEST_PLAN_TIMEOUT, product_plan, arm_plan, armed_plan, run_plan,
+                            wait_for_url, navigate, ensure_script_timeout)
+from metrics import REGISTRY, MetricsServer
+from event_log import LOG
+from records import CheckoutAttempt
+from run_config import RunConfig, from_args
+from cpu_isolation import CpuIsolation
+from regions import DEFAULT_REGION, region_root, cart_url, account_url, account_path, guess_product, split_product_spec
+from browser_session import profile_dir, check_session, wait_for_load, SessionKeepalive
+from profiler import SessionProfiler
+from notifications import build_notifier
+from evidence import build_recorder
+from clock_sync import ClockSync, wall_time
 # Remove unused imports to keep things clean
 # import json
 # import threading
 # import queue
 
+# Several undetected Chromes starting at once trip over each other patching chromedriver - one at a time
+DRIVER_START_LOCK = threading.Lock()
+
+# How long an unattended run waits for someone to log in the checkout browser before giving up
+LOGIN_WAIT_SECONDS = 15 * 60
+
+
 class PopMartBot:
-    def __init__(self):
+    def __init__(self, config=None, standalone=True, notifier=None, evidence=None):
+        # Startup answers - product choice, whole set, auto-checkout, what to do on exit
+        self.config = config or RunConfig()
+        # One bot = one storefront region with its own monitor + checkout browsers
+        self.region = self.config.region
+        # False when a multi-region run owns the event log, the metrics endpoint and the notifier
+        self.standalone = standalone
+        # --notify sinks - events only get queued here, delivery happens on the notifier's threads
+        self.notifier = notifier if notifier is not None or not standalone else build_notifier(self.config.notify)
+        # DOM/screenshot/detector captures at detection and each checkout stage (started in run())
+        self.evidence = evidence
         self.monitor_driver = None
         self.checkout_driver = None
         self.monitor = None
-        self.auto_checkout = True
+        self.auto_checkout = self.config.auto_checkout
         self.monitoring = True
+        # Set by stop() - also reaches the parts of startup that wait (the unattended login wait)
+        self.stopped = threading.Event()
         # Remove unused queue since we don't actually use it
         # self.stock_queue = queue.Queue()
         self.checkout_successful = False
+        # The most recent CheckoutAttempt (outcome + timing)
+        self.last_attempt = None
         self.prefer_whole_set = False
+        # Checkout runs on the pipeline's executor thread - only one thing drives the checkout browser at a time
+        self.checkout_lock = threading.Lock()
+        # Remembers which cart selectors worked so checkout doesn't rescan the whole page every time
+        self.selectors = SelectorCache()
+        # Local Prometheus endpoint (None turns it off)
+        self.metrics_port = self.config.metrics_port or None
+        self.metrics_server = None
+        # --profile: samples Python, profiles the browser tabs and times the injected monitor
+        self.profiler = SessionProfiler() if self.config.profile else None
+        # Product the checkout browser gets parked on ahead of time, and (product_id, whole_set_applied)
+        # while that page is armed - at detection time only the add to bag click is left
+        self.arm_target = None
+        self.armed = None
+        # --isolate-cpus: checkout browser on reserved cores, monitors on the rest
+        self.isolation = None
+        # Checkout page clock vs ours - sampled while idle so click times line up with the monitor tabs' times
+        self.checkout_clock = ClockSync()
+        # Keeps the checkout login alive and shouts early if it expires (seconds between probes, None = off)
+        self.keepalive_interval = 60
+        self.keepalive = None
+        # (phase, perf_counter) as startup goes along, plus time spent waiting on a human to log in
+        self.startup_marks = [('launch', LAUNCHED_AT)]
+        self.login_wait = 0.0
         
+    def profile_name(self, role):
+        """The default region keeps the plain names so existing profiles (and logins) carry over"""
+        return role if self.region == DEFAULT_REGION else f"{role}-{self.region}"
+    
     def setup_monitor_driver(self):
         """Setup browser for monitoring (lightweight)"""
         print("🔍 Starting monitor browser...")
         
-        self.monitor_driver = Driver(
-            uc=True,
-            headless=False,
-            incognito=False,
-            undetectable=True,
-            page_load_strategy='none'  # Skip waiting for resources to load - makes it really fast
-        )
-        
-        self.monitor = UnifiedPopMartMonitor(self.monitor_driver)
+        self.monitor_driver = self.start_monitor_browser()
+        self.monitor = UnifiedPopMartMonitor(self.monitor_driver, region=self.region)
+        self.monitor.on_prearm = self.prewarm_for_drop
+        self.monitor.on_armed = self.report_armed
+        self.monitor.on_driver_lost = self.replace_monitor_driver
+        if self.profiler:
+            self.monitor.on_inject = self.profiler.instrument_tab
         print("✅ Monitor browser ready")
     
+    def start_monitor_browser(self):
+        with DRIVER_START_LOCK:
+            return Driver(
+                uc=True,
+                headless=False,
+                incognito=False,
+                undetectable=True,
+                user_data_dir=profile_dir(self.profile_name('monitor'), self.config.browser_profiles),  # Warm cache across restarts
+                page_load_strategy='none'  # Skip waiting for resources to load - makes it really fast
+            )
+    
+    def replace_monitor_driver(self):
+        """The monitor's chromedriver session died - start a fresh monitor browser on the same profile"""
+        print("\n🔁 Monitor browser lost - starting a new one...")
+        try:
+            self.monitor_driver.quit()  # Frees the profile if Chrome is still hanging around
+        except Exception:
+            pass
+        try:
+            self.monitor_driver = self.start_monitor_browser()
+        except Exception as e:
+            LOG.event('monitor_error', level='error', where='failover', error=str(e))
+            return None
+        if self.isolation:
+            self.isolation.monitor_driver = self.monitor_driver
+        return self.monitor_driver
+    
     def setup_checkout_driver(self):
         """Setup separate browser for checkout (stays logged in) - OPTIMIZED"""
         print("🛒 Starting checkout browser...")
         
-        self.checkout_driver = Driver(
-            uc=True,
-            headless=False,
-            incognito=False,
-            undetectable=True,
-            uc_cdp_events=True,
-            page_load_strategy='none'  # Skip waiting for resources to load - makes it really fast
-        )
+        with DRIVER_START_LOCK:
+            self.checkout_driver = Driver(
+                uc=True,
+                headless=False,
+                incognito=False,
+                undetectable=True,
+                uc_cdp_events=True,
+                user_data_dir=profile_dir(self.profile_name('checkout'), self.config.browser_profiles),  # Keeps the login across restarts
+                page_load_strategy='none'  # Skip waiting for resources to load - makes it really fast
+            )
         
         # Make the checkout browser harder to detect
         self.checkout_driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
@@ -84,32 +176,64 @@ class PopMartBot:
             '''
         })
         
+        # Checkout plans are async scripts - give them their time limit now, not on the purchase path
+        ensure_script_timeout(self.checkout_driver, LONGEST_PLAN_TIMEOUT)
+        
+        if self.profiler:
+            self.profiler.start_browser_profile(self.checkout_driver, 'checkout')
         print("✅ Checkout browser ready")
     
     def login_checkout_browser(self):
-        """Login on checkout browser and keep it ready - OPTIMIZED"""
-        print("\n" + "="*60)
-        print("🔐 LOGIN TO CHECKOUT BROWSER")
-        print("="*60)
-        print("⚠️ IMPORTANT: This browser will be used for checkout")
-        print("1. Login to your PopMart account")
-        print("2. Complete any captchas")
-        print("3. Stay logged in - DO NOT close this browser")
-        print("="*60)
-        
-        self.checkout_driver.get("https://www.popmart.com/ca/account")
+        """Login on checkout browser and keep it ready - skipped when the saved profile is still logged in
+        Returns False if an unattended run gave up waiting for the login"""
+        self.checkout_driver.get(account_url(self.region))
+        wait_for_load(self.checkout_driver, timeout=5.0)
         
-        input("\n✅ Press ENTER when logged in...")
-        print("Login confirmed!")
+        valid, reason = check_session(self.checkout_driver, account_path(self.region))
+        if valid:
+            LOG.event('session_valid', reason=reason)
+        elif self.config.login == 'assume':
+            print(f"⏩ Assuming the checkout browser is already logged in (--login assume) - check says: {reason}")
+        else:
+            print("\n" + "="*60)
+            print("🔐 LOGIN TO CHECKOUT BROWSER")
+            print("="*60)
+            print("⚠️ IMPORTANT: This browser will be used for checkout")
+            print("1. Login to your PopMart account")
+            print("2. Complete any captchas")
+            print("3. Stay logged in - DO NOT close this browser")
+            print("="*60)
+            
+            waiting = time.perf_counter()
+            if self.config.unattended:
+                # Nobody to press ENTER - just wait until the login shows up in the cookies
+                print(f"\n⏳ Waiting for you to log in (checked every 2 seconds, up to {LOGIN_WAIT_SECONDS // 60} min)...")
+                deadline = time.time() + LOGIN_WAIT_SECONDS
+                while not valid:
+                    if self.stopped.wait(2):
+                        return False
+                    if time.time() > deadline:
+                        LOG.event('session_invalid', level='error', reason=reason, action='gave up waiting for login')
+                        print(f"❌ Nobody logged in to the checkout browser within {LOGIN_WAIT_SECONDS // 60} min - "
+                              "log in once with a normal run (or use --login assume), then start again")
+                        return False
+                    valid, reason = check_session(self.checkout_driver, account_path(self.region))
+            else:
+                input("\n✅ Press ENTER when logged in...")
+                valid, reason = check_session(self.checkout_driver, account_path(self.region))
+                if not valid:
+                    LOG.event('session_invalid', level='warning', reason=reason)
+            self.login_wait = time.perf_counter() - waiting
+            print("Login confirmed!")
         
-        # Warm up the browser by visiting some key pages first
+        # Warm up the browser by visiting some key pages first - with a saved profile most of it comes from disk
         print("⚡ Pre-warming checkout browser...")
-        self.checkout_driver.get("https://www.popmart.com/ca")
-        time.sleep(0.2)  # Quick warm-up, much faster than before
+        self.checkout_driver.get(region_root(self.region))
+        wait_for_load(self.checkout_driver, timeout=2.0)
         
         # Visit the cart page to cache some resources
-        self.checkout_driver.execute_script("window.open('https://www.popmart.com/ca/largeShoppingCart', '_blank');")
-        time.sleep(0.2)  # Quick cart pre-load, much faster than before
+        self.checkout_driver.execute_script("window.open(arguments[0], '_blank');", cart_url(self.region))
+        time.sleep(0.2)
         
         # Close that extra tab we opened
         handles = self.checkout_driver.window_handles
@@ -119,475 +243,327 @@ class PopMartBot:
             self.checkout_driver.switch_to.window(handles[0])
         
         print("✅ Checkout browser ready and pre-warmed!")
+        return True
+    
+    def prewarm_for_drop(self, product_id):
+        """Drop window is about to open - park the checkout browser on the product page so it's hot"""
+        product = self.monitor.products[product_id]
+        LOG.event('prewarm', product=product_id, name=product.name)
+        with self.checkout_lock:
+            self.arm_checkout_page(product_id)
+            if self.keepalive:
+                # Last chance to find out about a dead login before it costs a checkout
+                self.keepalive.check_now()
+    
+    def arm_checkout_page(self, product_id):
+        """Parks the checkout browser on the product page with the variant already picked and the
+        add to bag button's handle cached - caller holds checkout_lock"""
+        product = self.monitor.products[product_id]
+        self.arm_target = product_id
+        self.armed = None
+        if not navigate(self.checkout_driver, product.url, timeout=5.0):
+            LOG.event('checkout_armed', level='warning', product=product_id, ok=False, error="product page never loaded")
+            return False
+        self.sample_checkout_clock()
+        plan = arm_plan(product.product_type, self.prefer_whole_set)
+        if not plan:
+            self.armed = (product_id, False)
+            return True
+        try:
+            report = run_plan(self.checkout_driver, plan)
+        except Exception as e:
+            LOG.event('checkout_armed', level='warning', product=product_id, ok=False, error=str(e))
+            return False
+        applied = any(step['step'] == 'whole_set' and step['ok'] for step in report.get('steps', []))
+        LOG.event('checkout_armed', product=product_id, ok=report.get('ok'), whole_set=applied,
+                  ms=report.get('totalMs'))
+        if report.get('ok'):
+            self.armed = (product_id, applied)
+        return bool(report.get('ok'))
+    
+    def sample_checkout_clock(self, samples=5):
+        """A few tight clock samples on the page a checkout will start from - caller holds checkout_lock"""
+        try:
+            for _ in range(samples):
+                self.checkout_clock.sample(self.checkout_driver)
+        except Exception as e:
+            LOG.event('checkout_error', level='warning', where='clock_sample', error=str(e))
+    
+    def pre_arm_checkout(self, product_ids):
+        """Arms the checkout browser on the most important product we know the URL of"""
+        known = [pid for pid in product_ids if pid in self.monitor.products]
+        if not self.auto_checkout or not known:
+            return
+        target = max(known, key=self.monitor.scheduler.priority_of)
+        with self.checkout_lock:
+            if self.arm_checkout_page(target):
+                print(f"🎯 Checkout browser armed on {self.monitor.products[target].name}")
+        self.mark_startup('checkout_armed')
+    
+    def notify(self, kind, key=None, **fields):
+        """Queues a notification (no-op without --notify) - never blocks the caller"""
+        if self.notifier:
+            self.notifier.notify(kind, key, region=self.region, **fields)
+    
+    def capture(self, driver, target, label, product=None, **details):
+        """Queues an evidence capture of one tab (target = its window handle) - the DevTools work is on the evidence thread"""
+        if self.evidence and driver and target:
+            self.evidence.capture(driver, target, label, product, region=self.region, **details)
+    
+    def record_stage(self, stage, **details):
+        """Checkout evidence while the attempt runs - kept with the attempt, nothing touches the tab until it's over"""
+        attempt = self.last_attempt
+        if attempt and attempt.outcome == 'running':
+            attempt.stages.append(dict(details, stage=stage, ts=time.time()))
     
-    def quick_checkout_popnow(self, product_info):
+    def capture_attempt(self, attempt):
+        """One capture of the checkout tab once an attempt is over, carrying the in-page reports it collected
+        instead of the page source. Runs under the checkout lock, so asking for the window handle is safe"""
+        if not self.evidence or attempt.outcome not in ('done', 'failed'):
+            return  # Nothing happened (skipped), or a more important checkout is about to take the tab (preempted)
+        try:
+            target = self.checkout_driver.current_window_handle
+        except Exception as e:
+            LOG.event('evidence', level='warning', label=f"checkout_{attempt.outcome}", error=str(e))
+            return
+        self.capture(self.checkout_driver, target, f"checkout_{attempt.outcome}", attempt.status.product_id,
+                     dom=False, url=attempt.status.url, error=attempt.error, seconds=round(attempt.seconds, 3),
+                     stages=attempt.stages)
+    
+    def session_alert(self, reason):
+        """Keepalive found the checkout login gone - loud, so there's time to log back in before a restock"""
+        self.notify('session_invalid', key='session', reason=reason)
+        print("\n" + "!"*60)
+        print("🔒 CHECKOUT BROWSER IS NO LONGER LOGGED IN")
+        print(f"   {reason}")
+        print("   Log back in in the checkout browser - monitoring keeps running")
+        print("!"*60)
+    
+    def run_checkout_plan(self, step, plan, strategies=None):
+        """Runs one in-page plan and logs/records every step's timing - returns the report"""
+        report = run_plan(self.checkout_driver, plan, strategies, clock=self.checkout_clock) or {'ok': False, 'steps': []}
+        self.record_click_latency(report)
+        self.record_stage(f"{step}_plan", report=report)
+        for item in report.get('steps', []):
+            LOG.event('checkout_step', level='info' if item['ok'] else 'warning', step=item['step'],
+                      ok=item['ok'], ms=item['ms'], detail=item.get('detail'))
+            REGISTRY.observe('popmart_checkout_step_seconds', item['ms'] / 1000,
+                             'In-page checkout step duration', step=item['step'], region=self.region)
+        if not report.get('ok'):
+            raise RuntimeError(f"{step} plan stopped at {report.get('failed')}: {report.get('error', 'not found')}")
+        return report
+    
+    def record_click_latency(self, report):
+        """Restock seen on the monitor page → add to bag clicked on the checkout page, on one aligned timeline"""
+        clicked = next((item for item in report.get('steps', []) if item['step'] == 'add_to_bag' and item['ok']), None)
+        if not clicked or not self.last_attempt or not self.checkout_clock.synced or not clicked.get('at'):
+            return
+        status = self.last_attempt.status
+        clicked_at = self.checkout_clock.to_aligned(clicked['at'] / 1000)
+        REGISTRY.observe('popmart_detection_to_click_seconds', clicked_at - status.detected_at,
+                         'Detector reading to add to bag click (aligned clocks)',
+                         product_type=status.product_type, region=self.region)
+        fields = {'from_read': f"{clicked_at - status.detected_at:.3f}s"}
+        if status.restocked_at:
+            REGISTRY.observe('popmart_restock_to_click_seconds', clicked_at - status.restocked_at,
+                             'Page seeing the restock to add to bag click (aligned clocks)',
+                             product_type=status.product_type, region=self.region)
+            fields['from_restock'] = f"{clicked_at - status.restocked_at:.3f}s"
+        LOG.event('checkout_step', step='click_latency', product=status.product_id,
+                  error_bound=f"±{self.checkout_clock.fit[3] * 1000:.1f}ms", **fields)
+    
+    def checkout_with_plans(self, status, whole_set=False):
+        """Product page plan → cart URL → cart plan. Two script calls instead of a round trip per click"""
+        policy = self.monitor.policy
+        
+        # 1. Product page: everything up to "it's in the bag", awaited inside the page
+        armed = self.armed if self.armed and self.armed[0] == status.product_id else None
+        self.armed = None  # Whatever happens next, this page is used up
+        if armed:
+            # Already sitting on it with the variant picked - just the add to bag click is left, once the
+            # parked page's button has turned red by itself
+            try:
+                self.run_checkout_plan('armed', armed_plan(status.product_type, whole_set, whole_set_applied=armed[1]))
+            except Exception as e:
+                LOG.event('checkout_step', level='warning', step='armed', ok=False, error=str(e), action='reloading')
+                armed = None
+        if not armed:
+            # The plan has to run on the new document, not whatever the tab was parked on before
+            if not navigate(self.checkout_driver, status.url, timeout=10.0, pause=policy.wait):
+                raise RuntimeError("product page never loaded")
+            self.run_checkout_plan('product', product_plan(status.product_type, whole_set))
+        policy.wait(0)  # A higher priority restock can still cut in here
+        
+        # 2. Go to cart - JavaScript navigation to bypass driver.get() inherent delays
+        started = time.perf_counter()
+        self.checkout_driver.execute_script("window.location.href = arguments[0];", cart_url(self.region))
+        if not wait_for_url(self.checkout_driver, 'largeShoppingCart', timeout=10.0, pause=policy.wait):
+            raise RuntimeError("cart page never loaded")
+        LOG.event('checkout_step', step='cart', ms=round((time.perf_counter() - started) * 1000, 1))
+        self.record_stage('cart_loaded', url=cart_url(self.region))
+        
+        # 3. Cart page: select all + CHECK OUT, waiting on the DOM instead of a fixed 3 seconds
+        #    (learned selectors go first, and whatever wins gets remembered)
+        report = self.run_checkout_plan('cart', CART_PLAN, {
+            'select_all': self.selectors.ordered('select_all', SELECT_ALL_STRATEGIES),
+            'checkout': self.selectors.ordered('checkout', CHECKOUT_STRATEGIES),
+        })
+        for target, winner in report.get('winners', {}).items():
+            self.selectors.learn(target, winner)
+    
+    def quick_checkout_popnow(self, status):
         """Fast PopNow checkout - hits all the right buttons in the right order"""
         if not self.auto_checkout:
             return True
             
         try:
-            print(f"\n⚡ POPNOW CHECKOUT: {product_info['product_name']}")
+            LOG.event('checkout_start', product=status.product_id, name=status.product_name, type='popnow')
             start_time = time.time()
             
-            # 1. Go to the PopNow page
-            self.checkout_driver.get(product_info['url'])
-            time.sleep(0.2)  # Just a tiny wait for the page to load
-            
-            # 2. Click the "Buy Multiple Boxes" button
-            print("📦 Buy Multiple Boxes...")
-            self.checkout_driver.execute_script("""
-                // Run this immediately - no waiting around
-                (function() {
-                    const buyBtn = document.querySelector('button.ant-btn.ant-btn-ghost.index_chooseMulitityBtn__n0MoA');
-                    if (buyBtn && buyBtn.textContent.includes('Buy Multiple Boxes')) {
-                        buyBtn.click();
-                        return;
-                    }
-                    // Quick fallback if the first method doesn't work
-                    const buttons = document.querySelectorAll('button');
-                    for (let btn of buttons) {
-                        if (btn.textContent.includes('Buy Multiple Boxes')) {
-                            btn.click();
-                            return;
-                        }
-                    }
-                })();
-            """)
-            time.sleep(0.03)  # Tiny wait for the modal to pop up
-            
-            # 3. Add to bag (remove the misplaced select all part)
-            print("🛒 Add to bag...")
-            self.checkout_driver.execute_script("""
-                // Add the single box to bag right away
-                (function() {
-                    const buttons = document.querySelectorAll('div[class*="index_usBtn__"], button');
-                    for (let btn of buttons) {
-                        if (btn.textContent.toUpperCase().includes('ADD TO BAG')) {
-                            btn.click();
-                            return;
-                        }
-                    }
-                })();
-            """)
-
-            # Small wait to make sure the add to bag action completes
-            time.sleep(0.2)  # Give it a moment to register with the server
-
-            # 4. Go to cart with proper timing
-            print("🛒 Going to cart...")
-
-            # Use JavaScript navigation to bypass driver.get() inherent delays
-            self.checkout_driver.execute_script("window.location.href = 'https://www.popmart.com/ca/largeShoppingCart';")
-
-            # Wait for cart page to fully load
-            time.sleep(3.0)  # Wait 3 seconds for page to fully load
-
-            # Now execute select all on the cart page - single attempt
-            print("☑️ Selecting all items in cart...")
-            select_all_clicked = self.checkout_driver.execute_script("""
-                // Select all logic for cart page - single attempt
-                (function() {
-                    const selectors = [
-                        'div.index_checkbox__w_166',
-                        '.ant-checkbox-wrapper',
-                        'input[type="checkbox"]',
-                        'div[class*="checkbox"]',
-                        '.ant-checkbox'
-                    ];
-                    
-                    let clicked = false;
-                    
-                    for (let selector of selectors) {
-                        const elements = document.querySelectorAll(selector);
-                        for (let element of elements) {
-                            if (element.offsetParent !== null && !element.disabled) {
-                                element.click();
-                                console.log('Select all clicked using selector:', selector);
-                                clicked = true;
-                                break;
-                            }
-                        }
-                        if (clicked) break;
-                    }
-                    
-                    return clicked;
-                })();
-            """)
-            
-            if select_all_clicked:
-                print("✅ Select all successful!")
-            else:
-                print("⚠️ Select all not found - proceeding anyway")
-            
-            # No waiting around - go straight to the checkout button
-            print("🚀 Checkout button...")
-            self.checkout_driver.execute_script("""
-                // Step 2: Click checkout button with exact targeting and no delays
-                (function() {
-                    // Target the exact checkout button first with multiple fallbacks
-                    const checkoutSelectors = [
-                        'button.ant-btn.ant-btn-primary.ant-btn-dangerous.index_checkout__V9YPC',
-                        'button[class*="index_checkout__"]',
-                        'button.ant-btn.ant-btn-primary.ant-btn-dangerous'
-                    ];
-                    
-                    let checkoutClicked = false;
-                    
-                    for (let selector of checkoutSelectors) {
-                        const checkoutBtn = document.querySelector(selector);
-                        if (checkoutBtn && checkoutBtn.offsetParent !== null) {
-                            checkoutBtn.click();
-                            console.log('Exact checkout button clicked using selector:', selector);
-                            checkoutClicked = true;
-                            break;
-                        }
-                    }
-                    
-                    // Fallback method if exact targeting fails
-                    if (!checkoutClicked) {
-                        const buttons = document.querySelectorAll('button');
-                        for (let btn of buttons) {
-                            if (btn.textContent.toUpperCase().includes('CHECK OUT') && btn.offsetParent !== null) {
-                                btn.click();
-                                console.log('Fallback checkout clicked');
-                                checkoutClicked = true;
-                                break;
-                            }
-                        }
-                    }
-                    
-                    // Additional fallback for any checkout-related button
-                    if (!checkoutClicked) {
-                        const allButtons = document.querySelectorAll('button, div[class*="btn"], div[class*="button"]');
-                        for (let btn of allButtons) {
-                            const text = btn.textContent.toUpperCase();
-                            if ((text.includes('CHECKOUT') || text.includes('CHECK OUT') || text.includes('CONFIRM')) && btn.offsetParent !== null) {
-                                btn.click();
-                                console.log('Additional fallback checkout clicked:', text);
-                                break;
-                            }
-                        }
-                    }
-                    
-                    console.log('Checkout button clicked - bot will stop here for manual completion');
-                })();
-            """)
+            # Buy Multiple Boxes → Add to bag → cart → select all → CHECK OUT
+            self.checkout_with_plans(status)
             
             # NO DELAY - bot stops here after checkout button is clicked
-            print("✅ Checkout button clicked! Bot will stop here for manual completion.")
-            print("🛒 You are now on the payment page - complete checkout manually!")
-            
-            end_time = time.time()
-            total_time = end_time - start_time
-            
-            print(f"\n⏱️ CHECKOUT COMPLETED IN: {total_time:.2f} seconds!")
-            print("🛒 MANUAL COMPLETION REQUIRED")
+            total_time = time.time() - start_time
+            LOG.event('checkout_done', product=status.product_id, seconds=f"{total_time:.2f}")
             
             self.checkout_successful = True
-            
-            print("\n" + "="*60)
-            print("🛒 MANUAL CHECKOUT TIME")
-            print("="*60)
-            print("• Checkout button has been clicked")
-            print("• You are now on the payment page")
-            print("• Complete payment manually in the browser")
-            print("• Bot will stop monitoring after getting the product")
-            print("="*60)
-            
+            self.print_manual_checkout()
             return False  # Stop monitoring after getting the product
             
+        except CheckoutPreempted:
+            raise
         except Exception as e:
-            print(f"❌ Error: {e}")
+            LOG.event('checkout_error', level='error', product=status.product_id, error=str(e))
             return True
     
-    def quick_checkout_normal(self, product_info):
+    def quick_checkout_normal(self, status):
         """Quick checkout for regular products - gets you to payment in seconds"""
         if not self.auto_checkout:
             return True
             
         try:
-            print(f"\n⚡ QUICK CHECKOUT: {product_info['product_name']}")
+            LOG.event('checkout_start', product=status.product_id, name=status.product_name, type='normal')
             start_time = time.time()
             
-            # 1. Go directly to the product page in the checkout browser
-            self.checkout_driver.get(product_info['url'])
-            # No waiting around - go straight to adding to bag
-            
-            # 2. Select whole set if preferred, then add to bag
-            if self.prefer_whole_set:
-                print("📦 Selecting whole set...")
-                self.checkout_driver.execute_script("""
-                    // Run this right away - select the whole set first
-                    (function() {
-                        // Look for whole set option
-                        const wholeSets = document.querySelectorAll('div.index_sizeInfoItem__f_Uxb');
-                        for (let item of wholeSets) {
-                            const title = item.querySelector('div.index_sizeInfoTitle__kpZbS');
-                            if (title && title.textContent.trim().toLowerCase().includes('whole set')) {
-                                item.click();
-                                console.log('Whole set selected');
-                                break;
-                            }
-                        }
-                        
-                        // Add to bag right after selection - no waiting around
-                        const buttons = document.querySelectorAll('div[class*="index_usBtn__"], button');
-                        for (let btn of buttons) {
-                            if (btn.textContent.toUpperCase().includes('ADD TO BAG')) {
-                                btn.click();
-                                return;
-                            }
-                        }
-                        
-                        // Continuous monitoring for ADD TO BAG button
-                        if (!document.querySelector('div[class*="index_usBtn__"]')) {
-                            console.log('Setting up monitoring for ADD TO BAG...');
-                            
-                            const observer = new MutationObserver((mutations) => {
-                                for (let mutation of mutations) {
-                                    if (mutation.type === 'childList') {
-                                        mutation.addedNodes.forEach(node => {
-                                            if (node.nodeType === 1) {
-                                                const newButtons = node.querySelectorAll ? node.querySelectorAll('div[class*="index_usBtn__"], button') : [];
-                                                if (node.matches && node.matches('div[class*="index_usBtn__"]')) {
-                                                    newButtons.push(node);
-                                                }
-                                                
-                                                for (let btn of newButtons) {
-                                                    if (btn.textContent.toUpperCase().includes('ADD TO BAG')) {
-                                                        btn.click();
-                                                        console.log('ADD TO BAG found and clicked via monitoring!');
-                                                        observer.disconnect();
-                                                        return;
-                                                    }
-                                                }
-                                            }
-                                        });
-                                    }
-                                }
-                            });
-                            
-                            observer.observe(document.body, {
-                                childList: true,
-                                subtree: true
-                            });
-                        }
-                    })();
-                """)
-            else:
-                print("🛒 Adding single box to bag...")
-                self.checkout_driver.execute_script("""
-                    // Add the single box to bag right away - no waiting around
-                    (function() {
-                        const buttons = document.querySelectorAll('div[class*="index_usBtn__"], button');
-                        for (let btn of buttons) {
-                            if (btn.textContent.toUpperCase().includes('ADD TO BAG')) {
-                                btn.click();
-                                return;
-                            }
-                        }
-                        
-                        // Continuous monitoring for ADD TO BAG button
-                        if (!document.querySelector('div[class*="index_usBtn__"]')) {
-                            console.log('Setting up monitoring for ADD TO BAG...');
-                            
-                            const observer = new MutationObserver((mutations) => {
-                                for (let mutation of mutations) {
-                                    if (mutation.type === 'childList') {
-                                        mutation.addedNodes.forEach(node => {
-                                            if (node.nodeType === 1) {
-                                                const newButtons = node.querySelectorAll ? node.querySelectorAll('div[class*="index_usBtn__"], button') : [];
-                                                if (node.matches && node.matches('div[class*="index_usBtn__"]')) {
-                                                    newButtons.push(node);
-                                                }
-                                                
-                                                for (let btn of newButtons) {
-                                                    if (btn.textContent.toUpperCase().includes('ADD TO BAG')) {
-                                                        btn.click();
-                                                        console.log('ADD TO BAG found and clicked via monitoring!');
-                                                        observer.disconnect();
-                                                        return;
-                                                    }
-                                                }
-                                            }
-                                        });
-                                    }
-                                }
-                            });
-                            
-                            observer.observe(document.body, {
-                                childList: true,
-                                subtree: true
-                            });
-                        }
-                    })();
-                """)
-            
-            # Small wait to ensure ADD TO BAG completes
-            time.sleep(0.2)  # Wait for add to bag to register
-            
-            # 3. Go to cart with proper timing
-            print("🛒 Going to cart...")
-
-            # Use JavaScript navigation to bypass driver.get() inherent delays
-            self.checkout_driver.execute_script("window.location.href = 'https://www.popmart.com/ca/largeShoppingCart';")
-
-            # Wait for cart page to fully load
-            time.sleep(3.0)  # Wait 3 seconds for page to fully load
-
-            # Now execute select all on the cart page - single attempt
-            print("☑️ Selecting all items in cart...")
-            select_all_clicked = self.checkout_driver.execute_script("""
-                // Select all logic for cart page - single attempt
-                (function() {
-                    const selectors = [
-                        'div.index_checkbox__w_166',
-                        '.ant-checkbox-wrapper',
-                        'input[type="checkbox"]',
-                        'div[class*="checkbox"]',
-                        '.ant-checkbox'
-                    ];
-                    
-                    let clicked = false;
-                    
-                    for (let selector of selectors) {
-                        const elements = document.querySelectorAll(selector);
-                        for (let element of elements) {
-                            if (element.offsetParent !== null && !element.disabled) {
-                                element.click();
-                                console.log('Select all clicked using selector:', selector);
-                                clicked = true;
-                                break;
-                            }
-                        }
-                        if (clicked) break;
-                    }
-                    
-                    return clicked;
-                })();
-            """)
-            
-            if select_all_clicked:
-                print("✅ Select all successful!")
-            else:
-                print("⚠️ Select all not found - proceeding anyway")
-            
-            # No waiting around - go straight to the checkout button
-            print("🚀 Checkout button...")
-            self.checkout_driver.execute_script("""
-                // Step 2: Click checkout button with exact targeting and no delays
-                (function() {
-                    // Target the exact checkout button first with multiple fallbacks
-                    const checkoutSelectors = [
-                        'button.ant-btn.ant-btn-primary.ant-btn-dangerous.index_checkout__V9YPC',
-                        'button[class*="index_checkout__"]',
-                        'button.ant-btn.ant-btn-primary.ant-btn-dangerous'
-                    ];
-                    
-                    let checkoutClicked = false;
-                    
-                    for (let selector of checkoutSelectors) {
-                        const checkoutBtn = document.querySelector(selector);
-                        if (checkoutBtn && checkoutBtn.offsetParent !== null) {
-                            checkoutBtn.click();
-                            console.log('Exact checkout button clicked using selector:', selector);
-                            checkoutClicked = true;
-                            break;
-                        }
-                    }
-                    
-                    // Fallback method if exact targeting fails
-                    if (!checkoutClicked) {
-                        const buttons = document.querySelectorAll('button');
-                        for (let btn of buttons) {
-                            if (btn.textContent.toUpperCase().includes('CHECK OUT') && btn.offsetParent !== null) {
-                                btn.click();
-                                console.log('Fallback checkout clicked');
-                                checkoutClicked = true;
-                                break;
-                            }
-                        }
-                    }
-                    
-                    // Additional fallback for any checkout-related button
-                    if (!checkoutClicked) {
-                        const allButtons = document.querySelectorAll('button, div[class*="btn"], div[class*="button"]');
-                        for (let btn of allButtons) {
-                            const text = btn.textContent.toUpperCase();
-                            if ((text.includes('CHECKOUT') || text.includes('CHECK OUT') || text.includes('CONFIRM')) && btn.offsetParent !== null) {
-                                btn.click();
-                                console.log('Additional fallback checkout clicked:', text);
-                                break;
-                            }
-                        }
-                    }
-                    
-                    console.log('Checkout button clicked - bot will stop here for manual completion');
-                })();
-            """)
+            # (Whole set →) Add to bag → cart → select all → CHECK OUT
+            self.checkout_with_plans(status, whole_set=self.prefer_whole_set)
             
             # NO DELAY - bot stops here after checkout button is clicked
-            print("✅ Checkout button clicked! Bot will stop here for manual completion.")
-            print("🛒 You are now on the payment page - complete checkout manually!")
-            
-            end_time = time.time()
-            total_time = end_time - start_time
-            
-            print(f"\n⏱️ CHECKOUT COMPLETED IN: {total_time:.2f} seconds!")
-            print("🛒 MANUAL COMPLETION REQUIRED")
+            total_time = time.time() - start_time
+            LOG.event('checkout_done', product=status.product_id, seconds=f"{total_time:.2f}")
             
             self.checkout_successful = True
-            
-            print("\n" + "="*60)
-            print("🛒 MANUAL CHECKOUT TIME")
-            print("="*60)
-            print("• Checkout button has been clicked")
-            print("• You are now on the payment page")
-            print("• Complete payment manually in the browser")
-            print("• Bot will stop monitoring after getting the product")
-            print("="*60)
-            
+            self.print_manual_checkout()
             return False  # Stop monitoring after getting the product
             
+        except CheckoutPreempted:
+            raise
         except Exception as e:
-            print(f"❌ Checkout error: {e}")
+            LOG.event('checkout_error', level='error', product=status.product_id, error=str(e))
             return True
     
-    def quick_checkout(self, product_info):
+    def print_manual_checkout(self):
+        print("\n" + "="*60)
+        print("🛒 MANUAL CHECKOUT TIME")
+        print("="*60)
+        print("• Checkout button has been clicked")
+        print("• You are now on the payment page")
+        print("• Complete payment manually in the browser")
+        print("• Bot will stop monitoring after getting the product")
+        print("="*60)
+    
+    def quick_checkout(self, status):
         """Route to appropriate checkout based on product type"""
-        product_type = product_info.get('product_type', 'normal')
+        product_type = status.product_type
         
-        if product_type == 'popnow':
-            return self.quick_checkout_popnow(product_info)
-        else:
-            return self.quick_checkout_normal(product_info)
+        with self.checkout_lock:
+            attempt = CheckoutAttempt(status)
+            self.last_attempt = attempt
+            if self.isolation:
+                # Checkout gets half the monitor's cores for as long as it runs
+                self.isolation.set_boost(True)
+            try:
+                if product_type == 'popnow':
+                    keep_monitoring = self.quick_checkout_popnow(status)
+                else:
+                    keep_monitoring = self.quick_checkout_normal(status)
+                attempt.finish('skipped' if not self.auto_checkout else 'failed' if keep_monitoring else 'done')
+            except CheckoutPreempted:
+                attempt.finish('preempted')
+                raise
+            except Exception as e:
+                attempt.finish('failed', e)
+                raise
+            finally:
+                if self.isolation:
+                    self.isolation.set_boost(False)
+                self.capture_attempt(attempt)
+                if attempt.outcome != 'preempted':
+                    self.notify('checkout', key=status.product_id, product=status.product_id,
+                                name=status.product_name, outcome=attempt.outcome,
+                                seconds=round(attempt.seconds, 2), error=attempt.error)
+                REGISTRY.observe('popmart_checkout_seconds', attempt.seconds,
+                                 'Checkout duration from start to CHECK OUT click',
+                                 product_type=product_type, region=self.region)
+            
+            if keep_monitoring and self.auto_checkout and self.arm_target:
+                # Didn't get it - get the checkout page ready again for the next restock. A re-arm that
+                # blows up only costs the head start, it mustn't stop the monitoring
+                try:
+                    self.arm_checkout_page(self.arm_target)
+                except Exception as e:
+                    LOG.event('checkout_armed', level='warning', product=self.arm_target, ok=False, error=str(e))
+            return keep_monitoring
     
-    def stock_found_callback(self, product_info):
+    def stock_found_callback(self, status):
         """This gets called when we find something in stock - time to buy!"""
         try:
-            print(f"\n{'='*60}")
-            print(f"🎯 STOCK FOUND: {product_info['product_name']}")
-            print(f"📦 Product Type: {product_info.get('product_type', 'normal').upper()}")
-            print(f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"{'='*60}")
+            LOG.event('stock_found', product=status.product_id, name=status.product_name,
+                      type=status.product_type)
+            self.notify('stock_found', key=status.product_id, product=status.product_id,
+                        name=status.product_name, type=status.product_type, url=status.url)
+            self.capture(self.monitor_driver, self.monitor.tab_handles.get(status.product_id), 'detected',
+                         status.product_id, url=status.url, state=status.state, button_text=status.button_text,
+                         detected_at=wall_time(status.detected_at))
             
             # Handle checkout with safety wrapper
-            continue_monitoring = self.quick_checkout(product_info)
+            continue_monitoring = self.quick_checkout(status)
             
             return continue_monitoring
             
+        except CheckoutPreempted:
+            # Not an error - the pipeline re-queues this product behind the more important one
+            raise
         except Exception as e:
-            print(f"\n❌ Error in stock callback: {e}")
-            print("⚠️ Stopping monitoring due to error...")
+            LOG.event('checkout_error', level='error', where='stock_callback', error=str(e), action='stopping')
             return False  # Stop monitoring due to error
     
+    def mark_startup(self, phase):
+        self.startup_marks.append((phase, time.perf_counter()))
+    
+    def report_armed(self, product_ids):
+        """Monitors are injected and the loop is about to start - report how long startup took"""
+        self.mark_startup('armed')
+        total = self.startup_marks[-1][1] - LAUNCHED_AT
+        REGISTRY.set('popmart_time_to_armed_seconds', total, 'Process launch to armed monitors', region=self.region)
+        REGISTRY.set('popmart_time_to_armed_unattended_seconds', total - self.login_wait,
+                     'Process launch to armed monitors, minus time waiting for a human to log in', region=self.region)
+        steps = ' '.join(f"{phase}={end - start:.2f}s" for (_, start), (phase, end)
+                         in zip(self.startup_marks, self.startup_marks[1:]))
+        LOG.event('armed', products=len(product_ids), seconds=f"{total:.2f}",
+                  without_login=f"{total - self.login_wait:.2f}", steps=steps)
+    
     def cleanup_browsers(self):
-        """Smart cleanup - ask what to do with browsers"""
+        """Smart cleanup - ask what to do with browsers (unless the run config already says)"""
         print("\n" + "="*60)
         print("🏁 BOT SESSION COMPLETE")
         print("="*60)
         
-        if self.checkout_successful:
+        if self.config.on_exit or not self.standalone:
+            # Region bots run side by side on threads - nobody could answer an input() there
+            self.close_browsers(self.config.on_exit or 'keep-checkout')
+        elif self.checkout_successful:
             print("✅ Stock was found and checkout attempted!")
             print("\nWhat would you like to do?")
             print("1. Keep checkout browser open (recommended)")
@@ -619,6 +595,29 @@ class PopMartBot:
             if self.checkout_driver:
                 self.checkout_driver.quit()
     
+    def close_browsers(self, on_exit):
+        """Non-interactive cleanup for unattended runs"""
+        if on_exit in ('keep-checkout', 'close-all') and self.monitor_driver:
+            print("👋 Closing monitor browser...")
+            self.monitor_driver.quit()
+        if on_exit == 'close-all' and self.checkout_driver:
+            print("👋 Closing checkout browser...")
+            self.checkout_driver.quit()
+        if on_exit != 'close-all':
+            print("✅ Leaving the checkout browser open")
+    
+    def wait_for_start(self, product_ids):
+        """Asks before starting - unless there's a scheduled drop or an unattended run, then things arm by themselves"""
+        scheduled = [pid for pid in product_ids if self.monitor.drops.has_window(pid)]
+        if not scheduled:
+            if not self.config.unattended:
+                input("\n✅ Press ENTER to START monitoring...")
+            return
+        
+        print("\n⏰ Scheduled drops - tabs stay idle until shortly before each window:")
+        for pid in scheduled:
+            print(f"  {pid}: {self.monitor.drops.describe(pid)}")
+    
     def run(self):
         """Main bot execution with auto-detection"""
         print("⚡ PopMart Bot - Unified Auto-Detection Edition")
@@ -628,33 +627,56 @@ class PopMartBot:
         print("=" * 60)
         
         try:
+            if self.profiler:
+                self.profiler.start()
+            
+            if self.metrics_port and self.standalone:
+                self.metrics_server = MetricsServer(REGISTRY, port=self.metrics_port)
+                self.metrics_server.start()
+            
+            if self.notifier and self.standalone:
+                self.notifier.start()
+            if self.standalone:
+                self.evidence = build_recorder(self.config.evidence_mb)
+            
             # Setup both browsers
             self.setup_checkout_driver()
-            self.login_checkout_browser()
+            self.mark_startup('checkout_browser')
+            if not self.login_checkout_browser():
+                return
+            self.mark_startup('login')
+            if self.keepalive_interval:
+                self.keepalive = SessionKeepalive(self.checkout_driver, self.checkout_lock, self.keepalive_interval,
+                                                  on_alert=self.session_alert, metrics=REGISTRY,
+                                                  account_path=account_path(self.region),
+                                                  clock=self.checkout_clock).start()
             
             print("\n" + "="*60)
             print("Now setting up monitor browser...")
             print("=" * 60)
             
             self.setup_monitor_driver()
+            self.mark_startup('monitor_browser')
+            if self.config.isolate_cpus:
+                self.isolation = CpuIsolation(self.checkout_driver, self.monitor_driver).start()
             
             # Get product selection
-            while True:
+            while not self.config.unattended:
                 print("\n📦 Available products:")
                 
                 # Group by type for display
-                normal_products = {pid: info for pid, info in self.monitor.products.items() if info.get('type') == 'normal'}
-                popnow_products = {pid: info for pid, info in self.monitor.products.items() if info.get('type') == 'popnow'}
+                normal_products = {pid: info for pid, info in self.monitor.products.items() if info.product_type == 'normal'}
+                popnow_products = {pid: info for pid, info in self.monitor.products.items() if info.product_type == 'popnow'}
                 
                 if normal_products:
                     print("\n🛍️ Normal Products:")
                     for pid, info in normal_products.items():
-                        print(f"  {pid}: {info['name']}")
+                        print(f"  {pid}: {info.name}")
                 
                 if popnow_products:
                     print("\n🎁 PopNow Sets:")
                     for pid, info in popnow_products.items():
-                        print(f"  {pid}: {info['name']}")
+                        print(f"  {pid}: {info.name}")
                 
                 print("\n💡 Options:")
                 print("  - Enter product ID(s) separated by comma")
@@ -675,17 +697,26 @@ class PopMartBot:
                     else:
                         print("❌ No product IDs entered")
             
-            # Whole set preference (only for single product monitoring)
-            self.prefer_whole_set = False
-            if len(product_ids) == 1:
-                whole_set_choice = input("\n📦 Whole set(y) or Single Box(n)? (y/n): ").strip().lower()
-                self.prefer_whole_set = whole_set_choice == 'y'
-                if self.prefer_whole_set:
-                    print("✅ Will prioritize whole set selection during checkout")
-            
-            # Auto-checkout preference
-            auto_choice = input("\n🤖 Enable auto-checkout? (y/n): ").strip().lower()
-            self.auto_checkout = auto_choice == 'y'
+            if self.config.unattended:
+                # Everything comes from --config / the command line
+                if self.config.products == 'all':
+                    product_ids = self.monitor.get_all_product_ids()
+                else:
+                    product_ids = list(self.config.products)
+                self.prefer_whole_set = self.config.whole_set and len(product_ids) == 1
+                self.auto_checkout = self.config.auto_checkout
+            else:
+                # Whole set preference (only for single product monitoring)
+                self.prefer_whole_set = False
+                if len(product_ids) == 1:
+                    whole_set_choice = input("\n📦 Whole set(y) or Single Box(n)? (y/n): ").strip().lower()
+                    self.prefer_whole_set = whole_set_choice == 'y'
+                    if self.prefer_whole_set:
+                        print("✅ Will prioritize whole set selection during checkout")
+                
+                # Auto-checkout preference
+                auto_choice = input("\n🤖 Enable auto-checkout? (y/n): ").strip().lower()
+                self.auto_checkout = auto_choice == 'y'
             
             print(f"\n{'='*60}")
             print(f"Setting up monitor for {len(product_ids)} products")
@@ -701,13 +732,10 @@ class PopMartBot:
                 
                 # Try to get the URL from config, or construct it
                 if product_ids[0] in self.monitor.products:
-                    product_url = self.monitor.products[product_ids[0]]['url']
+                    product_url = self.monitor.products[product_ids[0]].url
                 else:
                     # Guess the URL based on ID pattern
-                    if len(product_ids[0]) == 3 and product_ids[0].isdigit():
-                        product_url = f"https://www.popmart.com/ca/pop-now/set/{product_ids[0]}"
-                    else:
-                        product_url = f"https://www.popmart.com/ca/products/{product_ids[0]}/"
+                    product_url, _ = guess_product(self.region, product_ids[0])
                 
                 self.monitor_driver.get(product_url)
                 time.sleep(0.2)  # Much faster navigation than before
@@ -715,8 +743,11 @@ class PopMartBot:
                 # Auto-detect the type
                 detected_type = self.monitor.detect_product_type()
                 print(f"✅ Detected product type: {detected_type.upper()}")
+                if product_ids[0] in self.monitor.products:
+                    self.monitor.products[product_ids[0]].product_type = detected_type
                 
-                input("\n✅ Press ENTER to START monitoring...")
+                self.pre_arm_checkout(product_ids)
+                self.wait_for_start(product_ids)
                 
                 self.monitor.monitor_product(
                     product_ids[0], 
@@ -725,7 +756,8 @@ class PopMartBot:
                 )
             else:
                 print(f"✅ Will monitor {len(product_ids)} products")
-                input("\n✅ Press ENTER to START monitoring...")
+                self.pre_arm_checkout(product_ids)
+                self.wait_for_start(product_ids)
                 
                 self.monitor.monitor_multiple_products(
                     product_ids, 
@@ -737,7 +769,83 @@ class PopMartBot:
             
         finally:
             # Smart cleanup based on what happened
+            if self.keepalive:
+                self.keepalive.stop()
+            if self.isolation:
+                self.isolation.stop()
+            if self.profiler:
+                self.profiler.stop_and_report()
+            if self.standalone:
+                if self.notifier:
+                    self.notifier.stop()
+                if self.evidence:
+                    self.evidence.stop()
+                LOG.stop()
             self.cleanup_browsers()
+    
+    def stop(self):
+        """Asks the monitoring loop to wind down (how a multi-region run stops each region)"""
+        self.stopped.set()
+        if self.monitor and self.monitor.pipeline:
+            self.monitor.pipeline.request_stop()
+
+
+def group_by_region(config):
+    """{region: product IDs} for an unattended run - 'us:2710' specs, then the catalog's region, then --region"""
+    catalog = load_catalog()
+    if config.products == 'all':
+        if not catalog:
+            return {config.region: 'all'}
+        specs = [f"{product.region}:{pid}" for pid, product in catalog.items()]
+    else:
+        specs = config.products
+    groups = {}
+    for spec in specs:
+        region, product_id = split_product_spec(spec)
+        if region is None:
+            region = catalog[product_id].region if product_id in catalog else config.region
+        groups.setdefault(region, []).append(product_id)
+    return groups
+
+
+def run_regions(config, groups):
+    """One monitor + checkout browser pair per region, each with its own scheduler and pipeline, side by side"""
+    print(f"🌍 Monitoring {len(groups)} regions: {', '.join(region.upper() for region in groups)}")
+    metrics_server = MetricsServer(REGISTRY, port=config.metrics_port) if config.metrics_port else None
+    notifier = build_notifier(config.notify)
+    evidence = None
+    bots = []
+    try:
+        if metrics_server:
+            metrics_server.start()
+        if notifier:
+            notifier.start()
+        evidence = build_recorder(config.evidence_mb)
+        for region, product_ids in groups.items():
+            settings = {name: getattr(config, name) for name in RunConfig.__slots__}
+            settings.update(products=product_ids, region=region, profile=False,
+                            on_exit=config.on_exit or 'keep-checkout')
+            bot = PopMartBot(RunConfig(**settings), standalone=False, notifier=notifier, evidence=evidence)
+            thread = threading.Thread(target=bot.run, name=f"region-{region}", daemon=True)
+            bots.append((bot, thread))
+            thread.start()
+        while any(thread.is_alive() for _, thread in bots):
+            for _, thread in bots:
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        print("\n\n🛑 Stopping every region...")
+        for bot, _ in bots:
+            bot.stop()
+        for _, thread in bots:
+            thread.join(10)
+    finally:
+        if metrics_server:
+            metrics_server.stop()
+        if notifier:
+            notifier.stop()
+        if evidence:
+            evidence.stop()
+        LOG.stop()
 
 
 if __name__ == "__main__":
@@ -751,6 +859,17 @@ if __name__ == "__main__":
             print(f"Error: {e}")
             exit(1)
         
-        # Start the bot
-        bot = PopMartBot()
-        bot.run() 
\ No newline at end of file
+        # Everything the prompts would ask can come from --config / flags instead
+        config = from_args()
+        
+        # Products from more than one storefront → one browser pair per region in this process
+        groups = group_by_region(config) if config.unattended else {}
+        if len(groups) > 1:
+            run_regions(config, groups)
+        else:
+            if groups:
+                config.region, config.products = next(iter(groups.items()))
+            
+            # Start the bot
+            bot = PopMartBot(config)
+            bot.run() 
\ No newline at end of file
@@ -0,0 +1,142 @@
+# metrics.py
+"""
+Metrics - counters, gauges and histograms served in Prometheus text format on localhost
+So we can alert on slow or dead monitoring before a drop instead of finding out afterwards
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds - tuned for WebDriver calls and checkout stages (sub-millisecond up to several seconds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}
+        self.types = {}
+        self.values = {}       # name -> {label_key: value}
+        self.histograms = {}   # name -> {label_key: Histogram}
+
+    def _declare(self, name, kind, help_text):
+        if name not in self.types:
+            self.types[name] = kind
+            self.help[name] = help_text
+
+    def inc(self, name, amount=1, help_text='', **labels):
+        with self.lock:
+            self._declare(name, 'counter', help_text)
+            series = self.values.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, help_text='', **labels):
+        with self.lock:
+            self._declare(name, 'gauge', help_text)
+            self.values.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, help_text='', **labels):
+        with self.lock:
+            self._declare(name, 'histogram', help_text)
+            series = self.histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def render(self):
+        """Everything in Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name in sorted(self.types):
+                lines.append(f"# HELP {name} {self.help[name] or name}")
+                lines.append(f"# TYPE {name} {self.types[name]}")
+                if self.types[name] == 'histogram':
+                    for key, hist in self.histograms[name].items():
+                        for bound, count in zip(hist.buckets, hist.counts):
+                            lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {count}")
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {hist.count}")
+                        lines.append(f"{name}_sum{_format_labels(key)} {hist.total}")
+                        lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+                else:
+                    for key, value in self.values[name].items():
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# Shared registry - everything in the bot reports here unless told otherwise
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    def __init__(self, registry=REGISTRY, port=9464, host='127.0.0.1'):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.server = None
+
+    def start(self):
+        """Serves /metrics on localhost in a background thread - returns False if the port is taken"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint not started on port {self.port}: {e}")
+            return False
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True).start()
+        print(f"📈 Metrics at http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,116 @@
+# monitor_recovery.py
+"""
+Monitor Recovery - sorts monitor loop errors by what actually went wrong and picks the cheapest fix
+A stale element or a script hiccup just retries a few milliseconds later; a page that navigated (or lost
+the injected monitor) gets re-armed once it has loaded; a crashed tab is reopened; a dead chromedriver
+session fails over to a new browser. A circuit breaker per tab stops the same error from spinning: too
+many in a row escalates to the next fix, and while it's open the loop backs off instead of hammering.
+
+Classification goes by exception name and message, so it works without importing selenium.
+"""
+
+import time
+
+# Cheapest fix first - the breaker escalates along this list
+ACTIONS = ('retry', 'rearm', 'reopen', 'failover')
+
+# kind: (first action, delay in seconds before it)
+POLICIES = {
+    'script': ('retry', 0.005),       # Stale element, JS error, script timeout - the next read usually works
+    'monitor_gone': ('rearm', 0.0),   # Page reloaded under us - the injected monitor is gone
+    'navigating': ('rearm', 0.05),    # Page is mid navigation - wait for it to load, then re-arm
+    'tab_crashed': ('reopen', 0.0),   # Renderer died or the window is gone
+    'driver_lost': ('failover', 0.0), # chromedriver/Chrome are gone - nothing in this session will work
+    'unknown': ('rearm', 0.1),
+}
+
+_DRIVER_LOST = ('InvalidSessionIdException', 'MaxRetryError', 'NewConnectionError', 'ConnectionRefusedError',
+                'ConnectionResetError', 'RemoteDisconnected', 'ProtocolError')
+_DRIVER_LOST_TEXT = ('invalid session id', 'chrome not reachable', 'disconnected:', 'failed to establish a new connection',
+                     'session not created', 'no such session', 'connection refused')
+_TAB_CRASHED = ('NoSuchWindowException',)
+_TAB_CRASHED_TEXT = ('tab crashed', 'page crash', 'target window already closed', 'web view not found',
+                     'no such window', 'target closed')
+_NAVIGATING_TEXT = ('execution context was destroyed', 'cannot find context', 'document unloaded',
+                    'inspected target navigated', 'cannot determine loading status', 'frame was detached',
+                    'target frame detached')
+_SCRIPT = ('StaleElementReferenceException', 'JavascriptException', 'ScriptTimeoutException', 'TimeoutException',
+           'ElementNotInteractableException', 'NoSuchElementException')
+
+
+class MonitorGone(Exception):
+    """The tab answered, but the injected monitor isn't there anymore (page reloaded or navigated)"""
+
+
+def classify(error):
+    """Exception → one of the POLICIES kinds"""
+    if isinstance(error, MonitorGone):
+        return 'monitor_gone'
+    name = type(error).__name__
+    text = str(error).lower()
+    if name in _DRIVER_LOST or any(t in text for t in _DRIVER_LOST_TEXT):
+        return 'driver_lost'
+    if name in _TAB_CRASHED or any(t in text for t in _TAB_CRASHED_TEXT):
+        return 'tab_crashed'
+    if any(t in text for t in _NAVIGATING_TEXT):
+        return 'navigating'
+    if name in _SCRIPT:
+        return 'script'
+    if name == 'WebDriverException' and 'javascript error' in text:
+        return 'script'
+    return 'unknown'
+
+
+class CircuitBreaker:
+    """Per tab: closed → (threshold errors within window) → open for cooldown → half open → closed on success
+    Each time it opens the fix escalates one step and the cooldown doubles (up to max_cooldown)"""
+
+    def __init__(self, threshold=5, window=10.0, cooldown=1.0, max_cooldown=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.window = window
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.errors = []
+        self.state = 'closed'
+        self.escalation = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+
+    def success(self):
+        """Called after every good read - cheap when nothing has gone wrong"""
+        if self.errors or self.state != 'closed':
+            self.errors = []
+            self.state = 'closed'
+            self.escalation = 0
+            self.cooldown = self.base_cooldown
+
+    def failure(self, kind):
+        """Returns (action, seconds to wait before it) for this error - check rest_left() after acting"""
+        action, delay = POLICIES.get(kind, POLICIES['unknown'])
+        now = self.clock()
+        if self.state == 'half_open':
+            # The trial after the cooldown failed too - straight back open, longer this time
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open(now)
+        else:
+            self.errors = [t for t in self.errors if now - t < self.window]
+            self.errors.append(now)
+            if self.state == 'closed' and len(self.errors) >= self.threshold:
+                self._open(now)
+        if self.state == 'open':
+            # Only a dead session is worth a whole new browser - everything else tops out at a fresh tab
+            top = ACTIONS.index('failover' if kind == 'driver_lost' else 'reopen')
+            action = ACTIONS[min(ACTIONS.index(action) + self.escalation, top)]
+            self.state = 'half_open'  # The first read after the cooldown is the trial
+        return action, delay
+
+    def rest_left(self):
+        """Seconds this tab should be left alone for (0 unless the breaker just opened)"""
+        return max(0.0, self.open_until - self.clock())
+
+    def _open(self, now):
+        self.state = 'open'
+        self.escalation += 1
+        self.open_until = now + self.cooldown
+        self.errors = []
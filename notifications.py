@@ -0,0 +1,266 @@
+# notifications.py
+"""
+Notifications - tells you about restocks without ever holding up a checkout
+notify() only drops the event on a queue. A background thread gathers whatever arrives within a short
+window, folds repeats of the same event together (a flapping button is one notification, not twenty),
+and hands the batch to each sink's own worker - a slow or dead webhook retries with backoff on its own
+thread and never delays the desktop popup, let alone detection or checkout.
+
+Sinks are picked with --notify (repeatable):
+    webhook:https://example.com/hook   POST the batch as JSON
+    desktop                            notify-send / osascript popup
+    file:notifications.jsonl           one JSON line per notification
+"""
+
+import json
+import platform
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import urllib.request
+
+from event_log import LOG
+from metrics import REGISTRY
+
+_STOP = object()
+
+
+class WebhookSink:
+    """POSTs {"notifications": [...]} - anything that answers 2xx counts as delivered"""
+    name = 'webhook'
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, batch):
+        body = json.dumps({'notifications': batch}, default=str).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if not 200 <= response.status < 300:
+                raise RuntimeError(f"webhook answered {response.status}")
+
+
+class DesktopSink:
+    """One popup per batch - notify-send on Linux, osascript on macOS"""
+    name = 'desktop'
+
+    def __init__(self, title='PopMart Bot'):
+        self.title = title
+        self.command = self.find_command()
+
+    @staticmethod
+    def find_command():
+        if platform.system() == 'Darwin' and shutil.which('osascript'):
+            return 'osascript'
+        if shutil.which('notify-send'):
+            return 'notify-send'
+        return None
+
+    def send(self, batch):
+        if self.command is None:
+            raise RuntimeError("no desktop notifier found (needs notify-send or osascript)")
+        text = '\n'.join(describe(n) for n in batch[:5])
+        if len(batch) > 5:
+            text += f"\n... and {len(batch) - 5} more"
+        if self.command == 'osascript':
+            args = ['osascript', '-e', f"display notification {json.dumps(text)} with title {json.dumps(self.title)}"]
+        else:
+            args = ['notify-send', self.title, text]
+        subprocess.run(args, check=True, timeout=5, capture_output=True)
+
+
+class FileSink:
+    name = 'file'
+
+    def __init__(self, path='notifications.jsonl'):
+        self.path = path
+
+    def send(self, batch):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for notification in batch:
+                f.write(json.dumps(notification, default=str) + '\n')
+
+
+def describe(notification):
+    """Short human line for popups"""
+    fields = ' '.join(f"{k}={v}" for k, v in notification['fields'].items())
+    repeats = f" (x{notification['count']})" if notification['count'] > 1 else ''
+    region = f"[{notification['region'].upper()}] " if notification.get('region') else ''
+    return f"{region}{notification['kind']}{repeats} {fields}".rstrip()
+
+
+def build_sink(spec):
+    """'webhook:URL', 'desktop' or 'file:PATH' → sink"""
+    kind, _, target = spec.partition(':')
+    if kind == 'webhook':
+        if not target:
+            raise ValueError("webhook notifications need a URL (webhook:https://...)")
+        return WebhookSink(target)
+    if kind == 'desktop':
+        return DesktopSink()
+    if kind == 'file':
+        return FileSink(target or 'notifications.jsonl')
+    raise ValueError(f"Unknown notification sink '{spec}' - use webhook:URL, desktop or file:PATH")
+
+
+class SinkWorker:
+    """One sink's delivery thread - retries a batch with exponential backoff, then gives up on it"""
+
+    def __init__(self, sink, retries=4, backoff=1.0, max_backoff=30.0, maxsize=100, metrics=REGISTRY):
+        self.sink = sink
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"notify-{sink.name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, batch):
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            self._count('dropped', len(batch))
+
+    def stop(self, timeout=2.0):
+        """Delivers what's queued, one try each - no more backoff waits once stopping"""
+        self.stopped.set()
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _STOP:
+                return
+            self.deliver(batch)
+
+    def deliver(self, batch):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self.sink.send(batch)
+                self._count('sent', len(batch))
+                return True
+            except Exception as e:
+                if attempt == self.retries:
+                    self._count('failed', len(batch))
+                    LOG.event('notify_error', level='error', sink=self.sink.name, error=str(e), action='gave up')
+                    return False
+                LOG.event('notify_error', level='warning', sink=self.sink.name, error=str(e),
+                          retry_in=f"{delay:.1f}s")
+                # Once stopping, don't sit out the backoff - try what's left right away
+                if not self.stopped.wait(delay):
+                    delay = min(delay * 2, self.max_backoff)
+        return False
+
+    def _count(self, outcome, amount):
+        if self.metrics:
+            self.metrics.inc('popmart_notifications_total', amount, 'Notifications by sink and outcome',
+                             sink=self.sink.name, outcome=outcome)
+
+
+class Notifier:
+    """notify() from anywhere - batching, coalescing and delivery all happen on background threads"""
+
+    def __init__(self, sinks, batch_window=1.0, max_batch=50, maxsize=1000, metrics=REGISTRY):
+        self.workers = [SinkWorker(sink, metrics=metrics) for sink in sinks]
+        self.batch_window = batch_window   # seconds to wait for more events once one arrives
+        self.max_batch = max_batch
+        self.metrics = metrics
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.thread = None
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        self.thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+        self.thread.start()
+        return self
+
+    def notify(self, kind, key=None, region=None, **fields):
+        """Hot path - never blocks. Events with the same (kind, region, key) in one batch become one notification
+        (product IDs repeat across storefronts, so the same product restocking in two regions stays two alerts)"""
+        try:
+            self.queue.put_nowait((time.time(), kind, key, region, fields))
+        except queue.Full:
+            # Never reached a sink - counted against all of them
+            self.dropped += 1
+            if self.metrics:
+                self.metrics.inc('popmart_notifications_total', 1, 'Notifications by sink and outcome',
+                                 sink='all', outcome='dropped')
+
+    def stop(self, timeout=2.0):
+        """Sends whatever is still queued (without the backoff waits), then shuts the workers down"""
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+        self.thread = None
+        for worker in self.workers:
+            worker.stop(timeout)
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is _STOP:
+                return
+            events = [first]
+            deadline = time.time() + self.batch_window
+            stopping = False
+            while len(events) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                events.append(event)
+            batch = coalesce(events)
+            for worker in self.workers:
+                worker.put(batch)
+            if stopping:
+                return
+
+
+def coalesce(events):
+    """(ts, kind, key, region, fields) events → notifications, one per (kind, region, key), latest fields,
+    in first-seen order"""
+    merged = {}
+    for ts, kind, key, region, fields in events:
+        ident = (kind, region, key) if key is not None else (kind, id(fields))
+        notification = merged.get(ident)
+        if notification is None:
+            merged[ident] = {'kind': kind, 'region': region, 'first_ts': ts, 'last_ts': ts, 'count': 1,
+                             'fields': fields}
+        else:
+            notification['last_ts'] = ts
+            notification['count'] += 1
+            notification['fields'] = fields
+    return list(merged.values())
+
+
+def build_notifier(specs, **kwargs):
+    """Notifier for the --notify specs, or None if there aren't any"""
+    if not specs:
+        return None
+    return Notifier([build_sink(spec) for spec in specs], **kwargs)
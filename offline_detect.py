@@ -0,0 +1,325 @@
+# offline_detect.py
+"""
+Offline Detect - runs the detection rules over saved pages, no browser needed
+A Python port of the page-side matcher (detection_rules.compile_matcher) driven by the same DETECTION_RULES,
+so a site redesign shows up here before a drop instead of during one. Feed it evidence captures
+(evidence/*.json.gz - these also carry what the live JS detector said, so disagreements get flagged)
+or plain saved .html pages; a process pool gets through thousands of them in seconds.
+
+    python offline_detect.py evidence/
+    python offline_detect.py saved_pages/ --workers 8 --json results.jsonl --only-disagreements
+
+Exits with 1 if any snapshot disagrees with the JS detector (or has no stock button at all with --strict).
+Checkout captures are saved without the page source, so they're skipped.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+from detection_rules import DETECTION_RULES
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+SNAPSHOT_SUFFIXES = ('.json.gz', '.html', '.htm')
+
+
+class Element:
+    __slots__ = ('tag', 'attrs', 'children', 'parent', 'in_svg')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+        self.in_svg = tag == 'svg' or (parent is not None and parent.in_svg)
+
+    @property
+    def class_name(self):
+        """What the JS sees as el.className - SVG elements give an object there, so the matcher uses ''"""
+        return '' if self.in_svg else self.attrs.get('class', '')
+
+    def text_content(self):
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ''.join(parts)
+
+
+class SnapshotParser(HTMLParser):
+    """Just enough of a DOM for the matcher: elements in document order with their text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('#document', {}, None)
+        self.stack = [self.root]
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        element = self._add(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self._add(tag, attrs)
+
+    def handle_endtag(self, tag):
+        # Browsers forgive unclosed tags - close up to the nearest matching one, ignore strays
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+    def _add(self, tag, attrs):
+        parent = self.stack[-1]
+        element = Element(tag, {name: value or '' for name, value in attrs}, parent)
+        parent.children.append(element)
+        self.elements.append(element)
+        return element
+
+
+def parse_html(html):
+    parser = SnapshotParser()
+    parser.feed(html or '')
+    parser.close()
+    return parser
+
+
+# The selector shapes the rules use: tag, .class and [attr], [attr=v], [attr*=v], [attr^=v], [attr$=v], [attr~=v]
+_COMPOUND = re.compile(r'^(\*|[a-zA-Z][\w-]*)?((?:\.[\w-]+|\[[^\]]+\])*)$')
+_PART = re.compile(r'\.([\w-]+)|\[\s*([\w-]+)\s*(?:([*^$~|]?=)\s*(?:"([^"]*)"|\'([^\']*)\'|([^\]\s]+)))?\s*\]')
+_ATTR_OPS = {
+    None: lambda value, wanted: True,
+    '=': lambda value, wanted: value == wanted,
+    '*=': lambda value, wanted: bool(wanted) and wanted in value,
+    '^=': lambda value, wanted: bool(wanted) and value.startswith(wanted),
+    '$=': lambda value, wanted: bool(wanted) and value.endswith(wanted),
+    '~=': lambda value, wanted: wanted in value.split(),
+    '|=': lambda value, wanted: value == wanted or value.startswith(wanted + '-'),
+}
+
+
+def compile_selector(selector):
+    """CSS selector list → predicate(element). Raises ValueError on anything fancier than a compound
+    selector (combinators, pseudo classes) so a rule change can't be silently misread here"""
+    compounds = []
+    for part in selector.split(','):
+        part = part.strip()
+        match = _COMPOUND.match(part)
+        if not part or not match:
+            raise ValueError(f"offline matcher doesn't support selector '{part}'")
+        tag = (match.group(1) or '*').lower()
+        checks = []
+        for cls, attr, op, dq, sq, bare in _PART.findall(match.group(2)):
+            if cls:
+                checks.append(('class', '~=', cls))
+            else:
+                checks.append((attr.lower(), op or None, dq or sq or bare))
+        compounds.append((tag, checks))
+
+    def matches(element):
+        for tag, checks in compounds:
+            if tag != '*' and element.tag != tag:
+                continue
+            if all(name in element.attrs and _ATTR_OPS[op](element.attrs[name], wanted)
+                   for name, op, wanted in checks):
+                return True
+        return False
+
+    return matches
+
+
+def _state(rule, text, class_name):
+    """Port of detection_rules._state_expression"""
+    if 'in_stock_classes' in rule:
+        red = any(c in class_name for c in rule['in_stock_classes'])
+        black = any(c in class_name for c in rule.get('out_of_stock_classes', []))
+        return 'in' if red and not black else 'out' if black else 'unknown'
+    if any(t in text for t in rule.get('in_stock_texts', [])):
+        return 'in'
+    return 'out' if any(t in text for t in rule.get('out_of_stock_texts', [])) else 'unknown'
+
+
+class OfflineMatcher:
+    """Same answers as window.__popmartMatch / __popmartDetectType, on a parsed snapshot"""
+
+    def __init__(self, rules=DETECTION_RULES):
+        self.rules = rules
+        self.candidates = {t: compile_selector(r['candidates']) for t, r in rules.items()}
+        self.markers = {t: compile_selector(', '.join(r['page_markers'])) for t, r in rules.items()}
+
+    def match(self, elements):
+        """{product_type: {'text', 'className', 'state'}} - first matching button per type, in document order"""
+        found = {}
+        for element in elements:
+            text = None
+            for product_type, rule in self.rules.items():
+                if product_type in found or not self.candidates[product_type](element):
+                    continue
+                if text is None:
+                    text = element.text_content().strip().upper()
+                if any(t in text for t in rule['match_texts']):
+                    class_name = element.class_name
+                    found[product_type] = {'text': text, 'className': class_name,
+                                           'state': _state(rule, text, class_name)}
+        return found
+
+    def detect_type(self, elements, url, found=None):
+        """Port of UnifiedPopMartMonitor.detect_product_type (URL first, then buttons/markers, then URL again)"""
+        if '/pop-now/' in (url or ''):
+            return 'popnow'
+        found = self.match(elements) if found is None else found
+        for product_type in ('popnow', 'normal'):
+            if product_type in found or any(self.markers[product_type](el) for el in elements):
+                return product_type
+        return 'normal'
+
+    def classify(self, html, url=None):
+        parsed = parse_html(html)
+        found = self.match(parsed.elements)
+        product_type = self.detect_type(parsed.elements, url, found)
+        button = found.get(product_type)
+        return {
+            'type': product_type,
+            'state': button['state'] if button else 'unknown',
+            'button_text': button['text'][:80] if button else None,
+            'button_class': button['className'] if button else None,
+        }
+
+
+_URL_HINTS = (
+    re.compile(r'<link[^>]+rel=["\']canonical["\'][^>]+href=["\']([^"\']+)', re.IGNORECASE),
+    re.compile(r'<meta[^>]+property=["\']og:url["\'][^>]+content=["\']([^"\']+)', re.IGNORECASE),
+)
+
+
+def load_snapshot(path):
+    """(html, url, what the live JS detector said or None) from an evidence capture or a saved page
+    html is None for a capture saved without its page source (checkout captures) - nothing to classify"""
+    if path.endswith('.json.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            capture = json.load(f)
+        state = capture.get('state') or {}
+        status = state.get('stockStatus') or {}
+        live = None
+        if status.get('state'):
+            live = {'type': state.get('productType'), 'state': status.get('state')}
+        return capture.get('dom'), capture.get('url') or state.get('url'), live
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        html = f.read()
+    url = None
+    for pattern in _URL_HINTS:
+        match = pattern.search(html)
+        if match:
+            url = match.group(1)
+            break
+    return html, url, None
+
+
+_MATCHER = None
+
+
+def evaluate(path):
+    """Worker: one snapshot → result dict (errors come back as results too, so one bad file can't stop a run)"""
+    global _MATCHER
+    if _MATCHER is None:
+        _MATCHER = OfflineMatcher()
+    started = time.perf_counter()
+    try:
+        html, url, live = load_snapshot(path)
+        if html is None:
+            return {'path': path, 'url': url, 'skipped': 'saved without page source'}
+        result = _MATCHER.classify(html, url)
+    except Exception as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}"}
+    result.update(path=path, url=url, ms=round((time.perf_counter() - started) * 1000, 2))
+    if live:
+        result['js'] = live
+        result['disagrees'] = [key for key in ('type', 'state') if live.get(key) and live[key] != result[key]]
+    return result
+
+
+def find_snapshots(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(SNAPSHOT_SUFFIXES):
+                        yield os.path.join(folder, name)
+        else:
+            yield path
+
+
+def run(paths, workers=None, chunksize=16):
+    """Classifies every snapshot in a process pool - returns results in input order"""
+    files = list(find_snapshots(paths))
+    if len(files) < 2 * chunksize or workers == 1:
+        return [evaluate(path) for path in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(evaluate, files, chunksize=chunksize))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the stock detectors over saved pages and evidence captures")
+    parser.add_argument('paths', nargs='+', help="snapshot files or folders (.json.gz evidence, .html pages)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument('--json', metavar='FILE', help="also write one JSON line per snapshot")
+    parser.add_argument('--only-disagreements', action='store_true', help="only list snapshots that need a look")
+    parser.add_argument('--strict', action='store_true', help="also fail when a snapshot has no stock button")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results = run(args.paths, args.workers)
+    elapsed = time.perf_counter() - started
+
+    disagreements = [r for r in results if r.get('disagrees')]
+    skipped = [r for r in results if 'skipped' in r]
+    errors = [r for r in results if 'error' in r]
+    missing = [r for r in results if 'error' not in r and 'skipped' not in r and r['state'] == 'unknown']
+    for r in results:
+        if 'skipped' in r:
+            if not args.only_disagreements:
+                print(f"⏭️ {os.path.basename(r['path'])}: {r['skipped']}")
+            continue
+        flagged = r in disagreements or r in errors or r in missing
+        if args.only_disagreements and not flagged:
+            continue
+        name = os.path.basename(r['path'])
+        if 'error' in r:
+            print(f"❌ {name}: {r['error']}")
+            continue
+        icon = '⚠️' if r.get('disagrees') else '❓' if r['state'] == 'unknown' else '🟢' if r['state'] == 'in' else '🔴'
+        line = f"{icon} {name}: {r['type']} / {r['state']}"
+        if r.get('disagrees'):
+            line += f"  (JS said {r['js'].get('type') or '?'} / {r['js']['state']})"
+        if r['button_text']:
+            line += f"  [{r['button_text']}]"
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            for r in results:
+                f.write(json.dumps(r) + '\n')
+
+    print("=" * 60)
+    print(f"📊 {len(results)} snapshot(s) in {elapsed:.2f}s - {len(disagreements)} disagreement(s) with the JS detector, "
+          f"{len(missing)} without a stock button, {len(errors)} unreadable, {len(skipped)} skipped")
+    if disagreements or errors or (args.strict and missing):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# profiler.py
+"""
+Session Profiler - the --profile mode
+Samples the Python threads (monitor loop + checkout executor), records Chrome CPU profiles and
+performance counters for the monitor and checkout tabs, and times the injected stockMonitor
+functions with performance.mark/measure. Everything lands in one report per session so you can
+see whether time goes to Python, chromedriver or the page.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Wraps the hot in-page functions with performance.mark/measure and keeps running totals
+INSTRUMENT_JS = """
+    // Re-injecting the monitor replaces stockMonitor, so wrap again whenever it's fresh
+    if (!window.stockMonitor || window.stockMonitor.__profiled) return;
+    window.stockMonitor.__profiled = true;
+    window.__profileStats = window.__profileStats || {};
+    const wrap = (owner, key, label) => {
+        const original = owner && owner[key];
+        if (typeof original !== 'function') return;
+        owner[key] = function() {
+            const start = performance.now();
+            performance.mark(label + ':start');
+            try {
+                return original.apply(this, arguments);
+            } finally {
+                const took = performance.now() - start;
+                performance.measure(label, label + ':start');
+                performance.clearMarks(label + ':start');
+                const stat = window.__profileStats[label] || (window.__profileStats[label] = {count: 0, totalMs: 0, maxMs: 0});
+                stat.count++;
+                stat.totalMs += took;
+                stat.maxMs = Math.max(stat.maxMs, took);
+            }
+        };
+    };
+    wrap(window.stockMonitor, 'findAndCheckButton', 'stockMonitor.findAndCheckButton');
+    wrap(window.stockMonitor, 'checkButtonState', 'stockMonitor.checkButtonState');
+    wrap(window, '__popmartMatch', 'popmartMatch');
+"""
+
+COLLECT_JS = """
+    const stats = window.__profileStats || {};
+    performance.clearMeasures();
+    return stats;
+"""
+
+
+class StackSampler:
+    """Grabs every Python thread's stack every few ms and counts them (folded stack format)"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(1.0)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while self.running:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def hot_spots(self, top=25):
+        """Self time per function, busiest first"""
+        leaf_counts = Counter()
+        for stack, count in self.stacks.items():
+            leaf_counts[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaf_counts.values()) or 1
+        return [{'function': fn, 'samples': n, 'percent': round(100 * n / total, 2)}
+                for fn, n in leaf_counts.most_common(top)]
+
+
+def _summarize_cpu_profile(profile, top=25):
+    """Self time per JS function out of a CDP Profiler.stop result"""
+    nodes = {node['id']: node for node in profile.get('nodes', [])}
+    counts = Counter(profile.get('samples', []))
+    interval_ms = 0
+    deltas = profile.get('timeDeltas', [])
+    if deltas:
+        interval_ms = sum(deltas) / len(deltas) / 1000
+    self_time = Counter()
+    for node_id, hits in counts.items():
+        frame = nodes.get(node_id, {}).get('callFrame', {})
+        name = frame.get('functionName') or '(anonymous)'
+        where = os.path.basename(frame.get('url', '')) or 'inline'
+        self_time[f"{name} @ {where}:{frame.get('lineNumber', 0)}"] += hits
+    return [{'function': fn, 'samples': n, 'self_ms': round(n * interval_ms, 2)}
+            for fn, n in self_time.most_common(top)]
+
+
+class SessionProfiler:
+    def __init__(self, directory='profiles'):
+        self.directory = directory
+        self.sampler = StackSampler()
+        self.started_at = None
+        self.profiled_tabs = {}   # label -> (driver, handle)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.started_at = time.time()
+        self.sampler.start()
+        print(f"🔬 Profiling this session - report goes to {self.directory}/")
+
+    def start_browser_profile(self, driver, label):
+        """Starts the CDP CPU profiler and performance counters on the driver's current tab"""
+        if label in self.profiled_tabs:
+            return
+        try:
+            driver.execute_cdp_cmd('Profiler.enable', {})
+            driver.execute_cdp_cmd('Profiler.setSamplingInterval', {'interval': 200})
+            driver.execute_cdp_cmd('Profiler.start', {})
+            driver.execute_cdp_cmd('Performance.enable', {})
+            self.profiled_tabs[label] = (driver, driver.current_window_handle)
+        except Exception as e:
+            print(f"⚠️ Couldn't start browser profiler for {label}: {e}")
+
+    def instrument_tab(self, driver, product_id):
+        """Called right after the monitor is injected - wraps its functions and profiles the tab"""
+        try:
+            driver.execute_script(INSTRUMENT_JS)
+        except Exception as e:
+            print(f"⚠️ Couldn't instrument monitor for {product_id}: {e}")
+        self.start_browser_profile(driver, f"monitor:{product_id}")
+
+    def _collect_tab(self, label, driver, handle):
+        result = {}
+        try:
+            if driver.current_window_handle != handle:
+                driver.switch_to.window(handle)
+            profile = driver.execute_cdp_cmd('Profiler.stop', {})['profile']
+            path = os.path.join(self.directory, f"{self._stamp()}-{label.replace(':', '-')}.cpuprofile")
+            with open(path, 'w') as f:
+                json.dump(profile, f)
+            result['cpuprofile'] = path
+            result['hot_spots'] = _summarize_cpu_profile(profile)
+            metrics = driver.execute_cdp_cmd('Performance.getMetrics', {}).get('metrics', [])
+            result['performance'] = {m['name']: m['value'] for m in metrics}
+            if label.startswith('monitor:'):
+                result['stock_monitor'] = driver.execute_script(COLLECT_JS)
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
+    def _stamp(self):
+        return datetime.fromtimestamp(self.started_at).strftime('%Y%m%d-%H%M%S')
+
+    def stop_and_report(self):
+        """Stops everything and writes the combined session report - returns its path"""
+        if self.started_at is None:
+            return None
+        self.sampler.stop()
+        browser = {label: self._collect_tab(label, driver, handle)
+                   for label, (driver, handle) in self.profiled_tabs.items()}
+        report = {
+            'started': datetime.fromtimestamp(self.started_at).isoformat(),
+            'duration_seconds': round(time.time() - self.started_at, 2),
+            'python': {
+                'samples': self.sampler.samples,
+                'hot_spots': self.sampler.hot_spots(),
+                'folded_stacks': dict(self.sampler.stacks.most_common(200)),
+            },
+            'browser': browser,
+        }
+        path = os.path.join(self.directory, f"session-{self._stamp()}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n🔬 Profile report: {path}")
+        return path
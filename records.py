@@ -0,0 +1,194 @@
+# records.py
+"""
+Records - compact typed objects for products, stock readings and checkout attempts
+Plain classes with __slots__ (no per-instance __dict__, works on Python 3.8) so big catalogs and
+the per-event pipeline allocate less, and whatever the injected JS sends back gets checked in one place.
+"""
+
+import time
+
+from regions import DEFAULT_REGION, check_region, region_from_url
+from drop_schedule import check_drop_window
+
+PRODUCT_TYPES = ('normal', 'popnow', 'unknown')
+STOCK_STATES = ('in', 'out', 'unknown')
+
+
+def _number(value):
+    """JS numbers come back as int/float - anything else (None, strings, NaN dicts) becomes None"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+class Product:
+    __slots__ = ('product_id', 'name', 'url', 'product_type', 'priority', 'drop_window', 'region')
+
+    def __init__(self, product_id, name, url, product_type='unknown', priority=None, drop_window=None, region=None):
+        if product_type not in PRODUCT_TYPES:
+            raise ValueError(f"Product {product_id}: unknown type '{product_type}'")
+        self.product_id = product_id
+        self.name = name
+        self.url = url
+        self.product_type = product_type
+        self.priority = priority
+        self.drop_window = drop_window
+        self.region = check_region(region or region_from_url(url) or DEFAULT_REGION)
+
+    @classmethod
+    def from_catalog(cls, product_id, info, product_type=None):
+        """One entry from popmart_products.json / popnow_products.json - other keys are ignored
+        region comes from a "region" key, else from the URL (popmart.com/<region>/...)"""
+        if not isinstance(info, dict) or not info.get('url'):
+            raise ValueError(f"Product {product_id} needs at least a url")
+        priority = info.get('priority')
+        if priority is not None and not 1 <= int(priority) <= 10:
+            raise ValueError(f"Product {product_id}: priority must be 1-10, got {priority}")
+        try:
+            drop_window = check_drop_window(info.get('drop_window'))
+        except ValueError as e:
+            raise ValueError(f"Product {product_id}: {e}") from None
+        return cls(
+            str(product_id),
+            info.get('name') or f'Product {product_id}',
+            info['url'],
+            product_type or info.get('type', 'unknown'),
+            int(priority) if priority is not None else None,
+            drop_window,
+            info.get('region'),
+        )
+
+    def __repr__(self):
+        return f"Product({self.product_id!r}, {self.name!r}, {self.product_type}, {self.region})"
+
+
+class StockTransition:
+    """One entry from the in-page transition log - ts is aligned epoch seconds (clock_sync) with sub-ms resolution"""
+    __slots__ = ('seq', 'ts', 'from_state', 'to_state', 'text')
+
+    def __init__(self, seq, ts, from_state, to_state, text=None):
+        self.seq = seq
+        self.ts = ts
+        self.from_state = from_state
+        self.to_state = to_state
+        self.text = text
+
+    @classmethod
+    def from_js(cls, entry, page_time=None):
+        """None for anything that doesn't look like a log entry - page_time maps page seconds onto the shared timeline"""
+        if not isinstance(entry, dict) or _number(entry.get('t')) is None or entry.get('to') not in STOCK_STATES:
+            return None
+        from_state = entry.get('from')
+        ts = entry['t'] / 1000
+        return cls(_number(entry.get('seq')), page_time(ts) if page_time else ts,
+                   from_state if from_state in STOCK_STATES else None, entry['to'], _text(entry.get('text')))
+
+    @property
+    def is_restock(self):
+        return self.from_state == 'out' and self.to_state == 'in'
+
+    def __repr__(self):
+        return f"StockTransition({self.from_state} → {self.to_state} @ {self.ts:.3f})"
+
+
+class StockStatus:
+    """One detector reading, normalized - this is what the pipeline stages and the checkout callback get"""
+    __slots__ = ('product_id', 'product_name', 'url', 'product_type', 'available', 'state',
+                 'button_text', 'button_class', 'timestamp', 'check_count',
+                 'just_became_available', 'in_stock', 'detected_at', 'transitions', 'transitions_dropped')
+
+    def __init__(self, product, product_type, detected_at, available=False, state='unknown',
+                 button_text=None, button_class=None, timestamp=None, check_count=None,
+                 just_became_available=False, transitions=(), transitions_dropped=0):
+        self.product_id = product.product_id
+        self.product_name = product.name
+        self.url = product.url
+        self.product_type = product_type
+        self.available = available
+        self.state = state
+        self.button_text = button_text
+        self.button_class = button_class
+        self.timestamp = timestamp          # aligned seconds (page clock mapped by clock_sync) - when the detector last ran
+        self.check_count = check_count
+        self.transitions = transitions      # StockTransitions since the last read, oldest first
+        self.transitions_dropped = transitions_dropped
+        # A restock in the log counts even if it already flipped back before we read it
+        self.just_became_available = just_became_available or any(t.is_restock for t in transitions)
+        self.in_stock = self.just_became_available or available
+        self.detected_at = detected_at
+
+    @property
+    def restocked_at(self):
+        """When the page saw the latest out → in flip (aligned seconds), if this reading has one"""
+        restocks = [t.ts for t in self.transitions if t.is_restock]
+        return restocks[-1] if restocks else None
+
+    @classmethod
+    def from_reading(cls, product, product_type, reading, detected_at, page_time=None):
+        """Builds a status out of what read_stock_flags returned - odd values from the page get coerced or dropped
+        page_time maps page clock seconds onto the shared timeline (ClockSync.to_aligned)"""
+        if not isinstance(reading, dict):
+            raise ValueError(f"Unexpected detector reading for {product.product_id}: {reading!r}")
+        status = reading.get('status')
+        if not isinstance(status, dict):
+            status = {}
+        state = status.get('state')
+        timestamp = _number(status.get('timestamp'))
+        check_count = _number(status.get('checkCount'))
+        log = reading.get('transitions')
+        if not isinstance(log, dict):
+            log = {}
+        entries = log.get('entries') if isinstance(log.get('entries'), list) else []
+        transitions = tuple(t for t in (StockTransition.from_js(e, page_time) for e in entries) if t is not None)
+        if timestamp and page_time:
+            timestamp = page_time(timestamp / 1000) * 1000
+        return cls(
+            product, product_type, detected_at,
+            available=bool(status.get('available')),
+            state=state if state in STOCK_STATES else 'unknown',
+            button_text=_text(status.get('buttonText')),
+            button_class=_text(status.get('buttonClass')),
+            timestamp=timestamp / 1000 if timestamp else None,
+            check_count=int(check_count) if check_count is not None else None,
+            just_became_available=bool(reading.get('justBecameAvailable')),
+            transitions=transitions,
+            transitions_dropped=int(_number(log.get('dropped')) or 0),
+        )
+
+    def __repr__(self):
+        return f"StockStatus({self.product_id!r}, state={self.state}, in_stock={self.in_stock})"
+
+
+class CheckoutAttempt:
+    """One go at checking out a restock - running → done / failed / preempted / skipped"""
+    __slots__ = ('status', 'started_at', 'finished_at', 'outcome', 'error', 'stages')
+
+    OUTCOMES = ('running', 'done', 'failed', 'preempted', 'skipped')
+
+    def __init__(self, status):
+        self.status = status
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.outcome = 'running'
+        self.error = None
+        self.stages = []   # In-page plan reports and checkpoints, saved as evidence once the attempt is over
+
+    def finish(self, outcome, error=None):
+        if outcome not in self.OUTCOMES:
+            raise ValueError(f"Unknown checkout outcome '{outcome}'")
+        self.finished_at = time.perf_counter()
+        self.outcome = outcome
+        self.error = _text(error)
+        return self
+
+    @property
+    def seconds(self):
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def __repr__(self):
+        return f"CheckoutAttempt({self.status.product_id!r}, {self.outcome}, {self.seconds:.2f}s)"
@@ -0,0 +1,66 @@
+# regions.py
+"""
+Regions - every PopMart storefront URL the bot builds, per region
+The site is one domain with the region as the first path segment (/ca/, /us/, /gb/...),
+so a region is just that segment - catalogs can set it per product or leave it to the URL.
+"""
+
+import re
+
+BASE_URL = 'https://www.popmart.com'
+DEFAULT_REGION = 'ca'
+
+_REGION_IN_URL = re.compile(r'popmart\.com/([a-z]{2})(?:/|$)', re.IGNORECASE)
+_REGION_CODE = re.compile(r'^[a-z]{2}$')
+
+
+def check_region(region):
+    region = (region or DEFAULT_REGION).lower()
+    if not _REGION_CODE.match(region):
+        raise ValueError(f"Region should be a two letter storefront code like 'ca' or 'us', got '{region}'")
+    return region
+
+
+def region_root(region):
+    return f"{BASE_URL}/{check_region(region)}"
+
+
+def product_url(region, product_id):
+    return f"{region_root(region)}/products/{product_id}/"
+
+
+def popnow_url(region, set_id):
+    return f"{region_root(region)}/pop-now/set/{set_id}"
+
+
+def cart_url(region):
+    return f"{region_root(region)}/largeShoppingCart"
+
+
+def account_path(region):
+    return f"/{check_region(region)}/account"
+
+
+def account_url(region):
+    return f"{BASE_URL}{account_path(region)}"
+
+
+def region_from_url(url):
+    """The storefront a product URL points at, or None if it doesn't say"""
+    match = _REGION_IN_URL.search(url or '')
+    return match.group(1).lower() if match else None
+
+
+def guess_product(region, product_id):
+    """(url, product_type) for an ID that isn't in the catalog - short numeric IDs are PopNow sets"""
+    if len(product_id) == 3 and product_id.isdigit() and int(product_id) < 500:
+        return popnow_url(region, product_id), 'popnow'
+    return product_url(region, product_id), 'normal'
+
+
+def split_product_spec(spec, default_region=None):
+    """'us:2710' → ('us', '2710'), plain '2710' → (default_region, '2710')"""
+    if ':' in spec:
+        region, product_id = spec.split(':', 1)
+        return check_region(region), product_id.strip()
+    return default_region, spec.strip()
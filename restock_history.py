@@ -0,0 +1,224 @@
+# restock_history.py
+"""
+Restock History - remembers every stock transition we see and tells you when restocks actually happen
+Transitions (NOTIFY → BUY, black → red, back to sold out...) come straight from the in-page transition
+log with their page timestamps, and go into a small local SQLite file from a background writer, so
+recording never slows monitoring down.
+
+Usage:
+    python restock_history.py report [--region us] [--product ID] [--days 30]
+    python restock_history.py events [--region us] [--product ID] [--limit 20]
+"""
+
+import argparse
+import queue
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from clock_sync import wall_time
+from regions import check_region
+
+HISTORY_DB = 'restock_history.db'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS transitions (
+        ts REAL NOT NULL,
+        product_id TEXT NOT NULL,
+        from_state TEXT,
+        to_state TEXT NOT NULL,
+        detail TEXT,
+        region TEXT
+    );
+"""
+
+# Runs after open_db() has made sure the region column exists
+INDEXES = """
+    CREATE INDEX IF NOT EXISTS transitions_product_ts ON transitions (product_id, ts);
+    CREATE INDEX IF NOT EXISTS transitions_region_product_ts ON transitions (region, product_id, ts);
+"""
+
+_STOP = object()
+
+
+def open_db(path, timeout=5.0):
+    """Connects and brings the schema up to date - files from before regions get a region column (NULL for old rows)"""
+    conn = sqlite3.connect(path, timeout=timeout)
+    conn.executescript(SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(transitions)")}
+    if 'region' not in columns:
+        try:
+            conn.execute("ALTER TABLE transitions ADD COLUMN region TEXT")
+        except sqlite3.OperationalError:
+            pass  # Another region's writer just added it
+    conn.executescript(INDEXES)
+    return conn
+
+
+class RestockHistory:
+    def __init__(self, path=HISTORY_DB, region=None):
+        self.path = path
+        self.region = region   # Product IDs aren't unique across storefronts - every row says which one
+        self.queue = queue.Queue(maxsize=10000)
+        self.last_state = {}
+        self.thread = None
+
+    def record(self, product_id, transitions):
+        """Feed it the StockTransitions drained from the page - re-injecting the monitor restarts
+        its log from "no state", so repeats of the state we already have are skipped.
+        Rows are stored in wall clock time, so they line up with real dates (and --days) across sleeps"""
+        for transition in transitions:
+            previous = self.last_state.get(product_id)
+            if transition.to_state != previous:
+                self._record(wall_time(transition.ts), product_id, previous, transition.to_state, transition.text)
+            self.last_state[product_id] = transition.to_state
+
+    def _record(self, ts, product_id, from_state, to_state, detail):
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait((ts, product_id, from_state, to_state, detail, self.region))
+        except queue.Full:
+            pass  # History is nice to have - never worth blocking for
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='restock-history', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.0):
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _run(self):
+        # SQLite connections belong to the thread that made them, so the writer owns its own
+        # Every region's monitor writes here - wait on each other's locks rather than fail
+        conn = open_db(self.path, timeout=30)
+        while True:
+            batch = [self.queue.get()]
+            while not self.queue.empty() and len(batch) < 500:
+                batch.append(self.queue.get_nowait())
+            rows = [row for row in batch if row is not _STOP]
+            if rows:
+                conn.executemany("INSERT INTO transitions (ts, product_id, from_state, to_state, detail, region) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                conn.commit()
+            if len(rows) != len(batch):
+                conn.close()
+                return
+
+
+def load_transitions(path, product_id=None, since=None, region=None):
+    """Rows of (ts, (region, product_id), from_state, to_state, detail) - region is None for rows from before regions"""
+    conn = open_db(path)
+    query = "SELECT ts, region, product_id, from_state, to_state, detail FROM transitions WHERE 1=1"
+    params = []
+    if region:
+        query += " AND region = ?"
+        params.append(region)
+    if product_id:
+        query += " AND product_id = ?"
+        params.append(product_id)
+    if since:
+        query += " AND ts >= ?"
+        params.append(since)
+    rows = conn.execute(query + " ORDER BY region, product_id, ts", params).fetchall()
+    conn.close()
+    return [(ts, (region, product_id), old, new, detail) for ts, region, product_id, old, new, detail in rows]
+
+
+def describe(key):
+    region, product_id = key
+    return f"{region.upper()} {product_id}" if region else product_id
+
+
+def analyze(rows):
+    """Per (region, product): restock count, hour-of-day spread and how long stock lasted"""
+    by_product = defaultdict(list)
+    for row in rows:
+        by_product[row[1]].append(row)
+
+    report = {}
+    for key, events in by_product.items():
+        restocks = [ts for ts, _, old, new, _ in events if new == 'in' and old != 'in']
+        durations = []
+        in_since = None
+        for ts, _, old, new, _ in events:
+            if new == 'in' and old != 'in':
+                in_since = ts
+            elif new != 'in' and in_since is not None:
+                durations.append(ts - in_since)
+                in_since = None
+        span_days = max((events[-1][0] - events[0][0]) / 86400, 1 / 24)
+        report[key] = {
+            'restocks': len(restocks),
+            'per_day': len(restocks) / span_days,
+            'hours': Counter(datetime.fromtimestamp(ts).hour for ts in restocks),
+            'weekdays': Counter(datetime.fromtimestamp(ts).strftime('%a') for ts in restocks),
+            'durations': durations,
+            'first': events[0][0],
+            'last': events[-1][0],
+        }
+    return report
+
+
+def print_report(report):
+    if not report:
+        print("📭 No transitions recorded yet - run the bot for a while first")
+        return
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')
+    for key, info in sorted(report.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+        print(f"\n📦 {describe(key)}  ({fmt(info['first'])} → {fmt(info['last'])})")
+        print(f"   Restocks: {info['restocks']}  (~{info['per_day']:.2f}/day)")
+        if info['durations']:
+            d = info['durations']
+            print(f"   In stock for: median {statistics.median(d):.1f}s | mean {statistics.mean(d):.1f}s | "
+                  f"shortest {min(d):.1f}s | longest {max(d):.1f}s")
+        if info['hours']:
+            print("   Time of day:")
+            peak = max(info['hours'].values())
+            for hour in range(24):
+                count = info['hours'].get(hour, 0)
+                if count:
+                    print(f"     {hour:02d}:00 {'█' * max(1, round(20 * count / peak))} {count}")
+        if info['weekdays']:
+            days = ', '.join(f"{day} {n}" for day, n in info['weekdays'].most_common())
+            print(f"   Days: {days}")
+
+
+def print_events(rows, limit):
+    for ts, key, old, new, detail in rows[-limit:]:
+        stamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        print(f"{stamp}  {describe(key):<11} {old or '-':>8} → {new:<8} {detail or ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Restock history analytics")
+    parser.add_argument('--db', default=HISTORY_DB, help="history database file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    report_cmd = sub.add_parser('report', help="restock frequency, time-of-day patterns and in-stock durations")
+    report_cmd.add_argument('--region', type=check_region, help="only this storefront (us, ca, ...)")
+    report_cmd.add_argument('--product', help="only this product ID")
+    report_cmd.add_argument('--days', type=float, help="only the last N days")
+    events_cmd = sub.add_parser('events', help="raw transitions, newest last")
+    events_cmd.add_argument('--region', type=check_region, help="only this storefront (us, ca, ...)")
+    events_cmd.add_argument('--product', help="only this product ID")
+    events_cmd.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.days * 86400 if getattr(args, 'days', None) else None
+    rows = load_transitions(args.db, args.product, since, args.region)
+    if args.command == 'report':
+        print_report(analyze(rows))
+    else:
+        rows.sort(key=lambda row: row[0])
+        print_events(rows, args.limit)
+
+
+if __name__ == "__main__":
+    main()
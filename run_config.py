@@ -0,0 +1,116 @@
+# run_config.py
+"""
+Run Config - everything the startup prompts ask, preset from a JSON file and/or the command line
+So the bot can go from launch to armed monitors with nobody at the keyboard (apart from logging in
+the first time), and several instances can be started or restarted by a script.
+
+Example bot_config.json:
+    {
+        "products": ["2710", "us:1234"], (or "all" - region:id picks a storefront, one browser pair per region)
+        "region": "ca",                  (storefront for IDs without a region prefix)
+        "whole_set": false,
+        "auto_checkout": true,
+        "on_exit": "keep-checkout",      (keep-checkout | close-all | keep-all - leave it out to be asked)
+        "login": "prompt",               (prompt = wait for ENTER if the saved session isn't valid | assume = don't wait)
+        "metrics_port": 9464,
+        "profile": false,
+        "browser_profiles": "browser_profiles",  ("" = fresh throwaway browsers every run)
+        "isolate_cpus": false            (reserved cores + priority for the checkout browser)
+    }
+"""
+
+import argparse
+import json
+
+from regions import DEFAULT_REGION, check_region
+
+ON_EXIT_CHOICES = ('keep-checkout', 'close-all', 'keep-all')
+LOGIN_CHOICES = ('prompt', 'assume')
+
+
+class RunConfig:
+    __slots__ = ('products', 'whole_set', 'auto_checkout', 'on_exit', 'login', 'metrics_port', 'profile',
+                 'browser_profiles', 'isolate_cpus', 'region', 'notify', 'evidence_mb')
+
+    def __init__(self, products=None, whole_set=False, auto_checkout=True, on_exit=None,
+                 login='prompt', metrics_port=9464, profile=False, browser_profiles='browser_profiles',
+                 isolate_cpus=False, region=DEFAULT_REGION, notify=None, evidence_mb=200):
+        if on_exit is not None and on_exit not in ON_EXIT_CHOICES:
+            raise ValueError(f"on_exit must be one of {', '.join(ON_EXIT_CHOICES)}, got '{on_exit}'")
+        if login not in LOGIN_CHOICES:
+            raise ValueError(f"login must be one of {', '.join(LOGIN_CHOICES)}, got '{login}'")
+        if isinstance(products, str) and products != 'all':
+            products = [pid.strip() for pid in products.split(',') if pid.strip()]
+        self.products = products            # list of IDs, 'all', or None = ask interactively
+        self.whole_set = bool(whole_set)
+        self.auto_checkout = bool(auto_checkout)
+        # None = ask when the bot stops - unattended runs never ask, they keep the checkout browser
+        self.on_exit = on_exit or ('keep-checkout' if products is not None else None)
+        self.login = login
+        self.metrics_port = metrics_port
+        self.profile = bool(profile)
+        self.browser_profiles = browser_profiles
+        self.isolate_cpus = bool(isolate_cpus)
+        self.region = check_region(region)
+        if isinstance(notify, str):
+            notify = [notify]
+        self.notify = list(notify or [])   # notification sink specs - see notifications.py
+        self.evidence_mb = float(evidence_mb or 0)  # size cap for evidence/ (0 = no captures)
+
+    @property
+    def unattended(self):
+        """Products chosen up front means no prompts at all on the way to armed monitors"""
+        return self.products is not None
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        unknown = set(data) - set(cls.__slots__)
+        if unknown:
+            raise ValueError(f"{path}: unknown setting(s) {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PopMart Unified Bot")
+    parser.add_argument('--config', help="JSON run config - see run_config.py; command line flags override it")
+    parser.add_argument('--products', help="product IDs separated by comma (region:id for other storefronts), "
+                                           "or 'all' (skips every startup prompt)")
+    parser.add_argument('--region', help="storefront for IDs without a region prefix (default ca)")
+    parser.add_argument('--whole-set', dest='whole_set', action='store_true', default=None,
+                        help="pick the whole set when checking out a single product")
+    parser.add_argument('--single-box', dest='whole_set', action='store_false', help="pick a single box (default)")
+    parser.add_argument('--auto-checkout', dest='auto_checkout', action='store_true', default=None,
+                        help="check out automatically when stock shows up (default)")
+    parser.add_argument('--no-auto-checkout', dest='auto_checkout', action='store_false',
+                        help="only alert, don't check out")
+    parser.add_argument('--on-exit', choices=ON_EXIT_CHOICES, help="what to do with the browsers when the bot stops")
+    parser.add_argument('--login', choices=LOGIN_CHOICES,
+                        help="prompt: wait for ENTER after logging in | assume: the checkout browser is already logged in")
+    parser.add_argument('--metrics-port', type=int, help="port for the /metrics endpoint (0 turns it off)")
+    parser.add_argument('--profile', action='store_true', default=None,
+                        help="profile Python, the browser tabs and the injected monitor; writes profiles/session-*.json")
+    parser.add_argument('--browser-profiles', dest='browser_profiles', metavar='DIR',
+                        help="where the reusable monitor/checkout Chrome profiles live (default browser_profiles)")
+    parser.add_argument('--fresh-profiles', dest='browser_profiles', action='store_const', const='',
+                        help="throwaway browsers - nothing carried over from earlier runs")
+    parser.add_argument('--isolate-cpus', dest='isolate_cpus', action='store_true', default=None,
+                        help="pin the checkout browser to reserved cores at higher priority, monitors to the rest")
+    parser.add_argument('--notify', action='append', metavar='SINK',
+                        help="send restock/checkout notifications to webhook:URL, desktop or file:PATH (repeatable)")
+    parser.add_argument('--evidence-mb', dest='evidence_mb', type=float, metavar='MB',
+                        help="keep up to MB of detection/checkout captures in evidence/ (default 200, 0 turns it off)")
+    return parser
+
+
+def from_args(argv=None):
+    """Config file first, then whatever was passed on the command line on top"""
+    args = build_parser().parse_args(argv)
+    config = RunConfig.load(args.config) if args.config else RunConfig()
+    for name in RunConfig.__slots__:
+        value = getattr(args, name, None)
+        if value is not None:
+            setattr(config, name, value)
+    # Re-run the checks/normalizing on the merged values
+    return RunConfig(**{name: getattr(config, name) for name in RunConfig.__slots__})
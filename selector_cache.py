@@ -0,0 +1,63 @@
+# selector_cache.py
+"""
+Selector Cache - remembers which selector actually found the cart select-all and CHECK OUT buttons
+Next time it tries the one that worked first, so a stable site layout means one query instead of a full DOM scan
+"""
+
+import json
+import os
+
+CACHE_FILE = 'selector_cache.json'
+
+# Each strategy: a CSS selector, plus optional texts the element has to contain (uppercased)
+SELECT_ALL_STRATEGIES = [
+    {'name': 'exact_checkbox', 'selector': 'div.index_checkbox__w_166'},
+    {'name': 'ant_checkbox_wrapper', 'selector': '.ant-checkbox-wrapper'},
+    {'name': 'checkbox_input', 'selector': 'input[type="checkbox"]'},
+    {'name': 'checkbox_class', 'selector': 'div[class*="checkbox"]'},
+    {'name': 'ant_checkbox', 'selector': '.ant-checkbox'},
+]
+
+CHECKOUT_STRATEGIES = [
+    {'name': 'exact_checkout', 'selector': 'button.ant-btn.ant-btn-primary.ant-btn-dangerous.index_checkout__V9YPC'},
+    {'name': 'checkout_class', 'selector': 'button[class*="index_checkout__"]'},
+    {'name': 'danger_primary', 'selector': 'button.ant-btn.ant-btn-primary.ant-btn-dangerous'},
+    {'name': 'button_text', 'selector': 'button', 'texts': ['CHECK OUT']},
+    {'name': 'any_checkout_text', 'selector': 'button, div[class*="btn"], div[class*="button"]',
+     'texts': ['CHECKOUT', 'CHECK OUT', 'CONFIRM']},
+]
+
+
+class SelectorCache:
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.known_good = {}   # target -> strategy name that worked last time
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.known_good = json.load(f)
+            except (OSError, ValueError):
+                print(f"⚠️ Couldn't read {self.path} - starting with an empty selector cache")
+                self.known_good = {}
+
+    def save(self):
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.known_good, f, indent=2)
+        except OSError as e:
+            print(f"⚠️ Couldn't save selector cache: {e}")
+
+    def ordered(self, target, strategies):
+        """Known-good strategy first, everything else after it in the usual order"""
+        learned = self.known_good.get(target)
+        return sorted(strategies, key=lambda s: s['name'] != learned)
+
+    def learn(self, target, winner):
+        """Records the strategy that just worked in an in-page checkout plan"""
+        if winner and winner != self.known_good.get(target):
+            # Layout changed (or first run) - remember the new winner for next time
+            self.known_good[target] = winner
+            self.save()
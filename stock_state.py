@@ -0,0 +1,71 @@
+# stock_state.py
+"""
+Restock State Machine - one place that decides when a restock is real and checkout should fire
+Every product walks out-of-stock → restocking → in-checkout → done/cooldown, so one restock = one checkout
+"""
+
+import threading
+import time
+
+UNKNOWN = 'unknown'
+OUT_OF_STOCK = 'out_of_stock'
+RESTOCKING = 'restocking'
+IN_CHECKOUT = 'in_checkout'
+DONE = 'done'
+COOLDOWN = 'cooldown'
+
+
+class RestockStateMachine:
+    def __init__(self, cooldown_seconds=10):
+        self.cooldown_seconds = cooldown_seconds  # Ignore flicker for this long after a checkout attempt
+        self.states = {}
+        self.cooldown_until = {}
+        self.lock = threading.Lock()   # Pipeline stages touch this from different threads
+
+    def state_of(self, product_id):
+        return self.states.get(product_id, UNKNOWN)
+
+    def observe(self, product_id, in_stock, now=None):
+        """Feed it what the detector sees - returns True exactly once per restock, when checkout should fire"""
+        now = time.time() if now is None else now
+        with self.lock:
+            return self._observe(product_id, in_stock, now)
+
+    def _observe(self, product_id, in_stock, now):
+        state = self.state_of(product_id)
+
+        if state in (UNKNOWN, OUT_OF_STOCK):
+            if in_stock:
+                self.states[product_id] = RESTOCKING
+                return True
+            self.states[product_id] = OUT_OF_STOCK
+            return False
+
+        if state == COOLDOWN:
+            # Once the cooldown is over we need to see it sell out before another restock counts
+            if now >= self.cooldown_until.get(product_id, 0) and not in_stock:
+                self.states[product_id] = OUT_OF_STOCK
+            return False
+
+        # RESTOCKING, IN_CHECKOUT and DONE swallow everything - checkout already has this one
+        return False
+
+    def start_checkout(self, product_id):
+        """Restock handed over to checkout"""
+        with self.lock:
+            self.states[product_id] = IN_CHECKOUT
+
+    def requeue(self, product_id):
+        """Checkout got bumped by a higher priority product - it's waiting for its turn again"""
+        with self.lock:
+            self.states[product_id] = RESTOCKING
+
+    def finish_checkout(self, product_id, done, now=None):
+        """Checkout is over - done means we got it, otherwise cool down and wait for the next restock"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if done:
+                self.states[product_id] = DONE
+            else:
+                self.states[product_id] = COOLDOWN
+                self.cooldown_until[product_id] = now + self.cooldown_seconds
@@ -0,0 +1,50 @@
+# test_checkout_requeue.py
+"""
+A bumped checkout must not run after a higher priority checkout succeeded - by then the checkout tab
+is sitting on the payment page the user needs
+"""
+
+import time
+
+from checkout_policy import CheckoutPreempted
+from records import Product, StockStatus
+from stock_state import COOLDOWN, DONE
+from unified_monitor import UnifiedPopMartMonitor
+
+
+def wait_until(check, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_success_drops_bumped_checkout():
+    monitor = UnifiedPopMartMonitor()
+    monitor.scheduler.set_priority('3189', 1)
+    monitor.scheduler.set_priority('2710', 9)
+    low = StockStatus(Product('3189', 'Low', 'https://www.popmart.com/ca/products/3189/'), 'normal', time.time())
+    high = StockStatus(Product('2710', 'High', 'https://www.popmart.com/ca/products/2710/'), 'normal', time.time())
+    calls = []
+
+    def checkout(status):
+        calls.append(status.product_id)
+        if status is low and calls.count('3189') == 1:
+            checkout_stage.put(high)  # Higher priority restock shows up mid checkout
+            raise CheckoutPreempted()
+        return status is not high  # False = got it, stop monitoring
+
+    pipeline = monitor.build_pipeline(checkout)
+    checkout_stage = pipeline.stages[-1]
+    try:
+        checkout_stage.put(low)
+        assert wait_until(lambda: pipeline.stopped.is_set() and checkout_stage.queue.empty()
+                          and checkout_stage.processed == 3)
+    finally:
+        pipeline.stop()
+
+    assert calls == ['3189', '2710']
+    assert monitor.stock_states.state_of('2710') == DONE
+    assert monitor.stock_states.state_of('3189') == COOLDOWN
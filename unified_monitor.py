@@ -9,56 +9,110 @@ from datetime import datetime
 import json
 import os
 import random
+import threading
+from check_scheduler import CheckBudgetScheduler
+from drop_schedule import DropScheduler, IDLE, DONE
+from stock_state import RestockStateMachine
+from event_pipeline import EventPipeline
+from checkout_policy import CheckoutPolicy, CheckoutPreempted
+from detection_rules import with_matcher, watching_for
+from metrics import REGISTRY
+from event_log import LOG
+from restock_history import RestockHistory
+from records import Product, StockStatus
+from regions import DEFAULT_REGION, check_region, product_url, popnow_url, guess_product
+from monitor_recovery import CircuitBreaker, MonitorGone, classify
+from browser_session import wait_for_load
+from clock_sync import ClockSync, now as clock_now
+
+# Transitions the page keeps between two reads - way more than a tab can flip in one round-robin slot
+TRANSITION_LOG_SIZE = 256
+
+
+def load_catalog():
+    """Every product in popmart_products.json and popnow_products.json, all regions"""
+    products = {}
+    # Load normal products
+    normal_file = 'popmart_products.json'
+    if os.path.exists(normal_file):
+        with open(normal_file, 'r') as f:
+            normal_products = json.load(f)
+            # Auto-detect product type based on URL
+            for pid, info in normal_products.items():
+                product_type = 'popnow' if '/pop-now/' in info.get('url', '') else 'normal'
+                products[pid] = Product.from_catalog(pid, info, product_type)
+    
+    # Load PopNow products
+    popnow_file = 'popnow_products.json'
+    if os.path.exists(popnow_file):
+        with open(popnow_file, 'r') as f:
+            popnow_products = json.load(f)
+            # Mark as PopNow products
+            for pid, info in popnow_products.items():
+                products[pid] = Product.from_catalog(pid, info, 'popnow')
+    return products
+
 
 class UnifiedPopMartMonitor:
-    def __init__(self, driver=None):
+    def __init__(self, driver=None, check_budget=40, metrics=REGISTRY, region=DEFAULT_REGION):
         self.driver = driver
+        # Storefront this monitor watches - each region gets its own monitor, scheduler and pipeline
+        self.region = check_region(region)
         self.products = {}
+        # Prometheus style numbers for the local /metrics endpoint
+        self.metrics = metrics
+        self._rate_marks = {}
+        # Spreads a global checks-per-second budget across every tab we watch
+        self.scheduler = CheckBudgetScheduler(budget=check_budget)
+        # Called with a product_id just before its drop window opens (e.g. to warm up checkout)
+        self.on_prearm = None
+        # Called with (driver, product_id) after every monitor injection (the profiler hooks in here)
+        self.on_inject = None
+        # Called with the product IDs once every monitor is injected and the loop is about to start
+        self.on_armed = None
+        # Called with no arguments when the chromedriver session is gone - returns a fresh driver (or None)
+        self.on_driver_lost = None
+        # One circuit breaker per tab - see monitor_recovery.py
+        self.breakers = {}
+        # Per tab page clock vs Python clock, sampled for free on every read
+        self.clocks = {}
+        # product_id -> window handle of its tab (= DevTools target id) - evidence captures name the tab by it
+        self.tab_handles = {}
+        # Per tab (log id, last seq, dropped total) of the transition log that made it into the pipeline
+        self.transition_acks = {}
+        # Debounces restock flags so each restock triggers exactly one checkout
+        self.stock_states = RestockStateMachine()
+        # Every in/out of stock transition goes into a local SQLite file for restock analytics
+        self.history = RestockHistory(region=self.region)
+        # Detector events → normalize → dedupe → checkout, each stage on its own thread
+        self.pipeline = None
+        # Picks checkout order by product priority and preempts lower priority checkouts
+        self.policy = CheckoutPolicy(self.scheduler.priority_of)
         self.load_all_products()
+        # Knows about announced drop windows so tabs can sleep until they matter
+        self.drops = DropScheduler(self.products)
         
     def load_all_products(self):
-        """Loads up all your products - both regular ones and PopNow mystery boxes"""
-        # Load normal products
-        normal_file = 'popmart_products.json'
-        if os.path.exists(normal_file):
-            with open(normal_file, 'r') as f:
-                normal_products = json.load(f)
-                # Auto-detect product type based on URL
-                for pid, info in normal_products.items():
-                    if '/pop-now/' in info.get('url', ''):
-                        info['type'] = 'popnow'
-                    else:
-                        info['type'] = 'normal'
-                    self.products[pid] = info
-        
-        # Load PopNow products
-        popnow_file = 'popnow_products.json'
-        if os.path.exists(popnow_file):
-            with open(popnow_file, 'r') as f:
-                popnow_products = json.load(f)
-                # Mark as PopNow products
-                for pid, info in popnow_products.items():
-                    info['type'] = 'popnow'
-                    self.products[pid] = info
+        """Loads up all your products in this monitor's region - both regular ones and PopNow mystery boxes"""
+        self.products = {pid: product for pid, product in load_catalog().items() if product.region == self.region}
         
         # Add default products if none loaded
         if not self.products:
             self.products = {
-                '2710': {
-                    'name': 'THE MONSTERS Big into Energy Series',
-                    'url': 'https://www.popmart.com/ca/products/2710/',
-                    'type': 'normal'
-                },
-                '293': {
-                    'name': 'PopNow Mystery Box Set',
-                    'url': 'https://www.popmart.com/ca/pop-now/set/293',
-                    'type': 'popnow'
-                }
+                '2710': Product('2710', 'THE MONSTERS Big into Energy Series',
+                                product_url(self.region, '2710'), 'normal'),
+                '293': Product('293', 'PopNow Mystery Box Set',
+                               popnow_url(self.region, '293'), 'popnow')
             }
         
-        print(f"✅ Loaded {len(self.products)} total products")
-        normal_count = sum(1 for p in self.products.values() if p.get('type') == 'normal')
-        popnow_count = sum(1 for p in self.products.values() if p.get('type') == 'popnow')
+        # Products can carry a "priority" (1-10) so the important ones get checked the most
+        for pid, product in self.products.items():
+            if product.priority is not None:
+                self.scheduler.set_priority(pid, product.priority)
+        
+        print(f"✅ Loaded {len(self.products)} total products ({self.region.upper()} store)")
+        normal_count = sum(1 for p in self.products.values() if p.product_type == 'normal')
+        popnow_count = sum(1 for p in self.products.values() if p.product_type == 'popnow')
         print(f"   - {normal_count} normal products")
         print(f"   - {popnow_count} PopNow products")
     
@@ -70,37 +124,12 @@ class UnifiedPopMartMonitor:
             if '/pop-now/' in current_url:
                 return 'popnow'
             
-            # Method 2: Check for specific elements
-            result = self.driver.execute_script("""
-                // Check for PopNow specific elements
-                const buttons = document.querySelectorAll('button');
-                let hasPopNowButtons = false;
-                let hasNormalButtons = false;
-                
-                for (let btn of buttons) {
-                    const text = btn.textContent.toUpperCase();
-                    if (text.includes('BUY MULTIPLE BOXES') || text.includes('NOTIFY ME WHEN START')) {
-                        hasPopNowButtons = true;
-                    }
-                    if (btn.className && btn.className.includes('index_usBtn__')) {
-                        hasNormalButtons = true;
-                    }
-                }
-                
-                // Check for PopNow specific classes
-                const popNowElements = document.querySelectorAll('[class*="ant-checkbox"], [class*="index_chooseMulitityBtn"]');
-                if (popNowElements.length > 0) hasPopNowButtons = true;
-                
-                return {
-                    hasPopNowButtons: hasPopNowButtons,
-                    hasNormalButtons: hasNormalButtons,
-                    url: window.location.href
-                };
-            """)
+            # Method 2: Check for specific elements (one pass with the compiled rules)
+            result = self.driver.execute_script(with_matcher("return window.__popmartDetectType();"))
             
-            if result['hasPopNowButtons']:
+            if result['popnow']:
                 return 'popnow'
-            elif result['hasNormalButtons']:
+            elif result['normal']:
                 return 'normal'
             else:
                 # Default based on URL pattern
@@ -111,198 +140,66 @@ class UnifiedPopMartMonitor:
             # Default to normal
             return 'normal'
     
-    def inject_high_speed_monitor(self, product_type):
-        """Injects the super-fast monitoring code that catches stock changes the moment they happen"""
-        if product_type == 'popnow':
-            monitor_js = """
-            window.stockMonitor = {
-                isMonitoring: false,
-                lastButtonText: null,
-                checkCount: 0,
-                
-                startHighSpeedMonitor: function() {
-                    if (this.isMonitoring) return;
-                    this.isMonitoring = true;
-                    
-                    console.log('High-speed PopNow monitor initialized');
-                    
-                    // Method 1: MutationObserver for instant detection
-                    const observer = new MutationObserver((mutations) => {
-                        for (let mutation of mutations) {
-                            if (mutation.type === 'attributes' && mutation.attributeName === 'class') {
-                                // Check if it's a button
-                                const target = mutation.target;
-                                if (target.tagName === 'BUTTON') {
-                                    this.checkButtonState(target);
-                                }
-                            }
-                            
-                            // Also check childList for dynamic content
-                            if (mutation.type === 'childList') {
-                                mutation.addedNodes.forEach(node => {
-                                    if (node.nodeType === 1) { // Element node
-                                        this.scanForButton(node);
-                                    }
-                                });
-                            }
+    def inject_high_speed_monitor(self, product_type, rate=(100, True), product_id=None):
+        """Injects the super-fast monitoring code that catches stock changes the moment they happen
+        rate is (poll interval in ms, use requestAnimationFrame) - normally comes from the scheduler"""
+        monitor_js = with_matcher("""
+            // Bounded ring buffer of stock transitions - survives re-injection, read by Python each tick and
+            // only trimmed up to what Python acknowledges, so a reading the pipeline couldn't take loses nothing
+            if (!window.__stockLog) {
+                window.__stockLog = {
+                    id: Math.random().toString(36).slice(2),  // New log (page reload) = Python's ack starts over
+                    items: new Array(arguments[3]),
+                    start: 0,
+                    count: 0,
+                    seq: 0,
+                    dropped: 0,                                // Overwritten before they were acked - running total
+                    push: function(entry) {
+                        entry.seq = ++this.seq;
+                        const cap = this.items.length;
+                        this.items[(this.start + this.count) % cap] = entry;
+                        if (this.count < cap) {
+                            this.count++;
+                        } else {
+                            // Full - the oldest entry goes, and we say so
+                            this.start = (this.start + 1) % cap;
+                            this.dropped++;
                         }
-                    });
-                    
-                    // Observe entire body for any changes
-                    observer.observe(document.body, {
-                        attributes: true,
-                        childList: true,
-                        subtree: true,
-                        attributeFilter: ['class', 'disabled']
-                    });
-                    
-                    // Method 2: High-frequency polling as backup (250ms)
-                    this.startPolling();
-                    
-                    // Method 3: Animation frame monitoring for visual changes
-                    this.startAnimationFrameMonitor();
-                },
-                
-                startPolling: function() {
-                    setInterval(() => {
-                        this.findAndCheckButton();
-                        this.checkCount++;  // Increment on every poll
-                    }, 100); // Increased from 250ms to 100ms - 10 checks per second for faster detection
-                },
-                
-                startAnimationFrameMonitor: function() {
-                    let frameCount = 0;
-                    const check = () => {
-                        frameCount++;
-                        if (frameCount % 30 === 0) {  // Reduced from 60 to 30 frames - check every 0.5 seconds instead of 1 second
-                            this.checkCount++;
-                        }
-                        this.findAndCheckButton();
-                        if (this.isMonitoring) {
-                            requestAnimationFrame(check);
-                        }
-                    };
-                    requestAnimationFrame(check);
-                },
-                
-                findAndCheckButton: function() {
-                    this.checkCount++;  // Always increment
-                    const buttons = document.querySelectorAll('button');
-                    for (let btn of buttons) {
-                        const btnText = btn.textContent.trim().toUpperCase();
-                        if (btnText.includes('BUY MULTIPLE BOXES') || btnText.includes('NOTIFY ME WHEN START')) {
-                            this.checkButtonState(btn);
-                            break;
-                        }
-                    }
-                },
-                
-                scanForButton: function(element) {
-                    if (element.tagName === 'BUTTON') {
-                        const btnText = element.textContent.trim().toUpperCase();
-                        if (btnText.includes('BUY MULTIPLE BOXES') || btnText.includes('NOTIFY ME WHEN START')) {
-                            this.checkButtonState(element);
-                        }
-                    }
-                    
-                    // Recursively check children
-                    const buttons = element.querySelectorAll('button');
-                    buttons.forEach(btn => {
-                        const btnText = btn.textContent.trim().toUpperCase();
-                        if (btnText.includes('BUY MULTIPLE BOXES') || btnText.includes('NOTIFY ME WHEN START')) {
-                            this.checkButtonState(btn);
-                        }
-                    });
-                },
-                
-                checkButtonState: function(button) {
-                    const btnText = button.textContent.trim().toUpperCase();
-                    
-                    // Detect the specific button state changes
-                    const wasBuyButton = this.lastButtonText === 'BUY';
-                    const wasNotifyButton = this.lastButtonText === 'NOTIFY';
-                    const isBuyButton = btnText.includes('BUY MULTIPLE BOXES');
-                    const isNotifyButton = btnText.includes('NOTIFY ME WHEN START');
-                    
-                    // Stock is available if button is "Buy Multiple Boxes"
-                    const isInStock = isBuyButton;
-                    
-                    // Store state change
-                    if (btnText !== this.lastButtonText) {
-                        console.log('PopNow button text changed:', btnText);
-                        
-                        // Critical: Detect NOTIFY -> BUY transition (restock moment)
-                        if (wasNotifyButton && isBuyButton) {
-                            console.log('🚨 POPNOW RESTOCK DETECTED! NOTIFY -> BUY transition');
-                            window.__stockJustBecameAvailable = true;
-                        }
-                        
-                        this.lastButtonText = btnText;
-                        
-                        // Set flag for any stock availability
-                        if (isInStock) {
-                            window.__stockAvailable = true;
-                        }
-                    }
-                    // Update status (always update for check counting)
-                    window.__stockStatus = {
-                        available: isInStock,
-                        buttonText: btnText,
-                        timestamp: Date.now(),
-                        checkCount: ++this.checkCount
-                    };
-                },
-                
-                clickBuyMultipleBoxes: function() {
-                    const buttons = document.querySelectorAll('button');
-                    for (let btn of buttons) {
-                        const btnText = btn.textContent.trim().toUpperCase();
-                        if (btnText.includes('BUY MULTIPLE BOXES')) {
-                            btn.click();
-                            return true;
+                    },
+                    read: function(logId, ack) {
+                        // Let go of what Python got into its pipeline, hand over the rest
+                        if (logId === this.id) {
+                            while (this.count && this.items[this.start].seq <= ack) {
+                                this.start = (this.start + 1) % this.items.length;
+                                this.count--;
+                            }
                         }
+                        const out = [];
+                        for (let i = 0; i < this.count; i++) out.push(this.items[(this.start + i) % this.items.length]);
+                        return {id: this.id, entries: out, dropped: this.dropped};
                     }
-                    return false;
-                }
-            };
+                };
+            }
             
-            // Start monitoring immediately
-            window.stockMonitor.startHighSpeedMonitor();
-            """
-        else:
-            monitor_js = """
             window.stockMonitor = {
+                productType: arguments[2],
                 isMonitoring: false,
-                lastButtonClass: null,
+                lastState: null,
+                lastSignature: null,
                 checkCount: 0,
+                pollInterval: 100,
+                pollTimer: null,
+                useAnimationFrame: true,
+                rafRunning: false,
                 
                 startHighSpeedMonitor: function() {
                     if (this.isMonitoring) return;
                     this.isMonitoring = true;
                     
-                    console.log('High-speed monitor initialized');
+                    console.log('High-speed monitor initialized:', this.productType);
                     
-                    // Method 1: MutationObserver for instant detection
-                    const observer = new MutationObserver((mutations) => {
-                        for (let mutation of mutations) {
-                            if (mutation.type === 'attributes' && mutation.attributeName === 'class') {
-                                // Check if it's the ADD TO BAG button
-                                const target = mutation.target;
-                                if (target.textContent && target.textContent.includes('ADD TO BAG')) {
-                                    this.checkButtonState(target);
-                                }
-                            }
-                            
-                            // Also check childList for dynamic content
-                            if (mutation.type === 'childList') {
-                                mutation.addedNodes.forEach(node => {
-                                    if (node.nodeType === 1) { // Element node
-                                        this.scanForButton(node);
-                                    }
-                                });
-                            }
-                        }
-                    });
+                    // Method 1: MutationObserver for instant detection - one matcher pass per batch of changes
+                    const observer = new MutationObserver(() => this.findAndCheckButton());
                     
                     // Observe entire body for any changes
                     observer.observe(document.body, {
@@ -312,84 +209,76 @@ class UnifiedPopMartMonitor:
                         attributeFilter: ['class', 'disabled']
                     });
                     
-                    // Method 2: High-frequency polling as backup (250ms)
+                    // Method 2: High-frequency polling as backup (rate set by the scheduler)
                     this.startPolling();
                     
-                    // Method 3: Animation frame monitoring for visual changes
-                    this.startAnimationFrameMonitor();
+                    // Method 3: Animation frame monitoring for visual changes (high priority tabs only)
+                    if (this.useAnimationFrame) this.startAnimationFrameMonitor();
                 },
                 
                 startPolling: function() {
-                    setInterval(() => {
+                    if (this.pollTimer) clearInterval(this.pollTimer);
+                    this.pollTimer = setInterval(() => {
                         this.findAndCheckButton();
-                        this.checkCount++;  // Increment on every poll
-                    }, 100); // Increased from 250ms to 100ms - 10 checks per second for faster detection
+                    }, this.pollInterval); // Tuned at runtime by the Python check budget scheduler
                 },
                 
                 startAnimationFrameMonitor: function() {
-                    let frameCount = 0;
+                    if (this.rafRunning) return;
+                    this.rafRunning = true;
                     const check = () => {
-                        frameCount++;
-                        if (frameCount % 30 === 0) {  // Reduced from 60 to 30 frames - check every 0.5 seconds instead of 1 second
-                            this.checkCount++;
+                        if (!this.isMonitoring || !this.useAnimationFrame) {
+                            this.rafRunning = false;
+                            return;
                         }
                         this.findAndCheckButton();
-                        if (this.isMonitoring) {
-                            requestAnimationFrame(check);
-                        }
+                        requestAnimationFrame(check);
                     };
                     requestAnimationFrame(check);
                 },
                 
-                findAndCheckButton: function() {
-                    this.checkCount++;  // Always increment
-                    const buttons = document.querySelectorAll('div[class*="index_usBtn__"]');
-                    for (let btn of buttons) {
-                        if (btn.textContent && btn.textContent.includes('ADD TO BAG')) {
-                            this.checkButtonState(btn);
-                            break;
-                        }
+                setPollRate: function(intervalMs, useAnimationFrame) {
+                    // Called from Python whenever the check budget gets reshuffled
+                    this.pollInterval = intervalMs;
+                    this.useAnimationFrame = useAnimationFrame;
+                    if (this.isMonitoring) {
+                        this.startPolling();
+                        if (useAnimationFrame) this.startAnimationFrameMonitor();
                     }
                 },
                 
-                scanForButton: function(element) {
-                    if (element.classList && element.classList.toString().includes('index_usBtn__')) {
-                        if (element.textContent && element.textContent.includes('ADD TO BAG')) {
-                            this.checkButtonState(element);
-                        }
-                    }
-                    
-                    // Recursively check children
-                    const buttons = element.querySelectorAll('div[class*="index_usBtn__"]');
-                    buttons.forEach(btn => {
-                        if (btn.textContent && btn.textContent.includes('ADD TO BAG')) {
-                            this.checkButtonState(btn);
-                        }
-                    });
+                findAndCheckButton: function() {
+                    const match = window.__popmartMatch(this.productType)[this.productType];
+                    if (match) this.checkButtonState(match);
                 },
                 
-                checkButtonState: function(button) {
-                    const currentClass = button.className;
-                    
-                    // Detect the specific class change from black to red
-                    const wasBlack = this.lastButtonClass && this.lastButtonClass.includes('index_black__');
-                    const isRed = currentClass.includes('index_red__');
-                    const isBlack = currentClass.includes('index_black__');
-                    
-                    // Stock is available if button has red class
-                    const isInStock = isRed && !isBlack;
+                checkButtonState: function(match) {
+                    // PopNow changes its button text, regular products change the button class
+                    const signature = this.productType === 'popnow' ? match.text : match.className;
+                    const isInStock = match.state === 'in';
                     
                     // Store state change
-                    if (currentClass !== this.lastButtonClass) {
-                        console.log('Button class changed:', currentClass);
+                    if (signature !== this.lastSignature) {
+                        console.log('Button changed:', signature);
+                        
+                        // Every in/out flip goes in the log, even if it flips back before Python looks
+                        if (match.state !== this.lastState) {
+                            window.__stockLog.push({
+                                from: this.lastState,
+                                to: match.state,
+                                text: match.text,
+                                t: performance.timeOrigin + performance.now()
+                            });
+                        }
                         
-                        // Critical: Detect black -> red transition (restock moment)
-                        if (wasBlack && isRed) {
-                            console.log('🚨 RESTOCK DETECTED! Black -> Red transition');
+                        // Critical: out of stock -> in stock is the restock moment
+                        if (this.lastState === 'out' && isInStock) {
+                            console.log('🚨 RESTOCK DETECTED!', this.productType);
                             window.__stockJustBecameAvailable = true;
                         }
                         
-                        this.lastButtonClass = currentClass;
+                        this.lastSignature = signature;
+                        this.lastState = match.state;
                         
                         // Set flag for any stock availability
                         if (isInStock) {
@@ -399,81 +288,344 @@ class UnifiedPopMartMonitor:
                     // Update status (always update for check counting)
                     window.__stockStatus = {
                         available: isInStock,
-                        buttonClass: currentClass,
-                        timestamp: Date.now(),
+                        state: match.state,
+                        buttonText: match.text,
+                        buttonClass: match.className,
+                        timestamp: performance.timeOrigin + performance.now(),
                         checkCount: ++this.checkCount
                     };
-                },
-                
-                clickAddToBag: function() {
-                    const buttons = document.querySelectorAll('div[class*="index_usBtn__"]');
-                    for (let btn of buttons) {
-                        if (btn.textContent && btn.textContent.includes('ADD TO BAG')) {
-                            // Only click if it has red class (in stock)
-                            if (btn.className.includes('index_red__')) {
-                                btn.click();
-                                return true;
-                            }
-                        }
-                    }
-                    return false;
                 }
             };
             
-            // Start monitoring immediately
+            // Start monitoring immediately at the rate the scheduler gave us
+            window.stockMonitor.pollInterval = arguments[0];
+            window.stockMonitor.useAnimationFrame = arguments[1];
             window.stockMonitor.startHighSpeedMonitor();
-            """
+        """)
+        
+        self.driver.execute_script(monitor_js, rate[0], rate[1], product_type, TRANSITION_LOG_SIZE)
+        if self.on_inject:
+            self.on_inject(self.driver, product_id)
+    
+    def timed_script(self, op, script, *args):
+        """execute_script, but the round trip time goes into the WebDriver latency histogram"""
+        started = time.perf_counter()
+        try:
+            return self.driver.execute_script(script, *args)
+        finally:
+            self.metrics.observe('popmart_webdriver_call_seconds', time.perf_counter() - started,
+                                 'WebDriver round trip latency', op=op, region=self.region)
+    
+    def timed_switch(self, handle):
+        """Switches tabs and records how long chromedriver took"""
+        started = time.perf_counter()
+        self.driver.switch_to.window(handle)
+        self.metrics.observe('popmart_webdriver_call_seconds', time.perf_counter() - started,
+                             'WebDriver round trip latency', op='switch_tab', region=self.region)
+    
+    def apply_check_rate(self, product_id, rate):
+        """Retunes the polling rate of the monitor running in the current tab"""
+        self.timed_script(
+            'set_rate',
+            "if (window.stockMonitor && window.stockMonitor.setPollRate) window.stockMonitor.setPollRate(arguments[0], arguments[1]);",
+            rate[0], rate[1]
+        )
+        self.scheduler.mark_applied(product_id, rate)
+    
+    def refresh_drop_phases(self, product_ids):
+        """Moves products between idle and armed as their drop windows come and go"""
+        for pid, old_phase, new_phase in self.drops.poll_transitions(product_ids):
+            if not self.drops.has_window(pid):
+                continue
+            name = self.products[pid].name
+            if new_phase in (IDLE, DONE):
+                self.scheduler.set_idle(pid)
+                if old_phase is not None:
+                    LOG.event('drop_idle', product=pid, name=name)
+            else:
+                self.scheduler.set_armed(pid)
+                LOG.event('drop_armed', product=pid, name=name, phase=new_phase)
+                if old_phase in (None, IDLE) and self.on_prearm:
+                    # Warming up checkout takes seconds - the tabs keep getting checked meanwhile
+                    threading.Thread(target=self.run_prearm, args=(pid,), name=f"prearm-{pid}", daemon=True).start()
+    
+    def run_prearm(self, product_id):
+        try:
+            self.on_prearm(product_id)
+        except Exception as e:
+            LOG.event('prearm_error', level='warning', product=product_id, error=str(e))
+    
+    def read_stock_flags(self, ack=(None, 0, 0)):
+        """One round trip: reads (and clears) the restock flags, the latest status and every transition the
+        page still holds after letting go of the ones ack (log id, seq, dropped) says we already have"""
+        return self.timed_script('read_flags', """
+            const reading = {
+                armed: !!window.stockMonitor,
+                justBecameAvailable: window.__stockJustBecameAvailable || false,
+                stockAvailable: window.__stockAvailable || false,
+                status: window.__stockStatus || null,
+                transitions: window.__stockLog ? window.__stockLog.read(arguments[0], arguments[1]) : null,
+                heap: performance.memory ? performance.memory.usedJSHeapSize : null,
+                clock: performance.timeOrigin + performance.now()
+            };
+            window.__stockJustBecameAvailable = false;
+            window.__stockAvailable = false;
+            return reading;
+        """, ack[0], ack[1])
+    
+    def read_tab(self, product_id):
+        """read_stock_flags, except a tab that lost its monitor (reload, navigation) raises MonitorGone"""
+        before = time.monotonic()
+        reading = self.read_stock_flags(self.transition_acks.get(product_id, (None, 0, 0)))
+        after = time.monotonic()
+        if isinstance(reading, dict):
+            # The read itself is a clock sample - no extra round trip
+            self.clock(product_id).add(before, reading.get('clock'), after)
+        if isinstance(reading, dict) and not reading.get('armed'):
+            raise MonitorGone(f"monitor missing on {product_id}'s tab")
+        self.breaker(product_id).success()
+        return reading
+    
+    def clock(self, product_id):
+        if product_id not in self.clocks:
+            self.clocks[product_id] = ClockSync()
+        return self.clocks[product_id]
+    
+    def breaker(self, product_id):
+        if product_id not in self.breakers:
+            self.breakers[product_id] = CircuitBreaker()
+        return self.breakers[product_id]
+    
+    def handle_loop_error(self, product_id, error, where='loop'):
+        """Classifies a monitor loop error and returns the recovery action (after its short delay)"""
+        kind = classify(error)
+        action, delay = self.breaker(product_id).failure(kind)
+        self.metrics.inc('popmart_monitor_errors_total', 1, 'Monitor loop errors by kind and recovery action',
+                         kind=kind, action=action, region=self.region)
+        LOG.event('monitor_error', level='warning' if action in ('retry', 'rearm') else 'error', product=product_id,
+                  where=where, kind=kind, action=action, error=f"{type(error).__name__}: {error}"[:300])
+        if delay:
+            time.sleep(delay)
+        return action
+    
+    def rearm(self, product_id):
+        """Page reloaded or navigated - wait for it to load, then detect the type and inject again"""
+        wait_for_load(self.driver, 3.0)
+        detected_type = self.detect_product_type()
+        rate = self.scheduler.compute_rates([product_id])[product_id]
+        self.inject_high_speed_monitor(detected_type, rate, product_id)
+        self.scheduler.mark_applied(product_id, rate)
+        LOG.event('monitor_reinjected', product=product_id, region=self.region)
+        return detected_type
+    
+    def reopen_tab(self, product_id, old_handle=None):
+        """Tab crashed or disappeared - loads the product in a fresh tab and returns its handle"""
+        if old_handle:
+            try:
+                self.driver.switch_to.window(old_handle)
+                self.driver.close()
+            except Exception:
+                pass  # Already gone
+        self.driver.switch_to.new_window('tab')
+        self.driver.get(self.products[product_id].url)
+        LOG.event('monitor_reopened', product=product_id, region=self.region)
+        handle = self.tab_handles[product_id] = self.driver.current_window_handle
+        return handle
+    
+    def failover(self):
+        """chromedriver session is dead - swap in a new browser from on_driver_lost"""
+        driver = self.on_driver_lost() if self.on_driver_lost else None
+        if driver is None:
+            raise RuntimeError("monitor browser is gone and there's nothing to fail over to")
+        self.driver = driver
+        self.breakers = {}
+        LOG.event('monitor_failover', level='warning')
+    
+    def build_pipeline(self, callback):
+        """Wires up detector events → normalizer → dedupe/policy → checkout executor"""
+        pipeline = EventPipeline(metrics=self.metrics, labels={'region': self.region})
+        # Bumped checkouts waiting for their turn again - dropped if a success stops monitoring first
+        # (running one would navigate the checkout tab off the payment page the user needs)
+        requeued = set()
+        stopping = False
+        
+        def execute_checkout(status):
+            nonlocal stopping
+            product_id = status.product_id
+            requeued.discard(product_id)
+            if stopping:
+                return None  # Left in the queue when a success stopped monitoring - already written off
+            started = clock_now()
+            self.metrics.observe('popmart_detection_to_checkout_seconds', started - status.detected_at,
+                                 'Time from detector reading to checkout start',
+                                 product=product_id, region=self.region)
+            if status.restocked_at:
+                self.metrics.observe('popmart_restock_to_checkout_seconds', started - status.restocked_at,
+                                     'Time from the page seeing the restock to checkout start (aligned clocks)',
+                                     product=product_id, region=self.region)
+            self.stock_states.start_checkout(product_id)
+            self.policy.begin(status)
+            try:
+                keep_monitoring = callback(status) if callback else True
+            except CheckoutPreempted:
+                # Something more important showed up - put this one back in line behind it
+                LOG.event('checkout_preempted', product=product_id, name=status.product_name)
+                self.stock_states.requeue(product_id)
+                if checkout_stage.put(status, block=False):
+                    requeued.add(product_id)
+                else:
+                    LOG.event('checkout_error', level='error', product=product_id, where='requeue',
+                              error="checkout queue full - bumped checkout dropped")
+                    self.stock_states.finish_checkout(product_id, done=False)
+                return None
+            finally:
+                self.policy.end()
+            self.stock_states.finish_checkout(product_id, done=not keep_monitoring)
+            if not keep_monitoring:
+                stopping = True
+                if requeued:
+                    for bumped in requeued:
+                        self.stock_states.finish_checkout(bumped, done=False)
+                    LOG.event('checkout_requeued', level='warning', products=','.join(sorted(requeued)),
+                              action='dropped')
+                    requeued.clear()
+                pipeline.request_stop()
+            return None
+        
+        pipeline.add_stage('normalize', self.normalize_event, maxsize=256)
+        pipeline.add_stage('dedupe', self.dedupe_event, maxsize=256)
+        # Checkout queue is ordered by priority so overlapping restocks go most-wanted first
+        checkout_stage = pipeline.add_stage('checkout', execute_checkout, maxsize=16, priority=self.policy.order_key)
+        return pipeline.start()
+    
+    def submit_reading(self, product_id, product_type, reading):
+        """Hot path - hands a raw detector reading to the pipeline without waiting on anything
+        Transitions are only acked (and trimmed from the page next read) once the pipeline took the reading"""
+        log = reading.get('transitions') if isinstance(reading, dict) else None
+        ack = None
+        if isinstance(log, dict) and isinstance(log.get('entries'), list):
+            last_id, last_seq, last_dropped = self.transition_acks.get(product_id, (None, 0, 0))
+            dropped = log.get('dropped') or 0
+            if log.get('id') != last_id:
+                last_seq, last_dropped = 0, 0  # Page reloaded - fresh log
+            seqs = [e['seq'] for e in log['entries'] if isinstance(e, dict) and isinstance(e.get('seq'), (int, float))]
+            ack = (log.get('id'), max(seqs, default=last_seq), dropped)
+            log['dropped'] = max(0, dropped - last_dropped)  # Only the ones lost since the last accepted reading
+        accepted = self.pipeline.submit({
+            'product_id': product_id,
+            'product_type': product_type,
+            'reading': reading,
+            'detected_at': clock_now()
+        })
+        if accepted and ack:
+            self.transition_acks[product_id] = ack
+        return accepted
+    
+    def normalize_event(self, event):
+        """Pipeline stage: turns a raw reading into a full status with the product details attached"""
+        reading = event['reading']
+        product = self.products[event['product_id']]
+        clock = self.clocks.get(product.product_id)
+        status = StockStatus.from_reading(product, event['product_type'], reading, event['detected_at'],
+                                          page_time=clock.to_aligned if clock else None)
+        self.record_tab_metrics(status, reading.get('heap'), clock)
+        if status.transitions_dropped:
+            self.metrics.inc('popmart_transition_log_dropped_total', status.transitions_dropped,
+                             'Transitions overwritten in the in-page ring buffer before a reading carrying them was accepted',
+                             product=status.product_id, region=self.region)
+            LOG.event('monitor_error', level='warning', product=status.product_id, where='transition_log',
+                      error=f"{status.transitions_dropped} transition(s) overwritten before they were acked")
+        self.history.record(status.product_id, status.transitions)
+        return status
+    
+    def record_tab_metrics(self, status, heap, clock=None):
+        """Check rate, detector heartbeat, memory and clock sync per product - runs in the normalize stage, off the hot path"""
+        product_id = status.product_id
+        now = status.detected_at
+        sync = clock.report() if clock else None
+        if sync:
+            offset, drift_ppm, uncertainty = sync
+            self.metrics.set('popmart_tab_clock_offset_seconds', offset, 'Page clock minus the aligned Python clock',
+                             product=product_id, region=self.region)
+            self.metrics.set('popmart_tab_clock_drift_ppm', drift_ppm, 'Page clock drift against time.monotonic',
+                             product=product_id, region=self.region)
+            self.metrics.set('popmart_tab_clock_uncertainty_seconds', uncertainty,
+                             'Half the tightest sampling round trip', product=product_id, region=self.region)
+        if heap:
+            self.metrics.set('popmart_tab_js_heap_bytes', heap, 'JS heap used by the monitor tab',
+                             product=product_id, region=self.region)
+        if status.timestamp:
+            self.metrics.set('popmart_detector_heartbeat_age_seconds', max(0.0, now - status.timestamp),
+                             'Seconds since the in-page detector last ran a check', product=product_id, region=self.region)
+        
+        count = status.check_count
+        if count is None:
+            return
+        last = self._rate_marks.get(product_id)
+        if last is None or count < last[0]:
+            # First reading (or the page reloaded and the counter reset)
+            self._rate_marks[product_id] = (count, now)
+        elif now - last[1] >= 1.0:
+            self.metrics.set('popmart_check_rate_per_second', (count - last[0]) / (now - last[1]),
+                             'Effective in-page checks per second', product=product_id, region=self.region)
+            self._rate_marks[product_id] = (count, now)
+    
+    def dedupe_event(self, status):
+        """Pipeline stage: only lets the first event of each restock through to checkout"""
+        if not self.stock_states.observe(status.product_id, status.in_stock):
+            return None
+        
+        LOG.event('restock_detected' if status.just_became_available else 'stock_available',
+                  product=status.product_id, name=status.product_name, type=status.product_type)
         
-        self.driver.execute_script(monitor_js)
+        self.policy.offer(status)
+        return status
+    
+    def stop_pipeline(self):
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline.print_metrics()
+            self.pipeline = None
+        self.history.stop()
     
     def monitor_product(self, product_id, callback=None, skip_navigation=False):
         """Main monitoring function - watches a single product and figures out what type it is automatically"""
         if product_id not in self.products:
             # Try to guess based on ID pattern
-            is_popnow = len(product_id) == 3 and product_id.isdigit() and int(product_id) < 500
-            
             print(f"⚠️ Product ID {product_id} not in config, creating entry...")
-            if is_popnow:
-                url = f"https://www.popmart.com/ca/pop-now/set/{product_id}"
-                product_type = 'popnow'
-            else:
-                url = f"https://www.popmart.com/ca/products/{product_id}/"
-                product_type = 'normal'
-            
-            self.products[product_id] = {
-                'name': f'Product {product_id}',
-                'url': url,
-                'type': product_type
-            }
+            url, product_type = guess_product(self.region, product_id)
+            self.products[product_id] = Product(product_id, f'Product {product_id}', url, product_type)
         
         product = self.products[product_id]
         
         # Navigate if needed
         if not skip_navigation:
             print(f"📍 Navigating to product page...")
-            self.driver.get(product['url'])
+            self.driver.get(product.url)
             time.sleep(0.8)  # Much faster navigation
         
+        self.tab_handles[product_id] = self.driver.current_window_handle
+        
         # Auto-detect product type from page
         detected_type = self.detect_product_type()
         print(f"\n🔍 Auto-detected product type: {detected_type.upper()}")
         
         # Update product type if different from config
-        if product.get('type') != detected_type:
-            print(f"📝 Updating product type from {product.get('type', 'unknown')} to {detected_type}")
-            product['type'] = detected_type
+        if product.product_type != detected_type:
+            print(f"📝 Updating product type from {product.product_type} to {detected_type}")
+            product.product_type = detected_type
         
-        print(f"⚡ HIGH-SPEED Monitoring: {product['name']}")
-        print(f"🔗 URL: {product['url']}")
+        print(f"⚡ HIGH-SPEED Monitoring: {product.name}")
+        print(f"🔗 URL: {product.url}")
         
-        if detected_type == 'popnow':
-            print("🎯 Watching for: NOTIFY ME WHEN START → Buy Multiple Boxes")
-        else:
-            print("🎯 Watching for: black button → red button (ADD TO BAG)")
+        print(f"🎯 Watching for: {watching_for(detected_type)}")
         
-        # Inject appropriate monitor
+        # Inject appropriate monitor at whatever rate the budget allows
+        self.refresh_drop_phases([product_id])
+        rate = self.scheduler.compute_rates([product_id])[product_id]
         try:
-            self.inject_high_speed_monitor(detected_type)
+            self.inject_high_speed_monitor(detected_type, rate, product_id)
+            self.scheduler.mark_applied(product_id, rate)
             print("✅ Monitor script injected successfully")
         except Exception as e:
             print(f"❌ Failed to inject monitor script: {e}")
@@ -482,60 +634,34 @@ class UnifiedPopMartMonitor:
         # Initial check
         time.sleep(0.2)  # Quick initial check
         try:
-            if detected_type == 'popnow':
-                initial_check = self.driver.execute_script("""
-                    const buttons = document.querySelectorAll('button');
-                    for (let btn of buttons) {
-                        const text = btn.textContent.trim().toUpperCase();
-                        if (text.includes('BUY MULTIPLE BOXES')) {
-                            return {found: true, type: 'buy', text: btn.textContent};
-                        } else if (text.includes('NOTIFY ME WHEN START')) {
-                            return {found: true, type: 'notify', text: btn.textContent};
-                        }
-                    }
-                    return {found: false};
-                """)
-                
-                if initial_check['found']:
-                    if initial_check['type'] == 'buy':
-                        print(f"✅ Product is IN STOCK: {initial_check['text']}")
-                    else:
-                        print(f"🔴 Product is OUT OF STOCK: {initial_check['text']}")
-            else:
-                initial_check = self.driver.execute_script("""
-                    const buttons = document.querySelectorAll('div[class*="index_usBtn__"]');
-                    for (let btn of buttons) {
-                        if (btn.textContent && btn.textContent.includes('ADD TO BAG')) {
-                            return {
-                                found: true,
-                                className: btn.className,
-                                text: btn.textContent
-                            };
-                        }
-                    }
-                    return {found: false};
-                """)
-                
-                if initial_check['found']:
-                    print(f"✅ Button found: {initial_check['text']}")
+            initial_check = self.driver.execute_script("""
+                const match = window.__popmartMatch(arguments[0])[arguments[0]];
+                if (!match) return {found: false};
+                return {found: true, state: match.state, text: match.text, className: match.className};
+            """, detected_type)
+            
+            if initial_check['found']:
+                if initial_check['state'] == 'in':
+                    print(f"✅ Product is IN STOCK: {initial_check['text']}")
+                else:
+                    print(f"🔴 Product is OUT OF STOCK: {initial_check['text']}")
+                if detected_type != 'popnow':
                     print(f"📋 Initial class: {initial_check['className']}")
         except Exception as e:
             print(f"⚠️ Error during initial check: {e}")
         
         print("\n🚀 Monitor active - Checking multiple times per second...")
-        if detected_type == 'popnow':
-            print("🎯 Watching for: NOTIFY ME WHEN START → Buy Multiple Boxes")
-        else:
-            print("👁️ Watching for button class change: index_black__ → index_red__")
         print("📊 Starting monitoring loop...")
         
         check_count = 0
         last_status_check = time.time()
         last_behavior = time.time()
-        monitoring_active = True
         loop_iterations = 0
+        self.pipeline = self.build_pipeline(callback)
+        if self.on_armed:
+            self.on_armed([product_id])
         
-        while monitoring_active:
+        while not self.pipeline.stopped.is_set():
             try:
                 loop_iterations += 1
                 if loop_iterations == 1:
@@ -544,57 +670,11 @@ class UnifiedPopMartMonitor:
                 # Fast check every 100ms
                 time.sleep(0.1)
                 
-                # Check for restock moment
-                try:
-                    restock_detected = self.driver.execute_script("return window.__stockJustBecameAvailable || false;")
-                except Exception as e:
-                    print(f"\n⚠️ Error checking restock status: {e}")
-                    restock_detected = False
-                
-                if restock_detected:
-                    print(f"\n{'🚨'*30}")
-                    print("💥 RESTOCK MOMENT DETECTED! 💥")
-                    print(f"{'🚨'*30}")
-                    
-                    # Get full status
-                    status = self.driver.execute_script("return window.__stockStatus;")
-                    status['product_id'] = product_id
-                    status['product_name'] = product['name']
-                    status['url'] = product['url']
-                    status['product_type'] = detected_type
-                    
-                    # Clear flag
-                    self.driver.execute_script("window.__stockJustBecameAvailable = false;")
-                    
-                    if callback:
-                        monitoring_active = callback(status)
-                        if not monitoring_active:
-                            break
-                    continue
-                
-                # Regular stock check
-                try:
-                    stock_available = self.driver.execute_script("return window.__stockAvailable || false;")
-                except Exception as e:
-                    print(f"\n⚠️ Error checking stock status: {e}")
-                    stock_available = False
+                # Grab (and clear) the restock flags in a single round trip
+                reading = self.read_tab(product_id)
                 
-                if stock_available:
-                    status = self.driver.execute_script("return window.__stockStatus;")
-                    if status and status.get('available'):
-                        status['product_id'] = product_id
-                        status['product_name'] = product['name']
-                        status['url'] = product['url']
-                        status['product_type'] = detected_type
-                        
-                        print(f"\n🟢 STOCK AVAILABLE - {product['name']}")
-                        
-                        if callback:
-                            monitoring_active = callback(status)
-                            if not monitoring_active:
-                                break
-                        
-                        self.driver.execute_script("window.__stockAvailable = false;")
+                if reading:
+                    self.submit_reading(product_id, detected_type, reading)
                 
                 # Status update every 2 seconds
                 if time.time() - last_status_check > 2:
@@ -614,14 +694,18 @@ class UnifiedPopMartMonitor:
                         if detected_type == 'popnow':
                             status_text = "In Stock (Buy Multiple)" if is_available else "Out of Stock (Notify Me)"
                         else:
-                            button_class = js_status.get('buttonClass', 'unknown')
-                            status_text = "RED (In Stock)" if "index_red__" in button_class else "BLACK (Out of Stock)"
+                            status_text = "RED (In Stock)" if is_available else "BLACK (Out of Stock)"
+                        
+                        LOG.event('status', inline=True, icon=status_icon, checks=f"{check_count:,}", stock=status_text, type=detected_type.upper())
                         
-                        print(f"\r{status_icon} Checks: {check_count:,} | Status: {status_text} | Type: {detected_type.upper()}", end='', flush=True)
+                        # Back off (or speed up) depending on how loaded the machine is and on drop windows
+                        self.refresh_drop_phases([product_id])
+                        for pid, new_rate in self.scheduler.changed_rates([product_id]).items():
+                            self.apply_check_rate(pid, new_rate)
                         
                         last_status_check = time.time()
                     except Exception as e:
-                        print(f"\n⚠️ Error updating status: {e}")
+                        LOG.event('monitor_error', level='warning', product=product_id, where='status', error=str(e))
                 
                 # Light human behavior every 30 seconds
                 if time.time() - last_behavior > 30:
@@ -634,43 +718,116 @@ class UnifiedPopMartMonitor:
                 print("\n\n⌨️ Monitoring stopped by user (Ctrl+C)")
                 break
             except Exception as e:
-                print(f"\n⚠️ Monitoring error: {type(e).__name__}: {e}")
-                print("📍 Attempting to continue monitoring...")
-                time.sleep(0.5)
+                # Stale element → retry in ms, reload → re-arm, crashed tab → reopen, dead driver → new browser
+                action = self.handle_loop_error(product_id, e)
                 try:
-                    # Try to reinject monitor
-                    detected_type = self.detect_product_type()
-                    self.inject_high_speed_monitor(detected_type)
-                    print("✅ Monitor reinjected")
-                except Exception as reinject_error:
-                    print(f"❌ Failed to reinject monitor: {reinject_error}")
-                    print("⚠️ Monitoring may be degraded")
+                    if action == 'failover':
+                        self.failover()
+                        self.driver.get(product.url)
+                        self.tab_handles[product_id] = self.driver.current_window_handle
+                    elif action == 'reopen':
+                        self.reopen_tab(product_id)
+                    if action != 'retry':
+                        detected_type = self.rearm(product_id)
+                except Exception as recover_error:
+                    LOG.event('monitor_error', level='error', product=product_id, where=action, error=str(recover_error))
+                    if action == 'failover':
+                        self.pipeline.request_stop()
+                time.sleep(self.breaker(product_id).rest_left())
         
+        self.stop_pipeline()
         print(f"\n📊 Monitoring ended after {loop_iterations} iterations")
     
     def monitor_multiple_products(self, product_ids, callback=None):
         """Watches multiple products at once - opens them in different tabs and keeps an eye on all of them"""
         print(f"\n⚡ Monitoring {len(product_ids)} products")
         
-        # Open tabs and detect types
+        tab_products = self.open_tabs(product_ids)
+        
+        print("\n🚀 High-speed monitoring active on all tabs...")
+        
+        check_count = 0
+        tab_index = 0
+        pending_rates = {}
+        last_retune = time.time()
+        self.pipeline = self.build_pipeline(callback)
+        if self.on_armed:
+            self.on_armed(product_ids)
+        
+        while not self.pipeline.stopped.is_set():
+            handle, product_id, product_type = tab_products[tab_index]
+            try:
+                # A tab whose breaker just opened sits out its cooldown - the other tabs keep going
+                if self.breaker(product_id).rest_left():
+                    tab_index = (tab_index + 1) % len(tab_products)
+                    time.sleep(0.01)
+                    continue
+                
+                self.timed_switch(handle)
+                
+                # Reshuffle the check budget every couple of seconds
+                if time.time() - last_retune > 2:
+                    self.refresh_drop_phases(product_ids)
+                    pending_rates.update(self.scheduler.changed_rates(product_ids))
+                    last_retune = time.time()
+                
+                # Only retune a tab while we're already sitting on it - no extra tab switches
+                if product_id in pending_rates:
+                    self.apply_check_rate(product_id, pending_rates.pop(product_id))
+                
+                # Quick check - one round trip per tab
+                reading = self.read_tab(product_id)
+                self.submit_reading(product_id, product_type, reading)
+                
+                tab_index = (tab_index + 1) % len(tab_products)
+                check_count += 1
+                
+                if tab_index == 0:
+                    LOG.event('status', inline=True, cycles=check_count // len(tab_products), tabs=len(tab_products))
+                
+                time.sleep(0.2)
+                
+            except KeyboardInterrupt:
+                break
+            except Exception as e:
+                action = self.handle_loop_error(product_id, e)
+                try:
+                    if action == 'failover':
+                        self.failover()
+                        tab_products = self.open_tabs(product_ids)
+                        tab_index = 0
+                    elif action != 'retry':
+                        if action == 'reopen':
+                            handle = self.reopen_tab(product_id, handle)
+                        else:
+                            self.timed_switch(handle)
+                        tab_products[tab_index] = (handle, product_id, self.rearm(product_id))
+                except Exception as recover_error:
+                    LOG.event('monitor_error', level='error', product=product_id, where=action, error=str(recover_error))
+                    if action == 'failover':
+                        self.pipeline.request_stop()
+        
+        self.stop_pipeline()
+    
+    def open_tabs(self, product_ids):
+        """Opens one tab per product, detects its type and injects the monitor - returns [(handle, id, type)]"""
         tab_products = []
+        self.refresh_drop_phases(product_ids)
+        rates = self.scheduler.compute_rates(product_ids)
         
         for i, product_id in enumerate(product_ids):
             if product_id not in self.products:
                 print(f"⚠️ Product {product_id} not in config, will auto-detect...")
                 # Create placeholder
-                self.products[product_id] = {
-                    'name': f'Product {product_id}',
-                    'url': f'https://www.popmart.com/ca/products/{product_id}/',
-                    'type': 'unknown'
-                }
+                self.products[product_id] = Product(product_id, f'Product {product_id}',
+                                                    product_url(self.region, product_id))
             
             product = self.products[product_id]
             
             if i == 0:
-                self.driver.get(product['url'])
+                self.driver.get(product.url)
             else:
-                self.driver.execute_script(f"window.open('{product['url']}', '_blank');")
+                self.driver.execute_script(f"window.open('{product.url}', '_blank');")
             
             time.sleep(0.8)  # Faster tab opening
             
@@ -679,56 +836,16 @@ class UnifiedPopMartMonitor:
             
             # Detect type and inject monitor
             detected_type = self.detect_product_type()
-            product['type'] = detected_type
-            self.inject_high_speed_monitor(detected_type)
+            product.product_type = detected_type
+            self.inject_high_speed_monitor(detected_type, rates[product_id], product_id)
+            self.scheduler.mark_applied(product_id, rates[product_id])
             
             tab_products.append((all_handles[-1], product_id, detected_type))
-            print(f"✅ Tab {i+1}: {product['name']} ({detected_type})")
-        
-        print("\n🚀 High-speed monitoring active on all tabs...")
-        
-        check_count = 0
-        tab_index = 0
+            self.tab_handles[product_id] = all_handles[-1]
+            interval, use_raf = rates[product_id]
+            print(f"✅ Tab {i+1}: {product.name} ({detected_type}) - every {interval}ms{' + rAF' if use_raf else ''}")
         
-        while True:
-            try:
-                handle, product_id, product_type = tab_products[tab_index]
-                self.driver.switch_to.window(handle)
-                
-                # Quick check
-                restock = self.driver.execute_script("return window.__stockJustBecameAvailable || false;")
-                stock = self.driver.execute_script("return window.__stockAvailable || false;")
-                
-                if restock or stock:
-                    status = self.driver.execute_script("return window.__stockStatus;")
-                    if status:
-                        status['product_id'] = product_id
-                        status['product_name'] = self.products[product_id]['name']
-                        status['url'] = self.products[product_id]['url']
-                        status['product_type'] = product_type
-                        
-                        print(f"\n🟢 STOCK AVAILABLE - {self.products[product_id]['name']} ({product_type})")
-                        
-                        if callback:
-                            if not callback(status):
-                                break
-                        
-                        self.driver.execute_script("window.__stockJustBecameAvailable = false;")
-                        self.driver.execute_script("window.__stockAvailable = false;")
-                
-                tab_index = (tab_index + 1) % len(tab_products)
-                check_count += 1
-                
-                if tab_index == 0:
-                    print(f"\r⚡ Cycles: {check_count // len(tab_products)} | Checking all products...", end='', flush=True)
-                
-                time.sleep(0.2)
-                
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                print(f"\n⚠️ Error: {e}")
-                time.sleep(0.5)
+        return tab_products
     
     # Keep the stealth methods for backwards compatibility
     def monitor_single_product_stealth(self, product_id, callback=None, skip_navigation=False):